@@ -0,0 +1,258 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.audio_extractor import extract_audio
+from utils.cpu_tuning import apply_cpu_profile, cpu_profile
+from utils.inference_backend import BACKENDS
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4a", ".mp3", ".wav", ".flac")
+
+# Per-worker state, populated by init_worker in each child process.
+_worker = {}
+
+def collect_inputs(source):
+    # Accepts a directory, a glob pattern or a JSONL manifest whose lines hold
+    # {"video": path, "min_speakers": int, "max_speakers": int}.
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(VIDEO_EXTENSIONS)
+        )
+        return [{"video": path} for path in paths]
+
+    if source.endswith(".jsonl") and os.path.isfile(source):
+        jobs = []
+        with open(source) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if line:
+                    jobs.append(manifest_job(line, number))
+        return jobs
+
+    return [{"video": path} for path in sorted(glob.glob(source, recursive=True))]
+
+def manifest_job(line, number):
+    # A malformed line becomes a job that fails up front, so it is reported in
+    # the summary like any other failure instead of aborting the batch.
+    try:
+        job = json.loads(line)
+    except json.JSONDecodeError as exc:
+        return {"line": number, "invalid": f"invalid JSON ({exc})"}
+    if not isinstance(job, dict) or not isinstance(job.get("video"), str):
+        return {"line": number, "invalid": 'expected {"video": path, ...}'}
+    return job
+
+def job_output_dir(output_root, video_path):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    digest = hashlib.sha1(os.path.abspath(video_path).encode()).hexdigest()[:8]
+    return os.path.join(output_root, f"{stem}-{digest}")
+
+def extract_job(job, output_root):
+    out_dir = job_output_dir(output_root, job["video"])
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    audio_path = extract_audio(job["video"], os.path.join(out_dir, "audio.wav"))
+    return dict(job, audio_path=audio_path, output_dir=out_dir,
+                extract_seconds=time.perf_counter() - start)
+
+def init_worker(hf_token, config_path, cpu, backend="torch"):
+    from utils.pipeline_registry import backend_device, get_registry
+
+    apply_cpu_profile(None, cpu)
+    _worker["hf_token"] = hf_token
+    _worker["config_path"] = config_path
+    _worker["backend"] = backend
+    pipeline = get_registry().get(hf_token, config_path=config_path, device=backend_device(backend), backend=backend)
+    apply_cpu_profile(pipeline, cpu)
+
+def process_job(job):
+    from utils.audio_buffer import AudioBuffer
+    from utils.audio_enhancer import enhance_audio
+    from utils.diarizer import run_diarization
+    from utils.export import save_npz
+    from utils.quality_assessor import assess_diarization_quality
+
+    timings = {"extract": job["extract_seconds"]}
+
+    start = time.perf_counter()
+    audio = AudioBuffer.from_file(job["audio_path"])
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    enhance_audio(audio, output_path=os.path.join(job["output_dir"], "audio_enhanced.wav"))
+    timings["enhance"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    diarization = run_diarization(
+        audio,
+        _worker["hf_token"],
+        min_speakers=job.get("min_speakers"),
+        max_speakers=job.get("max_speakers"),
+        config_path=_worker["config_path"],
+        backend=_worker["backend"],
+    )
+    timings["diarize"] = time.perf_counter() - start
+
+    rttm_path = os.path.join(job["output_dir"], "diarization.rttm")
+    with open(rttm_path, "w") as f:
+        diarization.write_rttm(f)
+
+    start = time.perf_counter()
+    metrics = assess_diarization_quality(diarization, audio)
+    timings["assess"] = time.perf_counter() - start
+
+    # Columnar archive for fleet queries: `python cli.py query overlap <output_dir>`.
+    archive_path = save_npz(diarization, os.path.join(job["output_dir"], "diarization.npz"),
+                            uri=os.path.splitext(os.path.basename(job["video"]))[0],
+                            duration=audio.duration, metrics=metrics)
+
+    return {
+        "video": job["video"],
+        "status": "ok",
+        "rttm": rttm_path,
+        "archive": archive_path,
+        "num_speakers": len(diarization.labels()),
+        "num_segments": metrics["segment_stats"]["count"],
+        "quality_score": float(metrics["quality_score"]),
+        "timings": timings,
+    }
+
+def failure(job, exc):
+    result = {
+        "video": job.get("video"),
+        "status": "error",
+        "error": f"{type(exc).__name__}: {exc}",
+        "traceback": "".join(traceback.format_exception(exc)),
+    }
+    if "line" in job:
+        result["line"] = job["line"]
+    return result
+
+def run_batch(jobs, hf_token, output_root="outputs/batch", workers=None,
+              extract_workers=2, config_path="local_config.yaml", backend="torch"):
+    workers = workers or max(1, os.cpu_count() // 2)
+    cpu = cpu_profile(workers)
+    # Bound how far extraction can run ahead of inference so decoded audio
+    # doesn't pile up on disk when diarization is the bottleneck.
+    max_in_flight = workers * 2
+    os.makedirs(output_root, exist_ok=True)
+    summary_path = os.path.join(output_root, "summary.jsonl")
+
+    print(f"Batch: {len(jobs)} files, {workers} workers x {cpu['intra_op_threads']} threads "
+          f"({cpu['source']} CPU profile)")
+    start = time.perf_counter()
+    results = []
+
+    def start_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                   initargs=(hf_token, config_path, cpu, backend))
+
+    pool = start_pool()
+    with ThreadPoolExecutor(max_workers=extract_workers) as extractors, \
+            open(summary_path, "w") as summary:
+
+        def record(result):
+            results.append(result)
+            summary.write(json.dumps(result) + "\n")
+            summary.flush()
+            status = result["status"]
+            detail = f"score {result['quality_score']:.1f}" if status == "ok" else result["error"]
+            name = result["video"] or f"manifest line {result.get('line')}"
+            print(f"[{len(results)}/{len(jobs)}] {status}: {name} ({detail})")
+
+        pending_jobs = iter(jobs)
+        extracting = {}
+        diarizing = {}
+
+        def refill():
+            while len(extracting) + len(diarizing) < max_in_flight:
+                job = next(pending_jobs, None)
+                if job is None:
+                    return
+                if "invalid" in job:
+                    record(failure(job, ValueError(f"manifest line {job['line']}: {job['invalid']}")))
+                    continue
+                extracting[extractors.submit(extract_job, job, output_root)] = job
+
+        try:
+            refill()
+            while extracting or diarizing:
+                done, _ = wait(list(extracting) + list(diarizing), return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    if future in extracting:
+                        job = extracting.pop(future)
+                        try:
+                            extracted = future.result()
+                        except Exception as exc:
+                            record(failure(job, exc))
+                            continue
+                        try:
+                            diarizing[pool.submit(process_job, extracted)] = job
+                        except BrokenProcessPool as exc:
+                            record(failure(job, exc))
+                            broken = True
+                    else:
+                        job = diarizing.pop(future)
+                        try:
+                            record(future.result())
+                        except BrokenProcessPool as exc:
+                            record(failure(job, exc))
+                            broken = True
+                        except Exception as exc:
+                            record(failure(job, exc))
+                if broken:
+                    # A worker died (e.g. out of memory on a long file) and took the
+                    # pool down with it. Jobs still in that pool fail with it; the
+                    # rest of the batch runs on a fresh pool.
+                    for future, job in diarizing.items():
+                        try:
+                            record(future.result())
+                        except Exception as exc:
+                            record(failure(job, exc))
+                    diarizing.clear()
+                    pool.shutdown(wait=False)
+                    print("Worker pool broke; restarting it for the remaining files")
+                    pool = start_pool()
+                refill()
+        finally:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    print(f"\nBatch complete: {succeeded}/{len(results)} succeeded in {elapsed:.1f}s")
+    print(f"Summary written to {summary_path}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Diarize a directory, glob or JSONL manifest of videos")
+    parser.add_argument("source", help="Directory, glob pattern or .jsonl manifest")
+    parser.add_argument("--output", default="outputs/batch")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--extract-workers", type=int, default=2)
+    parser.add_argument("--config", default="local_config.yaml")
+    parser.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    parser.add_argument("--backend", default="torch", choices=BACKENDS,
+                        help="Inference backend; int8/ONNX backends run on CPU")
+    args = parser.parse_args()
+
+    jobs = collect_inputs(args.source)
+    if not jobs:
+        print(f"No inputs found for: {args.source}")
+        exit(1)
+
+    run_batch(jobs, args.hf_token, output_root=args.output, workers=args.workers,
+              extract_workers=args.extract_workers, config_path=args.config,
+              backend=args.backend)
+
+if __name__ == "__main__":
+    main()
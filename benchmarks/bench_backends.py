@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.audio_buffer import AudioBuffer, load_audio
+from utils.compare import compare_annotations
+from utils.cpu_tuning import apply_cpu_profile, cpu_profile
+from utils.inference_backend import BACKENDS
+from utils.pipeline_registry import backend_device, get_registry
+
+WARMUP_SECONDS = 10
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU throughput and fp32 parity of each inference backend")
+    parser.add_argument("audio", help="Real speech; parity on synthetic audio says little")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--seconds", type=float, default=300, help="Only diarize this much of the file")
+    parser.add_argument("--config", default="local_config.yaml")
+    parser.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    parser.add_argument("--min-jaccard", type=float, default=0.95, help="Speech-region overlap vs fp32")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Speaker assignment agreement vs fp32")
+    args = parser.parse_args()
+
+    audio = load_audio(args.audio)
+    clip = AudioBuffer(audio.samples[:int(args.seconds * audio.sample_rate)], audio.sample_rate)
+    warmup = AudioBuffer(clip.samples[:WARMUP_SECONDS * clip.sample_rate], clip.sample_rate)
+    registry = get_registry()
+    cpu = cpu_profile()
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+
+    print(f"{clip.duration:.0f}s of {args.audio} on CPU, "
+          f"{cpu['intra_op_threads']}+{cpu['inter_op_threads']} threads ({cpu['source']} profile)")
+    print(f"{'Backend':<12}{'Seconds':>9}{'x realtime':>12}{'Speedup':>9}{'Speech J':>10}"
+          f"{'Agreement':>11}{'Speakers':>10}")
+
+    reference = None
+    failed = []
+    for backend in backends:
+        try:
+            pipeline = registry.get(args.hf_token, config_path=args.config,
+                                    device=backend_device(backend), backend=backend)
+        except (ImportError, FileNotFoundError) as exc:
+            print(f"{backend:<12}skipped: {exc}")
+            continue
+        apply_cpu_profile(pipeline, cpu)
+        pipeline(warmup.to_pyannote())
+
+        start = time.perf_counter()
+        annotation = pipeline(clip.to_pyannote())
+        seconds = time.perf_counter() - start
+
+        if reference is None:
+            reference = (annotation, seconds)
+        comparison = compare_annotations(reference[0], annotation, duration=clip.duration)
+        print(f"{backend:<12}{seconds:>9.2f}{clip.duration / seconds:>12.1f}{reference[1] / seconds:>8.2f}x"
+              f"{comparison['speech_jaccard']:>10.3f}{comparison['speaker_agreement']:>11.3f}"
+              f"{comparison['hypothesis_speakers']:>10}")
+        if comparison["speech_jaccard"] < args.min_jaccard or comparison["speaker_agreement"] < args.min_agreement:
+            failed.append(backend)
+        # Each backend holds its own copy of the models; free the last one.
+        registry.clear()
+
+    if failed:
+        print(f"\n❌ Below parity thresholds vs fp32: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.audio_buffer import AudioBuffer, SAMPLE_RATE
+from utils.audio_enhancer import enhance_audio_pydub, enhance_waveform
+
+def synthetic_speech(seconds, sample_rate=SAMPLE_RATE, seed=0):
+    # Voiced bursts with a wandering pitch and loudness, separated by pauses.
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = np.clip(np.sin(2 * np.pi * 3.0 * t), 0, None)
+    phrases = (np.sin(2 * np.pi * 0.15 * t + rng.uniform(0, np.pi)) > -0.3).astype(float)
+    loudness = 0.05 + 0.6 * np.abs(np.sin(2 * np.pi * 0.05 * t))
+    signal = voiced * syllables * phrases * loudness + 0.003 * rng.standard_normal(n)
+    return (signal / np.max(np.abs(signal)) * 0.8).astype(np.float32)
+
+def compare(reference, candidate):
+    error = candidate - reference
+    snr = 10 * np.log10(np.sum(reference ** 2) / max(np.sum(error ** 2), 1e-20))
+    return float(np.max(np.abs(error))), float(snr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy enhancement engine against pydub")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--min-snr", type=float, default=25.0,
+                        help="Fail if the NumPy output is further than this (dB) from pydub's")
+    args = parser.parse_args()
+
+    samples = synthetic_speech(args.seconds)
+    buffer = AudioBuffer(samples)
+
+    start = time.perf_counter()
+    reference = enhance_audio_pydub(buffer).samples
+    pydub_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidate = enhance_waveform(samples, SAMPLE_RATE)
+    numpy_seconds = time.perf_counter() - start
+
+    max_error, snr = compare(reference, candidate)
+    print(f"\nAudio: {args.seconds:.0f}s synthetic speech @ {SAMPLE_RATE} Hz")
+    print(f"pydub engine: {pydub_seconds:8.3f}s  (RTF {pydub_seconds / args.seconds:.4f})")
+    print(f"numpy engine: {numpy_seconds:8.3f}s  (RTF {numpy_seconds / args.seconds:.4f})")
+    print(f"Speedup:      {pydub_seconds / numpy_seconds:8.1f}x")
+    print(f"Max abs diff: {max_error:.4f}  |  SNR vs pydub: {snr:.1f} dB")
+
+    if snr < args.min_snr:
+        print(f"❌ Output deviates from pydub beyond tolerance ({args.min_snr:.0f} dB)")
+        sys.exit(1)
+    print("✅ Output matches pydub within tolerance")
+
+if __name__ == "__main__":
+    main()
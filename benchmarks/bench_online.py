@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import generate_conversation, turns_to_annotation
+from utils.audio_buffer import SAMPLE_RATE
+from utils.compare import compare_annotations
+from utils.online import BLOCK_SECONDS, LATENCY, OnlineDiarizer, diarize_stream, latency_summary
+
+def stream_blocks(samples, block_seconds, realtime=False, sample_rate=SAMPLE_RATE):
+    # Replays audio in fixed blocks; with realtime=True each block is released
+    # only when it would have finished arriving from a live source.
+    block = int(block_seconds * sample_rate)
+    start = time.perf_counter()
+    for offset in range(0, len(samples), block):
+        if realtime:
+            due = start + (offset + block) / sample_rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield samples[offset:offset + block]
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/accuracy of online diarization on a synthetic stream")
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--latencies", type=float, nargs="+", default=[0.25, 0.5, 1.0, 2.0])
+    parser.add_argument("--block", type=float, default=BLOCK_SECONDS)
+    parser.add_argument("--realtime", action="store_true", help="Pace the stream at 1x real time")
+    parser.add_argument("--max-latency", type=float, default=2.0,
+                        help="Fail if p95 latency at --gate-latency exceeds this")
+    parser.add_argument("--gate-latency", type=float, default=LATENCY,
+                        help="Latency setting the p95 check applies to (default: the diarizer's default)")
+    args = parser.parse_args()
+    # The gated setting is always measured, whatever --latencies lists.
+    latencies = args.latencies + ([args.gate_latency] if args.gate_latency not in args.latencies else [])
+
+    samples, turns = generate_conversation(args.seconds, num_speakers=args.speakers, seed=1)
+    reference = turns_to_annotation(turns)
+
+    print(f"Synthetic stream: {args.seconds:.0f}s, {args.speakers} speakers, {args.block * 1000:.0f} ms blocks"
+          f"{' (real-time pacing)' if args.realtime else ''}")
+    print(f"{'Latency':>8}{'p50(s)':>9}{'p95(s)':>9}{'max(s)':>9}{'RTF':>8}{'Speech J':>10}"
+          f"{'Agreement':>11}{'Speakers':>10}{'Relabels':>10}")
+
+    failed = False
+    for latency in latencies:
+        diarizer = OnlineDiarizer(latency=latency)
+        start = time.perf_counter()
+        annotation, events = diarize_stream(stream_blocks(samples, args.block, args.realtime), diarizer)
+        elapsed = time.perf_counter() - start
+
+        summary = latency_summary(events)
+        comparison = compare_annotations(reference, annotation, duration=args.seconds)
+        relabels = sum(1 for e in events if e["type"] == "relabel")
+        print(f"{latency:>8.2f}{summary['p50']:>9.3f}{summary['p95']:>9.3f}{summary['max']:>9.3f}"
+              f"{elapsed / args.seconds:>8.4f}{comparison['speech_jaccard']:>10.3f}"
+              f"{comparison['speaker_agreement']:>11.3f}{comparison['hypothesis_speakers']:>10}{relabels:>10}")
+        if latency == args.gate_latency and summary["p95"] > args.max_latency:
+            failed = True
+
+    if failed:
+        print(f"\n❌ p95 label latency above {args.max_latency:.1f}s at latency {args.gate_latency:g}s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_benchmarks import load_pipeline
+from synthetic import generate_conversation, turns_to_annotation
+from utils.audio_buffer import AudioBuffer
+from utils.compare import compare_annotations
+from utils.diarizer import estimate_speaker_count, run_diarization
+from utils.speaker_count import estimate_speaker_range
+
+def diarize(audio, pipeline, min_speakers, max_speakers):
+    # run_diarization is chatty; only the timing and result matter here.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_diarization(audio, None, min_speakers=min_speakers, max_speakers=max_speakers,
+                               pipeline=pipeline, use_cache=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Duration heuristic vs embedding pre-pass for the speaker range")
+    parser.add_argument("--seconds", type=float, default=1800)
+    parser.add_argument("--speakers", type=int, nargs="+", default=[2, 4, 6, 8])
+    parser.add_argument("--seeds", type=int, default=2)
+    parser.add_argument("--pipeline", default="stub", help='"stub" or module:factory')
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.pipeline)
+    # Untimed warm-up so lazy imports and model loading don't land on the first row.
+    warmup, _ = generate_conversation(10, num_speakers=2, seed=0)
+    diarize(AudioBuffer.from_array(warmup), pipeline, 1, 2)
+    print(f"Synthetic recordings of {args.seconds:.0f}s, {args.pipeline} pipeline")
+    print(f"{'Speakers':>8}{'Seed':>6}  {'Method':<10}{'Range':>7}{'Estimate(s)':>13}{'Total(s)':>10}"
+          f"{'Found':>7}{'Speech J':>10}{'Agreement':>11}")
+
+    totals = {"duration": [0.0, 0.0, 0], "embedding": [0.0, 0.0, 0]}
+    for speakers in args.speakers:
+        for seed in range(args.seeds):
+            samples, turns = generate_conversation(args.seconds, num_speakers=speakers, seed=seed)
+            audio = AudioBuffer.from_array(samples)
+            reference = turns_to_annotation(turns)
+
+            for method in ("duration", "embedding"):
+                start = time.perf_counter()
+                if method == "duration":
+                    low, high = estimate_speaker_count(audio.duration, {})
+                else:
+                    speaker_range, _ = estimate_speaker_range(audio, pipeline)
+                    low, high = speaker_range or estimate_speaker_count(audio.duration, {})
+                estimate_seconds = time.perf_counter() - start
+                hypothesis = diarize(audio, pipeline, low, high)
+                total_seconds = time.perf_counter() - start
+
+                comparison = compare_annotations(reference, hypothesis, duration=audio.duration)
+                print(f"{speakers:>8}{seed:>6}  {method:<10}{f'{low}-{high}':>7}{estimate_seconds:>13.2f}"
+                      f"{total_seconds:>10.2f}{comparison['hypothesis_speakers']:>7}"
+                      f"{comparison['speech_jaccard']:>10.3f}{comparison['speaker_agreement']:>11.3f}")
+                totals[method][0] += total_seconds
+                totals[method][1] += comparison["speaker_agreement"]
+                totals[method][2] += comparison["hypothesis_speakers"] == speakers
+
+    runs = len(args.speakers) * args.seeds
+    print()
+    for method, (seconds, agreement, exact) in totals.items():
+        print(f"{method:<10} total {seconds:7.1f}s  mean agreement {agreement / runs:.3f}  "
+              f"exact speaker count {exact}/{runs}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import soundfile as sf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_conversation
+from utils.audio_buffer import SAMPLE_RATE
+
+# Commands that only read an RTTM file must start and finish well under this.
+LIGHT_COMMANDS = ("segments", "assess")
+LIGHT_LIMIT_SECONDS = 1.0
+
+def write_inputs(workdir, seconds):
+    samples, turns = generate_conversation(seconds, num_speakers=3, seed=1)
+    wav = os.path.join(workdir, "startup.wav")
+    rttm = os.path.join(workdir, "startup.rttm")
+    sf.write(wav, samples, SAMPLE_RATE)
+    with open(rttm, "w") as f:
+        for start, end, speaker in turns:
+            f.write(f"SPEAKER startup 1 {start:.3f} {end - start:.3f} <NA> <NA> {speaker} <NA> <NA>\n")
+    return wav, rttm
+
+def run_command(argv):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, "cli.py"), "--timings", *argv],
+                          cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    timings = [line for line in proc.stderr.splitlines() if line.startswith("[timings]")]
+    heavy = timings[-1].split("heavy imports: ", 1)[1] if timings else ""
+    error = None if proc.returncode == 0 else (proc.stderr.strip().splitlines() or ["failed"])[-1]
+    return elapsed, heavy, error
+
+def main():
+    parser = argparse.ArgumentParser(description="Wall-clock startup cost of each cli.py subcommand")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=60, help="Length of the synthetic input")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        wav, rttm = write_inputs(workdir, args.seconds)
+        commands = {
+            "segments": ["segments", rttm],
+            "assess": ["assess", rttm, "--audio", wav],
+            "plot": ["plot", rttm, "-o", os.path.join(workdir, "plot.png")],
+            "diagnose": ["diagnose", wav],
+            "enhance": ["enhance", wav, "-o", os.path.join(workdir, "enhanced.wav")],
+            "diarize": ["diarize", wav, "--stub", "--no-cache", "-o", os.path.join(workdir, "out.rttm")],
+        }
+
+        print(f"{'Command':<10}{'median(s)':>10}{'min(s)':>9}  Heavy imports")
+        failed = False
+        for name, argv in commands.items():
+            times, heavy, error = [], "", None
+            for _ in range(args.repeats):
+                elapsed, heavy, error = run_command(argv)
+                if error:
+                    break
+                times.append(elapsed)
+            if error:
+                print(f"{name:<10}{'skipped':>10}{'':>9}  {error}")
+                continue
+            median = statistics.median(times)
+            print(f"{name:<10}{median:>10.3f}{min(times):>9.3f}  {heavy}")
+            if name in LIGHT_COMMANDS and median >= LIGHT_LIMIT_SECONDS:
+                failed = True
+
+    if failed:
+        print(f"\n❌ A light command took {LIGHT_LIMIT_SECONDS:.1f}s or more to run")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.audio_buffer import AudioBuffer, SAMPLE_RATE
+from utils.vad import detect_speech
+
+def synthetic_with_silence(seconds, silence_ratio, sample_rate=SAMPLE_RATE, seed=0):
+    # Alternating voiced bursts and pauses; returns the audio and its true speech mask.
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    mask = np.zeros(n, dtype=bool)
+    cursor = 0
+    mean_speech = 3.0
+    mean_silence = mean_speech * silence_ratio / max(1 - silence_ratio, 1e-3)
+    while cursor < n:
+        speech = int(rng.exponential(mean_speech) * sample_rate) + sample_rate // 4
+        mask[cursor:cursor + speech] = True
+        cursor += speech + int(rng.exponential(mean_silence) * sample_rate)
+
+    t = np.arange(n) / sample_rate
+    pitch = 110 + 60 * np.sin(2 * np.pi * 0.2 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8)) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t) ** 2)
+    signal = 0.3 * voiced * mask + 0.002 * rng.standard_normal(n)
+    return signal.astype(np.float32), mask
+
+def regions_mask(regions, n, sample_rate=SAMPLE_RATE):
+    mask = np.zeros(n, dtype=bool)
+    for start, end in np.round(regions * sample_rate).astype(int):
+        mask[start:end] = True
+    return mask
+
+def run_pipeline_comparison(audio_path, hf_token):
+    from utils.audio_buffer import load_audio
+    from utils.compare import compare_annotations
+    from utils.diarizer import run_diarization
+
+    audio = load_audio(audio_path)
+    start = time.perf_counter()
+    full = run_diarization(audio, hf_token, use_cache=False)
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    skipped = run_diarization(audio, hf_token, use_cache=False, vad=True)
+    vad_seconds = time.perf_counter() - start
+
+    comparison = compare_annotations(full, skipped, duration=audio.duration)
+    print(f"\nPipeline on {audio_path} ({audio.duration:.0f}s)")
+    print(f"Full inference:  {full_seconds:8.2f}s")
+    print(f"With VAD:        {vad_seconds:8.2f}s  ({full_seconds / vad_seconds:.2f}x)")
+    print(f"Speech Jaccard:  {comparison['speech_jaccard']:.3f}")
+    print(f"Speaker agreement: {comparison['speaker_agreement']:.3f}")
+    print(f"Segments: {comparison['reference_segments']} -> {comparison['hypothesis_segments']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the energy VAD pre-pass")
+    parser.add_argument("--seconds", type=float, default=600.0)
+    parser.add_argument("--silence-ratio", type=float, default=0.5)
+    parser.add_argument("--audio", help="Optional real recording to diarize with and without VAD")
+    parser.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    args = parser.parse_args()
+
+    samples, truth = synthetic_with_silence(args.seconds, args.silence_ratio)
+    start = time.perf_counter()
+    regions = detect_speech(AudioBuffer(samples))
+    vad_seconds = time.perf_counter() - start
+
+    kept = regions_mask(regions, len(samples))
+    recall = np.sum(kept & truth) / max(np.sum(truth), 1)
+    kept_ratio = np.mean(kept)
+
+    print(f"Synthetic audio: {args.seconds:.0f}s, true silence {100 * (1 - np.mean(truth)):.1f}%")
+    print(f"VAD time:        {vad_seconds * 1000:8.1f}ms  (RTF {vad_seconds / args.seconds:.5f})")
+    print(f"Regions:         {len(regions)}")
+    print(f"Audio kept:      {100 * kept_ratio:.1f}%  -> inference compute saved ~{100 * (1 - kept_ratio):.1f}%")
+    print(f"Speech recall:   {100 * recall:.2f}%")
+
+    if args.audio:
+        run_pipeline_comparison(args.audio, args.hf_token)
+
+if __name__ == "__main__":
+    main()
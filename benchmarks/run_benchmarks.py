@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_conversation, write_wav
+from utils.audio_buffer import AudioBuffer
+from utils.profiler import StageProfiler, peak_rss_bytes, set_profiler
+from utils.segment_table import SegmentTable
+
+DEFAULT_DURATIONS = [60, 600, 1800, 3600, 10800]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Differences smaller than this are timer noise, not regressions.
+NOISE_FLOOR_SECONDS = 0.05
+# Allowed p50 slowdown when neither the baseline nor --tolerance sets one.
+DEFAULT_TOLERANCE = 0.2
+
+def load_pipeline(name):
+    # "stub" runs fully offline; anything else is "module:attribute" for a
+    # callable returning a pipeline-like object.
+    if name == "stub":
+        from utils.stub_pipeline import StubPipeline
+        return StubPipeline()
+    module_name, attribute = name.split(":")
+    module = __import__(module_name, fromlist=[attribute])
+    return getattr(module, attribute)()
+
+def run_once(duration, speakers, overlap, silence, pipeline, workdir, seed):
+    from utils.audio_enhancer import enhance_audio
+    from utils.audio_extractor import extract_audio_buffer
+    from utils.diarizer import plot_diarization, run_diarization
+    from utils.quality_assessor import assess_diarization_quality
+
+    samples, _ = generate_conversation(duration, num_speakers=speakers, overlap_ratio=overlap,
+                                       silence_ratio=silence, seed=seed)
+    profiler = set_profiler(StageProfiler(audio_duration=duration))
+
+    if shutil.which("ffmpeg"):
+        wav_path = write_wav(os.path.join(workdir, f"synthetic_{duration}.wav"), samples)
+        with profiler.stage("extract_audio"):
+            audio = extract_audio_buffer(wav_path)
+    else:
+        audio = AudioBuffer(samples)
+
+    with profiler.stage("enhance_audio"):
+        enhance_audio(audio)
+
+    # analyze_audio_characteristics and inference are recorded inside run_diarization.
+    diarization = run_diarization(audio, None, pipeline=pipeline, use_cache=False,
+                                  min_speakers=1, max_speakers=max(speakers, 2))
+
+    with profiler.stage("assess_diarization_quality"):
+        assess_diarization_quality(SegmentTable.from_annotation(diarization), audio, verbose=False)
+
+    with profiler.stage("plot_diarization"):
+        plot_diarization(diarization, output_path=os.path.join(workdir, "plot.png"))
+
+    set_profiler(None)
+    return profiler.records
+
+def summarize(duration, runs):
+    stages = {}
+    for records in runs:
+        for record in records:
+            stages.setdefault(record["stage"], []).append(record)
+
+    summary = {}
+    for stage, records in stages.items():
+        walls = np.array([r["wall_seconds"] for r in records])
+        summary[stage] = {
+            "p50_seconds": float(np.percentile(walls, 50)),
+            "p95_seconds": float(np.percentile(walls, 95)),
+            "cpu_seconds": float(np.mean([r["cpu_seconds"] for r in records])),
+            "peak_rss_delta_mb": float(max(r["peak_rss_delta_mb"] for r in records)),
+            "throughput_x_realtime": float(duration / np.median(walls)) if np.median(walls) > 0 else None,
+        }
+    total = np.array([sum(r["wall_seconds"] for r in records) for records in runs])
+    summary["total"] = {
+        "p50_seconds": float(np.percentile(total, 50)),
+        "p95_seconds": float(np.percentile(total, 95)),
+        "throughput_x_realtime": float(duration / np.median(total)),
+    }
+    return summary
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for duration, stages in results.items():
+        for stage, stats in stages.items():
+            reference = baseline.get(duration, {}).get(stage)
+            if not reference:
+                continue
+            limit = reference["p50_seconds"] * (1 + tolerance)
+            if stats["p50_seconds"] > limit and stats["p50_seconds"] - reference["p50_seconds"] > NOISE_FLOOR_SECONDS:
+                regressions.append((duration, stage, reference["p50_seconds"], stats["p50_seconds"]))
+    return regressions
+
+def print_results(results):
+    print("\n" + "="*78)
+    print("OFFLINE BENCHMARK")
+    print("="*78)
+    print(f"{'Audio':>7}  {'Stage':<32}{'p50(s)':>9}{'p95(s)':>9}{'RSS+MB':>8}{'x RT':>10}")
+    for duration, stages in results.items():
+        for stage, stats in stages.items():
+            rss = f"{stats['peak_rss_delta_mb']:.0f}" if "peak_rss_delta_mb" in stats else ""
+            speed = f"{stats['throughput_x_realtime']:.1f}" if stats.get("throughput_x_realtime") else "-"
+            print(f"{duration:>6}s  {stage:<32}{stats['p50_seconds']:>9.3f}{stats['p95_seconds']:>9.3f}"
+                  f"{rss:>8}{speed:>10}")
+    print("="*78)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark on synthetic multi-speaker audio")
+    parser.add_argument("--durations", type=float, nargs="+", default=DEFAULT_DURATIONS)
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--overlap", type=float, default=0.05)
+    parser.add_argument("--silence", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=None,
+                        help="Runs per duration (default: 3 up to 10 min, 1 beyond)")
+    parser.add_argument("--pipeline", default="stub", help='"stub" or module:factory')
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"Allowed p50 slowdown before flagging (default: the baseline's, else {DEFAULT_TOLERANCE})")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.pipeline)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # Untimed warm-up so lazy imports and first-call setup don't land in
+        # the first measured run.
+        run_once(10, args.speakers, args.overlap, args.silence, pipeline, workdir, seed=0)
+        for duration in args.durations:
+            repeats = args.repeats or (3 if duration <= 600 else 1)
+            print(f"\n--- {duration:.0f}s x {repeats} ---")
+            runs = []
+            for seed in range(repeats):
+                start = time.perf_counter()
+                runs.append(run_once(duration, args.speakers, args.overlap, args.silence, pipeline, workdir, seed))
+                print(f"run {seed + 1}/{repeats}: {time.perf_counter() - start:.2f}s")
+            results[str(int(duration))] = summarize(duration, runs)
+
+    print_results(results)
+    print(f"Process peak RSS: {peak_rss_bytes() / (1024 * 1024):.0f} MB")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    payload = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "pipeline": args.pipeline,
+               "speakers": args.speakers, "results": results}
+    with open(os.path.join(RESULTS_DIR, "latest.json"), "w") as f:
+        json.dump(payload, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"pipeline": args.pipeline, "speakers": args.speakers,
+                       "tolerance": args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE,
+                       "results": results}, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    # Timings from a different pipeline say nothing about regressions.
+    if baseline.get("pipeline", args.pipeline) != args.pipeline:
+        print(f"\nBaseline was recorded with the {baseline['pipeline']} pipeline; not comparing")
+        return
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+    regressions = find_regressions(results, baseline.get("results", baseline), tolerance)
+    if regressions:
+        print(f"\n❌ Performance regressions (tolerance {tolerance:.0%}):")
+        for duration, stage, before, after in regressions:
+            print(f"   • {duration}s {stage}: {before:.3f}s -> {after:.3f}s ({after / before:.2f}x)")
+        sys.exit(1)
+    print(f"\n✅ No regressions against baseline (tolerance {tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
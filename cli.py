@@ -0,0 +1,262 @@
+import time
+
+CLI_START = time.perf_counter()
+
+import argparse
+import os
+import sys
+
+from utils.inference_backend import BACKENDS
+
+# Modules whose import cost dominates startup; --timings reports which of
+# them a subcommand ended up loading.
+HEAVY_MODULES = ("torch", "pyannote.audio", "pyannote.core", "matplotlib", "librosa", "scipy.signal", "pydub")
+
+# Every handler imports what it needs itself, so e.g. `assess` never pays
+# for torch or matplotlib.
+
+def load_segments(path):
+    from utils.segment_table import SegmentTable
+
+    with open(path) as f:
+        return SegmentTable.from_rttm(f)
+
+class UsageError(Exception):
+    # Reported through argparse, as a usage error with exit status 2.
+    pass
+
+def recording_duration(args, segments):
+    from utils.audio_buffer import audio_duration
+
+    if args.duration is not None or args.audio:
+        duration = audio_duration(args.duration if args.duration is not None else args.audio)
+        if duration <= 0:
+            raise UsageError(f"the recording duration must be positive, got {duration:g}s")
+        return duration
+    # Without the audio, the last segment end is the best duration estimate.
+    if segments.max_end <= 0:
+        raise UsageError(f"cannot infer a duration: {args.rttm} has no segments; pass --duration or --audio")
+    return segments.max_end
+
+def default_output(path, suffix):
+    return os.path.join("outputs", os.path.splitext(os.path.basename(path))[0] + suffix)
+
+def cmd_extract(args):
+    from utils.audio_extractor import extract_audio
+
+    output = args.output or default_output(args.input, ".wav")
+    print(f"Extracted audio to {extract_audio(args.input, output)}")
+
+def cmd_enhance(args):
+    from utils.audio_enhancer import enhance_audio
+
+    enhance_audio(args.audio, output_path=args.output, engine=args.engine)
+
+def cmd_diarize(args):
+    from utils.diarizer import ShardingOptionError, print_segments, run_diarization
+    from utils.result_cache import write_rttm
+
+    pipeline = None
+    if args.stub:
+        from utils.stub_pipeline import StubPipeline
+        pipeline = StubPipeline()
+
+    try:
+        diarization = run_diarization(
+            args.audio, args.hf_token, min_speakers=args.min_speakers, max_speakers=args.max_speakers,
+            pipeline=pipeline, config_path=args.config, use_cache=not args.no_cache,
+            refresh_cache=args.refresh_cache, vad=args.vad, shard_seconds=args.shard_seconds,
+            shard_overlap=args.shard_overlap, shard_workers=args.shard_workers, backend=args.backend
+        )
+    except ShardingOptionError as exc:
+        # e.g. --stub or --min-speakers with --shard-seconds, or an overlap as long as a shard.
+        raise UsageError(str(exc))
+    output = args.output or default_output(args.audio, ".rttm")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        write_rttm(diarization, f, uri=os.path.splitext(os.path.basename(args.audio))[0])
+    if args.print:
+        print_segments(diarization)
+    print(f"Saved {len(diarization.labels())} speakers to {output}")
+
+def cmd_calibrate(args):
+    import torch
+    from utils.cpu_tuning import calibrate, print_calibration_report, profile_path
+    from utils.pipeline_registry import get_registry
+
+    pipeline = get_registry().get(args.hf_token, config_path=args.config, device=torch.device("cpu"))
+    profile = calibrate(pipeline, args.audio, workers=args.workers, seconds=args.seconds)
+    print_calibration_report(profile)
+    print(f"\nSaved CPU profile for {profile['host']} to {profile_path()}")
+
+def cmd_export_models(args):
+    import torch
+    from utils.inference_backend import export_models, model_dir
+    from utils.pipeline_registry import get_registry
+
+    pipeline = get_registry().get(args.hf_token, config_path=args.config, device=torch.device("cpu"))
+    output_dir = args.output or model_dir(args.config)
+    export_models(pipeline, output_dir, quantize=not args.no_quantize)
+    print(f"Saved ONNX models to {output_dir}")
+
+def cmd_segments(args):
+    from utils.diarizer import print_segments
+
+    print_segments(load_segments(args.rttm))
+
+def cmd_assess(args):
+    from utils.quality_assessor import assess_diarization_quality, suggest_improvements
+
+    segments = load_segments(args.rttm)
+    metrics = assess_diarization_quality(segments, recording_duration(args, segments))
+    for i, suggestion in enumerate(suggest_improvements(metrics), 1):
+        print(f"   {i}. {suggestion}")
+
+def cmd_plot(args):
+    from utils.diarizer import plot_diarization
+
+    plot_diarization(load_segments(args.rttm), output_path=args.output or default_output(args.rttm, ".png"),
+                     dpi=args.dpi, thumbnail=args.thumbnail, show=args.show)
+
+def cmd_export(args):
+    from utils.export import export_segments
+
+    segments = load_segments(args.rttm)
+    duration = recording_duration(args, segments)
+    metrics = None
+    if args.output.endswith(".npz") and not args.no_metrics:
+        from utils.quality_assessor import assess_diarization_quality
+        metrics = assess_diarization_quality(segments, duration, verbose=False)
+    export_segments(segments, args.output, uri=args.uri, duration=duration, metrics=metrics)
+    print(f"Exported {len(segments)} segments to {args.output}")
+
+def cmd_query(args):
+    from utils.export import overlap_per_hour, talk_time_per_speaker
+
+    if args.query == "talk-time":
+        print(f"{'Recording':<32}{'Speaker':<16}{'Seconds':>10}")
+        for uri, speaker, seconds in talk_time_per_speaker(args.sources):
+            print(f"{uri:<32}{speaker:<16}{seconds:>10.1f}")
+    else:
+        print(f"{'Recording':<32}{'Hours':>8}{'Overlap(s)':>12}{'Overlap/h':>11}")
+        for uri, hours, overlap, per_hour in overlap_per_hour(args.sources):
+            print(f"{uri:<32}{hours:>8.2f}{overlap:>12.1f}{per_hour:>11.1f}")
+
+def cmd_diagnose(args):
+    from diagnose_audio import diagnose_audio, run_diagnostics
+
+    if len(args.sources) == 1 and os.path.isfile(args.sources[0]) and not args.csv:
+        diagnose_audio(args.sources[0])
+    else:
+        run_diagnostics(args.sources, compare=args.compare, labels=args.labels, workers=args.workers,
+                        csv_path=args.csv)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Speaker diarization toolkit")
+    parser.add_argument("--timings", action="store_true", help="Report startup/run time and heavy imports")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("extract", help="Extract 16 kHz mono WAV from a video/audio file")
+    p.add_argument("input")
+    p.add_argument("-o", "--output")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("enhance", help="Filter, compress and normalise an audio file")
+    p.add_argument("audio")
+    p.add_argument("-o", "--output")
+    p.add_argument("--engine", default="numpy", choices=["numpy", "pydub"])
+    p.set_defaults(func=cmd_enhance)
+
+    p = sub.add_parser("diarize", help="Diarize an audio file and write RTTM")
+    p.add_argument("audio")
+    p.add_argument("-o", "--output")
+    p.add_argument("--min-speakers", type=int)
+    p.add_argument("--max-speakers", type=int)
+    p.add_argument("--config", default="local_config.yaml")
+    p.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    p.add_argument("--vad", action="store_true", help="Skip silence before inference")
+    p.add_argument("--shard-seconds", type=float, help="Diarize long audio in parallel shards")
+    p.add_argument("--shard-overlap", type=float, help="Seconds shared by consecutive shards (default 30)")
+    p.add_argument("--shard-workers", type=int, help="Shard worker processes (default: one per core)")
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--refresh-cache", action="store_true")
+    p.add_argument("--stub", action="store_true", help="Offline stub pipeline (no model download)")
+    p.add_argument("--backend", default="torch", choices=BACKENDS,
+                   help="Inference backend; int8/ONNX backends run on CPU")
+    p.add_argument("--print", action="store_true", help="Print the segments")
+    p.set_defaults(func=cmd_diarize)
+
+    p = sub.add_parser("calibrate", help="Tune CPU threads and batch sizes for this host")
+    p.add_argument("audio", help="Representative audio; only the first --seconds are used")
+    p.add_argument("--workers", type=int, default=1, help="Worker processes that will share this host")
+    p.add_argument("--seconds", type=float, default=60)
+    p.add_argument("--config", default="local_config.yaml")
+    p.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    p.set_defaults(func=cmd_calibrate)
+
+    p = sub.add_parser("export-models", help="Export segmentation/embedding models to ONNX (+ int8)")
+    p.add_argument("-o", "--output", help="Defaults to the directory the onnx backends load from")
+    p.add_argument("--no-quantize", action="store_true", help="Skip the int8 copies")
+    p.add_argument("--config", default="local_config.yaml")
+    p.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    p.set_defaults(func=cmd_export_models)
+
+    p = sub.add_parser("segments", help="Print the segments of an RTTM file")
+    p.add_argument("rttm")
+    p.set_defaults(func=cmd_segments)
+
+    p = sub.add_parser("assess", help="Quality report for an RTTM file")
+    p.add_argument("rttm")
+    p.add_argument("--audio", help="Audio file to take the duration from")
+    p.add_argument("--duration", type=float, help="Audio duration in seconds")
+    p.set_defaults(func=cmd_assess)
+
+    p = sub.add_parser("plot", help="Timeline plot of an RTTM file")
+    p.add_argument("rttm")
+    p.add_argument("-o", "--output", help=".png (default), .svg or .json")
+    p.add_argument("--dpi", type=int, default=150)
+    p.add_argument("--thumbnail", action="store_true", help="Small preview without decorations")
+    p.add_argument("--show", action="store_true", help="Also open the plot in a window")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("export", help="Convert an RTTM file to RTTM, JSONL or columnar NPZ")
+    p.add_argument("rttm")
+    p.add_argument("-o", "--output", required=True, help="Format from the extension: .rttm, .jsonl or .npz")
+    p.add_argument("--uri", help="Recording name; defaults to the output file name")
+    p.add_argument("--audio", help="Audio file to take the duration from")
+    p.add_argument("--duration", type=float, help="Audio duration in seconds")
+    p.add_argument("--no-metrics", action="store_true", help="Leave quality metrics out of .npz archives")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("query", help="Fleet-wide queries over .npz archives")
+    p.add_argument("query", choices=["talk-time", "overlap"])
+    p.add_argument("sources", nargs="+", help="Archives, directories or glob patterns")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("diagnose", help="Streaming signal statistics for audio files or directories")
+    p.add_argument("sources", nargs="+", help="Files, directories or glob patterns")
+    p.add_argument("--compare", action="store_true", help="Each source is one version; the first is the baseline")
+    p.add_argument("--labels", nargs="+", help="Names for the compared versions")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--csv", help="Also write the table to this CSV file")
+    p.set_defaults(func=cmd_diagnose)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    ready = time.perf_counter()
+    try:
+        args.func(args)
+    except UsageError as exc:
+        parser.error(str(exc))
+    done = time.perf_counter()
+
+    if args.timings:
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        print(f"[timings] {args.command}: startup {(ready - CLI_START) * 1000:.0f} ms, "
+              f"run {(done - ready) * 1000:.0f} ms, heavy imports: {', '.join(loaded) or 'none'}",
+              file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
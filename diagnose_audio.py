@@ -1,75 +1,287 @@
-import librosa
-import numpy as np
+import argparse
+import csv
+import glob
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from utils.audio_buffer import AudioBuffer
+
+SILENCE_THRESHOLD = 0.01
+CLIP_THRESHOLD = 0.95
+PREEMPHASIS = 0.97
+N_FFT = 2048
+HOP_LENGTH = 512
+BLOCK_FRAMES = 1 << 16
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".aiff", ".aif")
+
+class SignalStats:
+    """Single-pass, constant-memory accumulator for the diagnostics.
+
+    Blocks of mono samples go in one at a time; only running sums and the
+    last N_FFT samples needed by the next STFT frame are kept. The spectral
+    centroid uses centred, zero-padded, Hann-windowed frames like
+    librosa.feature.spectral_centroid, and pre-emphasis uses librosa's
+    default initial state, so results match the whole-array computation.
+    """
+
+    def __init__(self, sample_rate, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window = np.hanning(n_fft + 1)[:-1]
+        self.freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+        self.samples = 0
+        self.sum_squares = 0.0
+        self.silent = 0
+        self.clipped = 0
+        self.peak = 0.0
+        self.preemphasis_energy = 0.0
+        self.centroid_sum = 0.0
+        self.frames = 0
+        self._previous = None
+        # Centre padding: the first frame is centred on sample 0.
+        self._pending = np.zeros(n_fft // 2, dtype=np.float64)
+
+    def update(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if not len(block):
+            return
+        magnitude = np.abs(block)
+        self.samples += len(block)
+        self.sum_squares += float(np.dot(block, block))
+        self.silent += int(np.count_nonzero(magnitude < SILENCE_THRESHOLD))
+        self.clipped += int(np.count_nonzero(magnitude > CLIP_THRESHOLD))
+        self.peak = max(self.peak, float(magnitude.max()))
+
+        if self._previous is None:
+            # librosa.effects.preemphasis starts from zi = 2*y[0] - y[1].
+            self._previous = 2 * block[0] - block[1] if len(block) > 1 else block[0]
+        shifted = np.concatenate(([self._previous], block[:-1]))
+        emphasized = block - PREEMPHASIS * shifted
+        self.preemphasis_energy += float(np.dot(emphasized, emphasized))
+        self._previous = block[-1]
+
+        self._frames(np.concatenate((self._pending, block)))
+
+    def _frames(self, buffer):
+        n = (len(buffer) - self.n_fft) // self.hop_length + 1 if len(buffer) >= self.n_fft else 0
+        if n > 0:
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, self.n_fft)[::self.hop_length][:n]
+            spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1))
+            total = spectrum.sum(axis=1)
+            weighted = spectrum @ self.freqs
+            centroids = np.divide(weighted, total, out=np.zeros_like(weighted), where=total > 0)
+            self.centroid_sum += float(centroids.sum())
+            self.frames += n
+        self._pending = buffer[n * self.hop_length:]
+
+    def finish(self):
+        self._frames(np.concatenate((self._pending, np.zeros(self.n_fft // 2))))
+        self._pending = self._pending[:0]
+        n = max(self.samples, 1)
+        return {
+            'duration': self.samples / self.sample_rate,
+            'sample_rate': self.sample_rate,
+            'samples': self.samples,
+            'rms': float(np.sqrt(self.sum_squares / n)),
+            'peak': self.peak,
+            'silence_percentage': self.silent / n * 100,
+            'clip_percentage': self.clipped / n * 100,
+            'spectral_centroid': self.centroid_sum / self.frames if self.frames else 0.0,
+            'vad_energy': self.preemphasis_energy / n,
+        }
+
+def iter_blocks(audio, block_frames=BLOCK_FRAMES):
+    # Mono blocks from a buffer or a file, never holding the whole file.
+    if isinstance(audio, AudioBuffer):
+        samples = audio.samples
+        for start in range(0, len(samples), block_frames):
+            yield np.asarray(samples[start:start + block_frames])
+        return
+    for block in sf.blocks(audio, blocksize=block_frames, dtype="float32", always_2d=True):
+        yield block.mean(axis=1)
+
+def assess_signal(stats):
+    if stats['rms'] < 0.001:
+        return "⚠️  WARNING: Very low RMS energy - audio might be too quiet"
+    elif stats['silence_percentage'] > 80:
+        return "⚠️  WARNING: High silence percentage - audio might be mostly silence"
+    elif stats['clip_percentage'] > 5:
+        return "⚠️  WARNING: High clipping percentage - audio might be distorted"
+    return "✅ Audio appears to have reasonable characteristics"
+
+def analyze_audio(audio, block_frames=BLOCK_FRAMES):
+    sample_rate = audio.sample_rate if isinstance(audio, AudioBuffer) else sf.info(audio).samplerate
+    accumulator = SignalStats(sample_rate)
+    for block in iter_blocks(audio, block_frames):
+        accumulator.update(block)
+    stats = accumulator.finish()
+    stats['path'] = (audio.path or '<in-memory>') if isinstance(audio, AudioBuffer) else audio
+    stats['status'] = assess_signal(stats)
+    return stats
 
-def diagnose_audio(audio_path):
-    print(f"Diagnosing audio file: {audio_path}")
+def diagnose_audio(audio, verbose=True):
+    stats = analyze_audio(audio)
+    if not verbose:
+        return stats
+
+    if isinstance(audio, AudioBuffer):
+        print(f"Diagnosing audio buffer: {stats['path']}")
+    else:
+        print(f"Diagnosing audio file: {audio}")
     print("="*50)
-    
-    # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
-    duration = len(y) / sr
-    
-    print(f"Duration: {duration:.2f} seconds")
-    print(f"Sample rate: {sr} Hz")
-    print(f"Number of samples: {len(y)}")
-    
-    # Basic statistics
-    rms = np.sqrt(np.mean(y**2))
-    print(f"RMS energy: {rms:.6f}")
-    
-    # Check for silence
-    silence_threshold = 0.01
-    silent_samples = np.sum(np.abs(y) < silence_threshold)
-    silence_percentage = (silent_samples / len(y)) * 100
-    print(f"Silence percentage: {silence_percentage:.1f}%")
-    
-    # Check for clipping
-    clipped_samples = np.sum(np.abs(y) > 0.95)
-    clip_percentage = (clipped_samples / len(y)) * 100
-    print(f"Clipped samples: {clip_percentage:.1f}%")
-    
-    # Spectral analysis
-    spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-    print(f"Spectral centroid: {spectral_centroid:.1f} Hz")
-    
-    # Voice activity detection
-    vad = librosa.effects.preemphasis(y)
-    vad_energy = np.sum(vad**2) / len(vad)
-    print(f"VAD energy: {vad_energy:.6f}")
-    
-    # Check if audio has meaningful content
-    if rms < 0.001:
-        print("⚠️  WARNING: Very low RMS energy - audio might be too quiet")
-    elif silence_percentage > 80:
-        print("⚠️  WARNING: High silence percentage - audio might be mostly silence")
-    elif clip_percentage > 5:
-        print("⚠️  WARNING: High clipping percentage - audio might be distorted")
+    print(f"Duration: {stats['duration']:.2f} seconds")
+    print(f"Sample rate: {stats['sample_rate']} Hz")
+    print(f"Number of samples: {stats['samples']}")
+    print(f"RMS energy: {stats['rms']:.6f}")
+    print(f"Silence percentage: {stats['silence_percentage']:.1f}%")
+    print(f"Clipped samples: {stats['clip_percentage']:.1f}%")
+    print(f"Spectral centroid: {stats['spectral_centroid']:.1f} Hz")
+    print(f"VAD energy: {stats['vad_energy']:.6f}")
+    print(stats['status'])
+    return stats
+
+def collect_audio_files(sources):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(AUDIO_EXTENSIONS))
+        elif any(c in source for c in "*?["):
+            paths.extend(sorted(glob.glob(source, recursive=True)))
+        else:
+            paths.append(source)
+    return paths
+
+def diagnose_files(paths, workers=None):
+    # One file per task; every worker streams its file in constant memory.
+    workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+    if workers == 1:
+        return [safe_analyze(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(safe_analyze, paths))
+
+def safe_analyze(path):
+    try:
+        return analyze_audio(path)
+    except Exception as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}"}
+
+TABLE_COLUMNS = (
+    ('duration', 'Dur(s)', '{:.1f}'),
+    ('sample_rate', 'SR', '{}'),
+    ('rms', 'RMS', '{:.4f}'),
+    ('peak', 'Peak', '{:.3f}'),
+    ('silence_percentage', 'Silence%', '{:.1f}'),
+    ('clip_percentage', 'Clip%', '{:.2f}'),
+    ('spectral_centroid', 'Centroid', '{:.0f}'),
+    ('vad_energy', 'VAD energy', '{:.6f}'),
+)
+
+def print_table(results):
+    width = max([len(os.path.basename(r['path'])) for r in results] + [4])
+    print(f"{'File':<{width}}" + "".join(f"{title:>12}" for _, title, _ in TABLE_COLUMNS) + "  Status")
+    for r in results:
+        name = os.path.basename(r['path'])
+        if 'error' in r:
+            print(f"{name:<{width}}  ❌ {r['error']}")
+            continue
+        cells = "".join(f"{fmt.format(r[key]):>12}" for key, _, fmt in TABLE_COLUMNS)
+        print(f"{name:<{width}}{cells}  {r['status']}")
+
+def write_csv(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fields = ['path'] + [key for key, _, _ in TABLE_COLUMNS] + ['status', 'error']
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+def match_versions(sources):
+    """Group the same recording across N versions (e.g. original, enhanced).
+
+    Files are compared directly in the order given. Directories are matched
+    by relative path without extension, and only recordings present in every
+    directory are kept.
+    """
+    if all(os.path.isfile(source) for source in sources):
+        return {os.path.basename(sources[0]): list(sources)}
+    listings = []
+    for source in sources:
+        files = collect_audio_files([source])
+        listings.append({os.path.splitext(os.path.relpath(f, source))[0]: f for f in files})
+    common = sorted(set(listings[0]).intersection(*listings[1:]))
+    return {key: [listing[key] for listing in listings] for key in common}
+
+def print_comparison(groups, results_by_path, labels):
+    # Changes relative to the first version: ratios for energies, differences for percentages.
+    print(f"{'Recording':<24}{'Version':<14}{'RMS':>10}{'Silence%':>10}{'Clip%':>8}{'Centroid':>10}"
+          f"{'VAD energy':>12}")
+    for key, paths in groups.items():
+        base = results_by_path[paths[0]]
+        for i, (label, path) in enumerate(zip(labels, paths)):
+            r = results_by_path[path]
+            name = key if i == 0 else ""
+            if 'error' in r or 'error' in base:
+                print(f"{name:<24}{label:<14}  ❌ {r.get('error') or base.get('error')}")
+                continue
+            if i == 0:
+                print(f"{name:<24}{label:<14}{r['rms']:>10.4f}{r['silence_percentage']:>10.1f}"
+                      f"{r['clip_percentage']:>8.2f}{r['spectral_centroid']:>10.0f}{r['vad_energy']:>12.6f}")
+            else:
+                print(f"{name:<24}{label:<14}{ratio(r['rms'], base['rms']):>10}"
+                      f"{r['silence_percentage'] - base['silence_percentage']:>+10.1f}"
+                      f"{r['clip_percentage'] - base['clip_percentage']:>+8.2f}"
+                      f"{r['spectral_centroid'] - base['spectral_centroid']:>+10.0f}"
+                      f"{ratio(r['vad_energy'], base['vad_energy']):>12}")
+
+def ratio(value, base):
+    return f"{value / base:.2f}x" if base else "-"
+
+def run_diagnostics(sources, compare=False, labels=None, workers=None, csv_path=None):
+    if compare:
+        if len(sources) < 2:
+            raise ValueError("Comparison needs at least two versions")
+        labels = labels or [os.path.basename(os.path.normpath(s)) for s in sources]
+        groups = match_versions(sources)
+        paths = [path for group in groups.values() for path in group]
     else:
-        print("✅ Audio appears to have reasonable characteristics")
-    
-    return {
-        'duration': duration,
-        'rms': rms,
-        'silence_percentage': silence_percentage,
-        'vad_energy': vad_energy
-    }
+        paths = collect_audio_files(sources)
+    if not paths:
+        print(f"No audio files found in: {' '.join(sources)}")
+        return []
+
+    results = diagnose_files(paths, workers)
+    print_table(results)
+    if csv_path:
+        write_csv(results, csv_path)
+        print(f"\nSaved report to {csv_path}")
+    if compare:
+        print("\nCOMPARISON:")
+        print_comparison(groups, {r['path']: r for r in results}, labels)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming signal diagnostics for audio files")
+    parser.add_argument("sources", nargs="*", help="Files, directories or glob patterns")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare versions: each source is one version (file or directory), first is the baseline")
+    parser.add_argument("--labels", nargs="+", help="Names for the compared versions")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--csv", default=None, help="Also write the table to this CSV file")
+    args = parser.parse_args(argv)
+
+    sources, labels = args.sources, args.labels
+    if not sources:
+        # Original vs enhanced output of the last main.py run.
+        sources, args.compare = ["outputs/audio.wav", "outputs/audio_enhanced.wav"], True
+        labels = labels or ["original", "enhanced"]
+    if args.compare and len(sources) < 2:
+        parser.error("--compare needs at least two versions")
+    run_diagnostics(sources, compare=args.compare, labels=labels, workers=args.workers, csv_path=args.csv)
 
 if __name__ == "__main__":
-    # Check original audio
-    print("ORIGINAL AUDIO:")
-    original_stats = diagnose_audio("outputs/audio.wav")
-    
-    print("\n" + "="*50 + "\n")
-    
-    # Check enhanced audio
-    print("ENHANCED AUDIO:")
-    enhanced_stats = diagnose_audio("outputs/audio_enhanced.wav")
-    
-    print("\n" + "="*50 + "\n")
-    
-    # Compare
-    print("COMPARISON:")
-    print(f"RMS change: {enhanced_stats['rms']/original_stats['rms']:.2f}x")
-    print(f"Silence change: {enhanced_stats['silence_percentage'] - original_stats['silence_percentage']:.1f}%")
-    print(f"VAD energy change: {enhanced_stats['vad_energy']/original_stats['vad_energy']:.2f}x") 
\ No newline at end of file
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+import time
+
+from utils.online import (BLOCK_SECONDS, LATENCY, OnlineDiarizer, PyannoteEmbedder, diarize_stream,
+                          iter_pcm_blocks, latency_summary, open_pcm_stream)
+from utils.result_cache import write_rttm
+
+def main():
+    parser = argparse.ArgumentParser(description="Diarize live 16 kHz mono PCM with bounded label latency")
+    parser.add_argument("source", help='"-" for stdin, a file or FIFO path, unix:/path or tcp:host:port')
+    parser.add_argument("--format", default="s16le", choices=["s16le", "f32le"])
+    parser.add_argument("--latency", type=float, default=LATENCY,
+                        help="Seconds of lookahead before a label is emitted; gains level off around 0.5-1 s")
+    parser.add_argument("--max-speakers", type=int, default=None)
+    parser.add_argument("--block", type=float, default=BLOCK_SECONDS, help="Read size in seconds")
+    parser.add_argument("--embedder", default="spectral", choices=["spectral", "pyannote"],
+                        help="spectral runs offline; pyannote needs a HuggingFace token")
+    parser.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    parser.add_argument("--jsonl", action="store_true", help="Print events as JSON lines")
+    parser.add_argument("--rttm", default=None, help="Write the final (relabelled) result here")
+    args = parser.parse_args()
+
+    embedder = PyannoteEmbedder(args.hf_token) if args.embedder == "pyannote" else None
+    diarizer = OnlineDiarizer(embedder=embedder, latency=args.latency, max_speakers=args.max_speakers)
+
+    def on_event(event):
+        if args.jsonl:
+            print(json.dumps(event), flush=True)
+        elif event["type"] == "segment":
+            print(f"{event['start']:.2f}s --> {event['end']:.2f}s : {event['speaker']}"
+                  f"  (+{event['latency']:.2f}s)", flush=True)
+        else:
+            print(f"relabel {event['from']} -> {event['to']} at {event['time']:.1f}s", flush=True)
+
+    start = time.perf_counter()
+    with open_pcm_stream(args.source) as stream:
+        blocks = iter_pcm_blocks(stream, block_seconds=args.block, pcm_format=args.format)
+        annotation, events = diarize_stream(blocks, diarizer, on_event=on_event)
+    elapsed = time.perf_counter() - start
+
+    summary = latency_summary(events)
+    print(f"\nStream ended: {diarizer.received_seconds:.1f}s of audio in {elapsed:.1f}s, "
+          f"{len(annotation.labels())} speakers, label latency p50 {summary['p50']:.2f}s "
+          f"p95 {summary['p95']:.2f}s")
+
+    if args.rttm:
+        os.makedirs(os.path.dirname(args.rttm) or ".", exist_ok=True)
+        with open(args.rttm, "w") as f:
+            write_rttm(annotation, f, uri="live")
+        print(f"Saved RTTM to {args.rttm}")
+
+if __name__ == "__main__":
+    main()
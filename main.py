@@ -1,8 +1,18 @@
+import json
 import os
+from functools import lru_cache
+
+from utils.audio_buffer import AudioBuffer, SAMPLE_RATE
 from utils.audio_extractor import extract_audio
-from utils.audio_enhancer import enhance_audio  
+from utils.audio_enhancer import enhance_audio, enhancement_settings
 from utils.diarizer import run_diarization, print_segments, plot_diarization
-from utils.quality_assessor import assess_diarization_quality, suggest_improvements
+from utils.export import export_segments, to_json
+from utils.pipeline_registry import resolve_config
+from utils.quality_assessor import assess_diarization_quality, print_quality_report, suggest_improvements
+from utils.profiler import StageProfiler, profile_stage, set_profiler
+from utils.result_cache import model_revisions, write_rttm
+from utils.segment_table import SegmentTable
+from utils.stages import StageRunner, publish
 
 # === USER INPUT ===
 VIDEO_PATH = "data/input_video.mp4"  # Replace with your actual file
@@ -12,6 +22,135 @@ HUGGINGFACE_TOKEN = "your_hf_token_here"  # Add your HF token
 MIN_SPEAKERS = 2  
 MAX_SPEAKERS = 2  
 
+# Set to True to ignore cached diarization results and re-run inference
+REFRESH_CACHE = False
+
+CONFIG_PATH = "local_config.yaml"
+ENHANCE_ENGINE = "numpy"
+ENHANCED_OUTPUT = "outputs/audio_enhanced.wav"
+
+# Stage artifacts are kept here, keyed by a fingerprint of each stage's inputs
+# and settings. Unchanged stages are skipped and an interrupted run resumes
+# after the last completed stage. List stage names here to re-run them anyway.
+STAGE_DIR = "outputs/stages"
+FORCE_STAGES = []
+
+# Skip silence with an energy VAD pre-pass before pyannote inference
+USE_VAD = False
+
+# "torch" (default), or CPU-only "torch-int8", "onnx", "onnx-int8";
+# the ONNX backends need `python cli.py export-models` first
+INFERENCE_BACKEND = "torch"
+
+# Timeline output: .png (rendered off-screen), .svg or .json; None skips it
+PLOT_OUTPUT = "outputs/diarization_plot.png"
+PLOT_DPI = 150
+
+# Result exports, format by extension: .rttm, .jsonl, or columnar .npz with
+# quality metrics (query many of them with `python cli.py query`)
+EXPORT_OUTPUTS = ["outputs/diarization.rttm", "outputs/diarization.jsonl", "outputs/diarization.npz"]
+
+# Per-stage timings are always written here (JSON + CSV sidecars)
+PROFILE_OUTPUT = "outputs/profile"
+# Optional deep profiling per stage: None, "cprofile" or "pyinstrument"
+DEEP_PROFILER = None
+
+@lru_cache(maxsize=None)
+def load_buffer(path):
+    # Several stages read the extracted audio; decode it at most once per run.
+    return AudioBuffer.from_file(path)
+
+def extract_stage(workdir):
+    path = extract_audio(VIDEO_PATH, os.path.join(workdir, "audio.wav"))
+    return {"audio": path, "duration": load_buffer(path).duration, "outputs": [path]}
+
+def enhance_stage(workdir, extracted):
+    path = os.path.join(workdir, "audio_enhanced.wav")
+    enhance_audio(load_buffer(extracted["audio"]), output_path=path, engine=ENHANCE_ENGINE)
+    return {"audio": path, "outputs": [path]}
+
+def diarize_stage(workdir, extracted):
+    diarization = run_diarization(
+        load_buffer(extracted["audio"]),
+        HUGGINGFACE_TOKEN,
+        min_speakers=MIN_SPEAKERS,
+        max_speakers=MAX_SPEAKERS,
+        config_path=CONFIG_PATH,
+        refresh_cache=REFRESH_CACHE,
+        vad=USE_VAD,
+        backend=INFERENCE_BACKEND
+    )
+    path = os.path.join(workdir, "diarization.rttm")
+    with open(path, "w") as f:
+        write_rttm(diarization, f, uri=os.path.splitext(os.path.basename(VIDEO_PATH))[0])
+    return {"rttm": path, "speakers": len(diarization.labels()), "outputs": [path]}
+
+def assess_stage(workdir, extracted, diarized):
+    with profile_stage("assess_diarization_quality"):
+        metrics = assess_diarization_quality(load_segments(diarized["rttm"]), extracted["duration"], verbose=False)
+    path = os.path.join(workdir, "metrics.json")
+    with open(path, "w") as f:
+        json.dump(metrics, f, indent=2, default=to_json)
+    return {"metrics": path, "quality_score": float(metrics["quality_score"]), "outputs": [path]}
+
+def export_stage(workdir, extracted, diarized, assessed):
+    with open(assessed["metrics"]) as f:
+        metrics = json.load(f)
+    uri = os.path.splitext(os.path.basename(VIDEO_PATH))[0]
+    paths = [export_segments(load_segments(diarized["rttm"]),
+                             os.path.join(workdir, "diarization" + os.path.splitext(output)[1]),
+                             uri=uri, duration=extracted["duration"], metrics=metrics)
+             for output in EXPORT_OUTPUTS]
+    return {"paths": paths, "outputs": paths}
+
+def plot_stage(workdir, diarized):
+    path = os.path.join(workdir, "diarization_plot" + os.path.splitext(PLOT_OUTPUT)[1])
+    with profile_stage("plot_diarization"):
+        plot_diarization(load_segments(diarized["rttm"]), output_path=path, dpi=PLOT_DPI)
+    return {"plot": path, "outputs": [path]}
+
+def load_segments(path):
+    with open(path) as f:
+        return SegmentTable.from_rttm(f)
+
+# Code versions are part of each stage's key. Bump a stage's version when its
+# stage function, or the library code it calls, changes what it produces;
+# otherwise results written by the old code are reused.
+STAGE_VERSIONS = {
+    "extract_audio": 1,
+    "enhance_audio": 1,
+    "diarize": 1,
+    "assess_quality": 1,
+    "export_results": 1,
+    "plot_diarization": 1,
+}
+
+def build_stages():
+    runner = StageRunner(STAGE_DIR, force=FORCE_STAGES + (["diarize"] if REFRESH_CACHE else []))
+    source, config_params = resolve_config(CONFIG_PATH)
+    runner.add("extract_audio", extract_stage, version=STAGE_VERSIONS["extract_audio"],
+               params={"video": runner.file_hash(VIDEO_PATH), "sample_rate": SAMPLE_RATE})
+    runner.add("enhance_audio", enhance_stage, deps=["extract_audio"], version=STAGE_VERSIONS["enhance_audio"],
+               params=enhancement_settings(ENHANCE_ENGINE))
+    runner.add("diarize", diarize_stage, deps=["extract_audio"], version=STAGE_VERSIONS["diarize"], params={
+        "source": os.path.basename(source),
+        "config": config_params,
+        "revisions": model_revisions(config_params),
+        "min_speakers": MIN_SPEAKERS,
+        "max_speakers": MAX_SPEAKERS,
+        "vad": USE_VAD,
+        "backend": INFERENCE_BACKEND,
+    })
+    runner.add("assess_quality", assess_stage, deps=["extract_audio", "diarize"],
+               version=STAGE_VERSIONS["assess_quality"])
+    runner.add("export_results", export_stage, deps=["extract_audio", "diarize", "assess_quality"],
+               version=STAGE_VERSIONS["export_results"],
+               params={"formats": [os.path.splitext(path)[1] for path in EXPORT_OUTPUTS]})
+    if PLOT_OUTPUT:
+        runner.add("plot_diarization", plot_stage, deps=["diarize"], version=STAGE_VERSIONS["plot_diarization"],
+                   params={"dpi": PLOT_DPI, "format": os.path.splitext(PLOT_OUTPUT)[1]})
+    return runner
+
 if __name__ == "__main__":
     if not os.path.exists(VIDEO_PATH):
         print(f"Video not found: {VIDEO_PATH}")
@@ -21,33 +160,52 @@ if __name__ == "__main__":
     print(f"Expected speakers: {MIN_SPEAKERS}-{MAX_SPEAKERS}")
     print()
 
+    profiler = set_profiler(StageProfiler(profiler=DEEP_PROFILER))
+    runner = build_stages()
+
     print("1. Extracting audio...")
-    audio_path = extract_audio(VIDEO_PATH)
+    with profiler.stage("extract_audio"):
+        extracted = runner.run(["extract_audio"])["extract_audio"]
+    profiler.set_audio_duration(extracted["duration"])
 
     print("2. Applying basic audio enhancements...")
-    enhanced_audio_path = enhance_audio(audio_path)  
+    with profiler.stage("enhance_audio"):
+        enhanced = runner.run(["enhance_audio"])["enhance_audio"]
+    publish(enhanced["audio"], ENHANCED_OUTPUT)
 
     print("3. Running speaker diarization with optimized parameters...")
-    diarization = run_diarization(
-        audio_path,
-        HUGGINGFACE_TOKEN,
-        min_speakers=MIN_SPEAKERS,
-        max_speakers=MAX_SPEAKERS
-    )
+    diarized = runner.run(["diarize"])["diarize"]
+
+    # One columnar pass over the result, shared by printing and the report.
+    segments = load_segments(diarized["rttm"])
 
     print("\n4. Speaker Segments:")
-    print_segments(diarization)
+    print_segments(segments)
 
     print("\n5. Assessing diarization quality...")
-    quality_metrics = assess_diarization_quality(diarization, audio_path)
-    
+    assessed = runner.run(["assess_quality"])["assess_quality"]
+    with open(assessed["metrics"]) as f:
+        quality_metrics = json.load(f)
+    print_quality_report(quality_metrics, segments.num_speakers)
+
     print("\n6. Quality improvement suggestions:")
     suggestions = suggest_improvements(quality_metrics)
     for i, suggestion in enumerate(suggestions, 1):
         print(f"   {i}. {suggestion}")
 
-    print("\n7. Creating visualization...")
-    plot_diarization(diarization)
-    
+    exported = runner.run(["export_results"])["export_results"]
+    for source, path in zip(exported["paths"], EXPORT_OUTPUTS):
+        print(f"Saved {publish(source, path)}")
+
+    if PLOT_OUTPUT:
+        print("\n7. Creating visualization...")
+        plotted = runner.run(["plot_diarization"])["plot_diarization"]
+        print(f"Saved {publish(plotted['plot'], PLOT_OUTPUT)}")
+
+    profiler.print_report()
+    profiler.write_json(PROFILE_OUTPUT + ".json")
+    profiler.write_csv(PROFILE_OUTPUT + ".csv")
+
+    print(f"\nStages run: {', '.join(runner.ran) or 'none (all unchanged)'}")
     print("\n=== Enhanced Diarization Complete ===")
     print(f"Quality Score: {quality_metrics['quality_score']:.1f}/100")
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse
+
+from utils.cpu_tuning import apply_cpu_profile, cpu_profile
+from utils.inference_backend import BACKENDS
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg")
+MAX_BODY_BYTES = 1 << 20
+RETRY_AFTER_SECONDS = 5
+# Finished jobs kept for polling; older ones are forgotten first.
+KEEP_FINISHED = 1000
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+# Per-worker state, populated by init_worker in each child process.
+_worker = {}
+
+def init_worker(hf_token, config_path, cpu, stub, backend="torch"):
+    _worker["hf_token"] = hf_token
+    _worker["config_path"] = config_path
+    _worker["backend"] = backend
+    if stub:
+        from utils.stub_pipeline import StubPipeline
+        _worker["pipeline"] = StubPipeline()
+        return
+
+    from utils.pipeline_registry import backend_device, get_registry
+
+    apply_cpu_profile(None, cpu)
+    device = backend_device(backend)
+    registry = get_registry()
+    registry.warm_up(hf_token, config_path=config_path, device=device, backend=backend)
+    _worker["pipeline"] = registry.get(hf_token, config_path=config_path, device=device, backend=backend)
+    apply_cpu_profile(_worker["pipeline"], cpu)
+
+def run_job(path, min_speakers=None, max_speakers=None):
+    from utils.audio_buffer import AudioBuffer
+    from utils.audio_extractor import extract_audio_buffer
+    from utils.diarizer import run_diarization
+    from utils.quality_assessor import assess_diarization_quality
+    from utils.segment_table import SegmentTable
+
+    timings = {}
+    start = time.perf_counter()
+    if path.lower().endswith(AUDIO_EXTENSIONS):
+        audio = AudioBuffer.from_file(path)
+    else:
+        audio = extract_audio_buffer(path)
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    diarization = run_diarization(audio, _worker["hf_token"], min_speakers=min_speakers,
+                                  max_speakers=max_speakers, pipeline=_worker["pipeline"],
+                                  config_path=_worker["config_path"], backend=_worker["backend"])
+    timings["diarize"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    segments = SegmentTable.from_annotation(diarization)
+    metrics = assess_diarization_quality(segments, audio, verbose=False)
+    timings["assess"] = time.perf_counter() - start
+
+    return {
+        "duration": audio.duration,
+        "num_speakers": segments.num_speakers,
+        "segments": [{"start": start, "end": end, "speaker": speaker} for start, end, speaker in segments],
+        "quality": metrics,
+        "timings": timings,
+    }
+
+def to_json(value):
+    # numpy scalars and arrays found in quality metrics.
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+class QueueFull(Exception):
+    pass
+
+class JobService:
+    """Diarization jobs on a bounded asyncio queue, run by warm worker processes.
+
+    At most `concurrency` jobs run at once, each in a worker process that
+    loaded its pipeline once at startup. Up to `queue_size` more can wait.
+    Beyond that, submit() raises QueueFull, which callers turn into
+    backpressure (HTTP 503). Queued jobs can be cancelled outright. A running
+    job cannot be interrupted inside its worker, so it is marked cancelled
+    and its result is discarded. Only the last `keep_finished` finished jobs
+    are kept. If a worker process dies, the jobs running in the pool fail
+    and the pool is replaced.
+    """
+
+    def __init__(self, hf_token=None, config_path="local_config.yaml", concurrency=2, queue_size=16, stub=False,
+                 backend="torch", keep_finished=KEEP_FINISHED):
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = {}
+        self.finished = deque()
+        self.keep_finished = keep_finished
+        self.initargs = (hf_token, config_path, cpu_profile(concurrency), stub, backend)
+        self.executor = self._start_executor()
+        self.workers = []
+
+    def _start_executor(self):
+        return ProcessPoolExecutor(max_workers=self.concurrency, initializer=init_worker, initargs=self.initargs)
+
+    def start(self):
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, path, min_speakers=None, max_speakers=None):
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "path": path,
+            "min_speakers": min_speakers,
+            "max_speakers": max_speakers,
+            "submitted": time.time(),
+        }
+        try:
+            self.queue.put_nowait(job["id"])
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.queue.qsize()} jobs already queued")
+        self.jobs[job["id"]] = job
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs[job_id]
+        if job["status"] in ("queued", "running"):
+            job["status"] = "cancelled"
+            job["finished"] = time.time()
+            self._retire(job)
+        return job
+
+    def _retire(self, job):
+        # Finished jobs are kept for polling up to keep_finished, oldest evicted first.
+        self.finished.append(job["id"])
+        while len(self.finished) > self.keep_finished:
+            self.jobs.pop(self.finished.popleft(), None)
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"queued": self.queue.qsize(), "capacity": self.queue.maxsize,
+                "concurrency": self.concurrency, "jobs": counts}
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # A cancelled job may already have been evicted from self.jobs.
+            job = self.jobs.get(await self.queue.get())
+            try:
+                if job is None or job["status"] == "cancelled":
+                    continue
+                job["status"] = "running"
+                job["started"] = time.time()
+                executor = self.executor
+                try:
+                    result = await loop.run_in_executor(
+                        executor, run_job, job["path"], job["min_speakers"], job["max_speakers"])
+                except Exception as exc:
+                    if isinstance(exc, BrokenProcessPool) and self.executor is executor:
+                        # A worker died (e.g. out of memory). Every job in the pool
+                        # fails with it; later jobs run on a fresh pool.
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self.executor = self._start_executor()
+                    if job["status"] != "cancelled":
+                        job.update(status="failed", error=f"{type(exc).__name__}: {exc}",
+                                   traceback="".join(traceback.format_exception(exc)))
+                else:
+                    if job["status"] != "cancelled":
+                        job.update(status="done", result=result)
+                if job["status"] != "cancelled":
+                    job["finished"] = time.time()
+                    self._retire(job)
+            finally:
+                self.queue.task_done()
+
+class HttpHandler:
+    """Minimal HTTP/1.1 JSON API over TCP or a Unix socket.
+
+    POST   /jobs        {"path": ..., "min_speakers": ..., "max_speakers": ...}
+    GET    /jobs        every job's status
+    GET    /jobs/<id>   status, plus segments and quality metrics once done
+    DELETE /jobs/<id>   cancel
+    GET    /health      queue depth and job counts
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def __call__(self, reader, writer):
+        try:
+            status, payload = await self._handle(reader)
+        except Exception as exc:
+            status, payload = 400, {"error": f"{type(exc).__name__}: {exc}"}
+        body = json.dumps(payload, default=to_json).encode()
+        headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Content-Type: application/json",
+                   f"Content-Length: {len(body)}", "Connection: close"]
+        if status == 503:
+            headers.append(f"Retry-After: {RETRY_AFTER_SECONDS}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _handle(self, reader):
+        request_line = (await reader.readline()).decode().split()
+        if len(request_line) < 2:
+            return 400, {"error": "malformed request"}
+        method, target = request_line[0], urlparse(request_line[1]).path.rstrip("/")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "request body too large"}
+        body = json.loads(await reader.readexactly(length)) if length else {}
+
+        parts = target.strip("/").split("/")
+        if parts == ["health"] and method == "GET":
+            return 200, self.service.stats()
+        if parts == ["jobs"]:
+            if method == "GET":
+                return 200, [summary(job) for job in self.service.jobs.values()]
+            if method == "POST":
+                return self._submit(body)
+            return 405, {"error": f"{method} not allowed"}
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self.service.jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": f"no job {parts[1]}"}
+            if method == "GET":
+                return 200, job
+            if method == "DELETE":
+                if job["status"] in ("done", "failed"):
+                    return 409, {"error": f"job already {job['status']}", **summary(job)}
+                return 200, summary(self.service.cancel(job["id"]))
+            return 405, {"error": f"{method} not allowed"}
+        return 404, {"error": f"no route for {target}"}
+
+    def _submit(self, body):
+        path = body.get("path")
+        if not path or not os.path.isfile(path):
+            return 400, {"error": f"path not found: {path}"}
+        try:
+            job = self.service.submit(os.path.abspath(path), body.get("min_speakers"), body.get("max_speakers"))
+        except QueueFull as exc:
+            return 503, {"error": f"queue full: {exc}"}
+        return 202, summary(job)
+
+def summary(job):
+    return {key: job[key] for key in ("id", "status", "path", "submitted", "started", "finished", "error")
+            if key in job}
+
+async def serve(args):
+    service = JobService(args.hf_token, config_path=args.config, concurrency=args.concurrency,
+                         queue_size=args.queue_size, stub=args.stub, backend=args.backend,
+                         keep_finished=args.keep_finished)
+    service.start()
+    handler = HttpHandler(service)
+    if args.unix:
+        server = await asyncio.start_unix_server(handler, path=args.unix)
+        where = f"unix:{args.unix}"
+    else:
+        server = await asyncio.start_server(handler, host=args.host, port=args.port)
+        where = f"http://{args.host}:{args.port}"
+    mode = "stub pipeline" if args.stub else f"pyannote pipeline, {args.backend} backend"
+    print(f"Diarization service on {where} ({mode}, concurrency {args.concurrency}, queue {args.queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local diarization job service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Listen on a Unix socket instead of TCP")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs running at once (worker processes)")
+    parser.add_argument("--queue-size", type=int, default=16, help="Waiting jobs before new ones get 503")
+    parser.add_argument("--keep-finished", type=int, default=KEEP_FINISHED,
+                        help="Finished jobs kept for polling before the oldest are forgotten")
+    parser.add_argument("--config", default="local_config.yaml")
+    parser.add_argument("--hf-token", default=os.environ.get("HUGGINGFACE_TOKEN"))
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub pipeline (no model download)")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS,
+                        help="Inference backend; int8/ONNX backends run on CPU")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Job service API against the offline StubPipeline: no network, no model download."""
+import asyncio
+import json
+import os
+
+import pytest
+
+import service as service_module
+from service import HttpHandler, JobService
+from synthetic import generate_conversation
+from utils.audio_buffer import AudioBuffer
+
+POLL_SECONDS = 0.1
+POLL_TIMEOUT = 60
+
+@pytest.fixture
+def audio_path(tmp_path):
+    samples, _ = generate_conversation(20, num_speakers=2, seed=0)
+    return AudioBuffer.from_array(samples).write(str(tmp_path / "meeting.wav"))
+
+async def request(socket_path, method, target, body=None):
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                 + payload)
+    await writer.drain()
+    # Read by Content-Length, like a real client: forked workers may hold the
+    # socket open, so EOF can arrive late.
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    lines = head.strip().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    content = await reader.readexactly(int(headers["Content-Length"]))
+    writer.close()
+    return int(lines[0].split()[1]), headers, json.loads(content)
+
+def crash_on_request(path, min_speakers=None, max_speakers=None):
+    # Stands in for run_job in forked workers: "crash" files kill the worker process.
+    if "crash" in os.path.basename(path):
+        os._exit(1)
+    return {"segments": []}
+
+def run_service(tmp_path, scenario, concurrency=1, queue_size=4, start=True, **kwargs):
+    # Runs `scenario(socket_path, service)` against a live service on a Unix socket.
+    async def main():
+        service = JobService(concurrency=concurrency, queue_size=queue_size, stub=True, **kwargs)
+        if start:
+            service.start()
+        socket_path = str(tmp_path / "service.sock")
+        server = await asyncio.start_unix_server(HttpHandler(service), path=socket_path)
+        try:
+            async with server:
+                return await scenario(socket_path, service)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+async def wait_for(socket_path, job_id, statuses=("done", "failed", "cancelled")):
+    for _ in range(int(POLL_TIMEOUT / POLL_SECONDS)):
+        status, _, job = await request(socket_path, "GET", f"/jobs/{job_id}")
+        assert status == 200
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(POLL_SECONDS)
+    raise AssertionError(f"job {job_id} still {job['status']} after {POLL_TIMEOUT}s")
+
+def test_submit_and_poll_until_done(tmp_path, audio_path):
+    # The stub skips model downloads, but run_diarization still hands pyannote-style torch input to it.
+    pytest.importorskip("torch")
+
+    async def scenario(socket_path, service):
+        status, _, job = await request(socket_path, "POST", "/jobs", {"path": audio_path, "max_speakers": 3})
+        assert status == 202
+        assert job["status"] == "queued"
+        return await wait_for(socket_path, job["id"])
+
+    job = run_service(tmp_path, scenario)
+    assert job["status"] == "done", job.get("error")
+    assert job["result"]["num_speakers"] >= 1
+    assert job["result"]["segments"]
+    assert 0 <= job["result"]["quality"]["quality_score"] <= 100
+
+@pytest.mark.parametrize("body", [{"path": "/does/not/exist.wav"}, {}, b"{not json"])
+def test_bad_submission_is_rejected(tmp_path, body):
+    async def scenario(socket_path, service):
+        status, _, payload = await request(socket_path, "POST", "/jobs", body)
+        assert "error" in payload
+        return status, service.jobs
+
+    status, jobs = run_service(tmp_path, scenario)
+    assert status == 400
+    assert not jobs
+
+def test_cancel_finished_job_conflicts(tmp_path):
+    # A file that is not audio fails in the worker, which is enough to test a finished job.
+    not_audio = tmp_path / "notes.txt"
+    not_audio.write_text("not audio")
+
+    async def scenario(socket_path, service):
+        status, _, job = await request(socket_path, "POST", "/jobs", {"path": str(not_audio)})
+        assert status == 202
+        finished = await wait_for(socket_path, job["id"])
+        status, _, payload = await request(socket_path, "DELETE", f"/jobs/{job['id']}")
+        return finished, status, payload
+
+    finished, status, payload = run_service(tmp_path, scenario)
+    assert finished["status"] == "failed"
+    assert status == 409
+    assert payload["status"] == "failed"
+
+def test_cancel_queued_job(tmp_path, audio_path):
+    async def scenario(socket_path, service):
+        _, _, job = await request(socket_path, "POST", "/jobs", {"path": audio_path})
+        return await request(socket_path, "DELETE", f"/jobs/{job['id']}")
+
+    status, _, job = run_service(tmp_path, scenario, start=False)
+    assert status == 200
+    assert job["status"] == "cancelled"
+
+def test_full_queue_answers_503_with_retry_after(tmp_path, audio_path):
+    # Without started workers nothing leaves the queue, so the third job overflows it.
+    async def scenario(socket_path, service):
+        responses = [await request(socket_path, "POST", "/jobs", {"path": audio_path}) for _ in range(3)]
+        _, _, health = await request(socket_path, "GET", "/health")
+        return responses, health
+
+    responses, health = run_service(tmp_path, scenario, queue_size=2, start=False)
+    assert [status for status, _, _ in responses] == [202, 202, 503]
+    assert "Retry-After" in responses[2][1]
+    assert "queue full" in responses[2][2]["error"]
+    assert health["queued"] == 2
+    assert health["capacity"] == 2
+
+def test_worker_crash_fails_job_and_restarts_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module, "run_job", crash_on_request)
+    paths = [tmp_path / "crash.wav", tmp_path / "after.wav"]
+    for path in paths:
+        path.write_bytes(b"")
+
+    async def scenario(socket_path, service):
+        jobs = []
+        for path in paths:
+            _, _, job = await request(socket_path, "POST", "/jobs", {"path": str(path)})
+            jobs.append(await wait_for(socket_path, job["id"]))
+        return jobs
+
+    crashed, after = run_service(tmp_path, scenario)
+    assert crashed["status"] == "failed"
+    assert "BrokenProcessPool" in crashed["error"]
+    assert after["status"] == "done"
+
+def test_only_the_latest_finished_jobs_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module, "run_job", crash_on_request)
+    path = tmp_path / "meeting.wav"
+    path.write_bytes(b"")
+
+    async def scenario(socket_path, service):
+        ids = []
+        for _ in range(4):
+            _, _, job = await request(socket_path, "POST", "/jobs", {"path": str(path)})
+            await wait_for(socket_path, job["id"])
+            ids.append(job["id"])
+        status, _, _ = await request(socket_path, "GET", f"/jobs/{ids[0]}")
+        return ids, status, list(service.jobs)
+
+    ids, status, kept = run_service(tmp_path, scenario, keep_finished=2)
+    assert status == 404
+    assert kept == ids[2:]
@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+# Decoded audio longer than this is backed by a memory-mapped temp file
+# instead of anonymous memory (30 min of float32 @ 16 kHz is ~115 MB).
+MMAP_THRESHOLD_SECONDS = 30 * 60
+BLOCK_FRAMES = 1 << 20
+
+class AudioBuffer:
+    """A single decoded copy of an audio file: float32, mono, 16 kHz.
+
+    Every stage accepts either a path or an AudioBuffer; passing the buffer
+    lets the whole run share one decode.
+    """
+
+    def __init__(self, samples, sample_rate=SAMPLE_RATE, path=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.path = path
+
+    @classmethod
+    def from_file(cls, path, mmap_threshold_seconds=MMAP_THRESHOLD_SECONDS):
+        info = sf.info(path)
+        use_mmap = info.duration > mmap_threshold_seconds
+
+        if info.samplerate == SAMPLE_RATE and use_mmap:
+            # Stream straight into the mapping so peak memory stays at one block.
+            samples = allocate_samples(info.frames, mmap=True)
+            offset = 0
+            for block in sf.blocks(path, blocksize=BLOCK_FRAMES, dtype="float32", always_2d=True):
+                n = len(block)
+                samples[offset:offset + n] = block.mean(axis=1)
+                offset += n
+            return cls(samples[:offset], SAMPLE_RATE, path)
+
+        data, sr = sf.read(path, dtype="float32", always_2d=True)
+        mono = data.mean(axis=1)
+        del data
+        if sr != SAMPLE_RATE:
+            mono = resample(mono, sr, SAMPLE_RATE)
+
+        if use_mmap:
+            samples = allocate_samples(len(mono), mmap=True)
+            samples[:] = mono
+            return cls(samples, SAMPLE_RATE, path)
+        return cls(np.ascontiguousarray(mono, dtype=np.float32), SAMPLE_RATE, path)
+
+    @classmethod
+    def from_array(cls, samples, sample_rate=SAMPLE_RATE, path=None):
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=0 if samples.shape[0] < samples.shape[1] else 1)
+        if sample_rate != SAMPLE_RATE:
+            samples = resample(samples, sample_rate, SAMPLE_RATE)
+        return cls(np.ascontiguousarray(samples, dtype=np.float32), SAMPLE_RATE, path)
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def __len__(self):
+        return len(self.samples)
+
+    def to_pyannote(self):
+        import torch
+
+        waveform = torch.from_numpy(np.asarray(self.samples)).unsqueeze(0)
+        return {"waveform": waveform, "sample_rate": self.sample_rate}
+
+    def to_int16(self):
+        return (np.clip(self.samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+    def write(self, path):
+        sf.write(path, self.samples, self.sample_rate, subtype="PCM_16")
+        return path
+
+def resample(samples, orig_sr, target_sr):
+    from math import gcd
+    from scipy.signal import resample_poly
+
+    g = gcd(int(orig_sr), int(target_sr))
+    return resample_poly(samples, target_sr // g, orig_sr // g).astype(np.float32)
+
+def allocate_samples(n, mmap):
+    if not mmap:
+        return np.empty(n, dtype=np.float32)
+    fd, tmp_path = tempfile.mkstemp(prefix="audiobuffer-", suffix=".f32")
+    os.close(fd)
+    samples = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(max(n, 1),))[:n]
+    try:
+        # The mapping keeps the data alive; unlinking now means no cleanup later.
+        os.unlink(tmp_path)
+    except OSError:
+        pass
+    return samples
+
+def load_audio(audio):
+    if isinstance(audio, AudioBuffer):
+        return audio
+    return AudioBuffer.from_file(audio)
+
+def audio_duration(audio):
+    # Header-only for paths: no need to decode the file just to know its length.
+    if isinstance(audio, AudioBuffer):
+        return audio.duration
+    if isinstance(audio, (int, float)):
+        return float(audio)
+    return sf.info(audio).duration
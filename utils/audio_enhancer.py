@@ -1,15 +1,191 @@
-from pydub import AudioSegment, effects
 import numpy as np
 import os
+from scipy.signal import lfilter, sosfilt
 
-def enhance_audio(audio_path):
-    print("Loading audio file...")
-    audio = AudioSegment.from_file(audio_path)
+from utils.audio_buffer import AudioBuffer, load_audio
+
+HIGH_PASS_HZ = 80
+LOW_PASS_HZ = 8000
+COMPRESS_THRESHOLD_DB = -20.0
+COMPRESS_RATIO = 3.0
+COMPRESS_ATTACK_MS = 5.0
+COMPRESS_RELEASE_MS = 50.0
+NORMALIZE_HEADROOM_DB = 0.1
+CHUNK_SECONDS = 30
+INT16_MAX = 32767 / 32768
+
+def enhancement_settings(engine="numpy"):
+    # Everything that changes the enhanced output; used to fingerprint the stage.
+    return {
+        "engine": engine,
+        "high_pass_hz": HIGH_PASS_HZ,
+        "low_pass_hz": LOW_PASS_HZ,
+        "compress_threshold_db": COMPRESS_THRESHOLD_DB,
+        "compress_ratio": COMPRESS_RATIO,
+        "compress_attack_ms": COMPRESS_ATTACK_MS,
+        "compress_release_ms": COMPRESS_RELEASE_MS,
+        "normalize_headroom_db": NORMALIZE_HEADROOM_DB,
+    }
+
+def enhance_audio(audio, output_path=None, engine="numpy"):
+    if engine == "pydub":
+        return enhance_audio_pydub(audio, output_path)
+
+    if isinstance(audio, AudioBuffer):
+        print("Using decoded audio buffer...")
+        buffer = audio
+    else:
+        print("Loading audio file...")
+        buffer = load_audio(audio)
+
+    print("Applying basic audio enhancements...")
+    enhanced = AudioBuffer(enhance_waveform(buffer.samples, buffer.sample_rate),
+                           buffer.sample_rate, path=output_path)
+
+    if isinstance(audio, AudioBuffer):
+        if output_path:
+            print(f"Saving enhanced audio to: {output_path}")
+            enhanced.write(output_path)
+        return enhanced
+
+    enhanced_path = output_path or os.path.splitext(audio)[0] + "_enhanced.wav"
+    print(f"Saving enhanced audio to: {enhanced_path}")
+    enhanced.write(enhanced_path)
+    return enhanced_path
+
+def enhance_waveform(samples, sample_rate, chunk_seconds=CHUNK_SECONDS, out=None):
+    # Same chain as the pydub path (normalize -> high-pass -> low-pass ->
+    # compress -> normalize), but filters and compressor carry their state
+    # across bounded chunks and write into `out` in place.
+    samples = np.asarray(samples)
+    if out is None:
+        out = np.empty(len(samples), dtype=np.float32)
+    if len(samples) == 0:
+        return out
+
+    chunk = max(1, int(chunk_seconds * sample_rate))
+    gain = normalize_gain(peak(samples, chunk))
+
+    sos = speech_band_sos(sample_rate)
+    first = float(samples[0]) * gain
+    zi = speech_band_initial_state(sos, first)
+    compressor = Compressor(sample_rate)
+
+    for start in range(0, len(samples), chunk):
+        block = samples[start:start + chunk].astype(np.float64) * gain
+        # pydub clips the high-pass output to the int16 range before the
+        # low-pass; keep the sections separate to reproduce that.
+        block, zi[0] = sosfilt(sos[:1], block, zi=zi[:1])
+        np.clip(block, -1.0, INT16_MAX, out=block)
+        block, zi[1] = sosfilt(sos[1:], block, zi=zi[1:])
+        out[start:start + len(block)] = compressor.process(block)
+
+    final_gain = normalize_gain(peak(out, chunk))
+    for start in range(0, len(out), chunk):
+        out[start:start + chunk] *= final_gain
+    return out
+
+def peak(samples, chunk):
+    return max(float(np.max(np.abs(samples[i:i + chunk]))) for i in range(0, len(samples), chunk))
+
+def normalize_gain(peak_value, headroom=NORMALIZE_HEADROOM_DB):
+    if peak_value == 0:
+        return 1.0
+    return 10 ** (-headroom / 20) / peak_value
+
+def speech_band_sos(sample_rate, high_pass=HIGH_PASS_HZ, low_pass=LOW_PASS_HZ):
+    # The first-order RC filters pydub uses, written as two biquad sections.
+    dt = 1.0 / sample_rate
+    rc_high = 1.0 / (high_pass * 2 * np.pi)
+    rc_low = 1.0 / (low_pass * 2 * np.pi)
+    a_high = rc_high / (rc_high + dt)
+    a_low = dt / (rc_low + dt)
+    return np.array([
+        [a_high, -a_high, 0.0, 1.0, -a_high, 0.0],
+        [a_low, 0.0, 0.0, 1.0, -(1.0 - a_low), 0.0],
+    ])
+
+def speech_band_initial_state(sos, first_sample):
+    # pydub seeds both filters with y[0] = x[0]; solve for the matching state.
+    zi = np.zeros((len(sos), 2))
+    for i, (b0, _, _, _, _, _) in enumerate(sos):
+        zi[i, 0] = (1.0 - b0) * first_sample
+    return zi
+
+class Compressor:
+    """Feed-forward compressor with the same control law as pydub's.
+
+    The gain reduction jumps to the over-threshold target and then decays
+    by target/release per sample while the signal stays above the threshold.
+    Below the threshold it holds. That is a decaying peak envelope, which is
+    a running maximum once the cumulative decay is added back. A one-pole
+    smoother then limits onsets to the attack time. Everything runs
+    vectorized per chunk, with state carried between chunks.
+    """
+
+    def __init__(self, sample_rate, threshold=COMPRESS_THRESHOLD_DB, ratio=COMPRESS_RATIO,
+                 attack=COMPRESS_ATTACK_MS, release=COMPRESS_RELEASE_MS):
+        self.threshold = 10 ** (threshold / 20)
+        self.slope = 1 - 1.0 / ratio
+        self.look = max(1, int(sample_rate * attack / 1000))
+        self.release_frames = sample_rate * release / 1000
+        self.attack_pole = np.exp(-1.0 / self.look)
+        self.history = np.zeros(0)
+        self.seen = 0
+        self.envelope = 0.0
+        self.smoothed = 0.0
+
+    def process(self, block):
+        n = len(block)
+        squares = np.concatenate([self.history, block * block])
+        csum = np.concatenate([[0.0], np.cumsum(squares)])
+
+        offset = len(self.history)
+        end = np.arange(n) + offset
+        begin = np.maximum(end - self.look, 0)
+        count = np.minimum(np.arange(n) + self.seen, self.look)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rms = np.sqrt(np.maximum(csum[end] - csum[begin], 0) / count)
+        rms[count == 0] = 0.0
+
+        above = rms > self.threshold
+        target = np.zeros(n)
+        target[above] = self.slope * 20 * np.log10(rms[above] / self.threshold)
+
+        decay = np.cumsum(target / self.release_frames)
+        candidates = np.where(above, target + decay, -np.inf)
+        peak = np.maximum.accumulate(candidates)
+        envelope = np.maximum(np.maximum(peak, self.envelope) - decay, 0.0)
+
+        smoothed, _ = lfilter([1 - self.attack_pole], [1, -self.attack_pole], envelope,
+                              zi=[self.attack_pole * self.smoothed])
+        attenuation = np.minimum(envelope, smoothed)
+
+        self.history = squares[-self.look:]
+        self.seen += n
+        self.envelope = envelope[-1]
+        self.smoothed = smoothed[-1]
+        return block * 10 ** (-attenuation / 20)
+
+def enhance_audio_pydub(audio, output_path=None):
+    from pydub import AudioSegment, effects
+
+    if isinstance(audio, AudioBuffer):
+        print("Using decoded audio buffer...")
+        segment = AudioSegment(
+            data=audio.to_int16().tobytes(),
+            sample_width=2,
+            frame_rate=audio.sample_rate,
+            channels=1
+        )
+    else:
+        print("Loading audio file...")
+        segment = AudioSegment.from_file(audio)
     
     print("Applying basic audio enhancements...")
     
     # Simple normalization
-    normalized_audio = effects.normalize(audio)
+    normalized_audio = effects.normalize(segment)
     
     # Basic filtering for speech frequencies
     filtered_audio = normalized_audio.high_pass_filter(80)
@@ -21,8 +197,18 @@ def enhance_audio(audio_path):
     # Final normalization
     filtered_audio = effects.normalize(filtered_audio)
     
-    enhanced_path = os.path.splitext(audio_path)[0] + "_enhanced.wav"
+    if isinstance(audio, AudioBuffer):
+        # Hand the result straight back as a buffer; only touch disk if asked.
+        samples = np.array(filtered_audio.get_array_of_samples(), dtype=np.float32)
+        samples /= float(1 << (8 * filtered_audio.sample_width - 1))
+        enhanced = AudioBuffer.from_array(samples, filtered_audio.frame_rate, path=output_path)
+        if output_path:
+            print(f"Saving enhanced audio to: {output_path}")
+            enhanced.write(output_path)
+        return enhanced
+    
+    enhanced_path = output_path or os.path.splitext(audio)[0] + "_enhanced.wav"
     print(f"Saving enhanced audio to: {enhanced_path}")
     filtered_audio.export(enhanced_path, format="wav", parameters=["-ar", "16000"])
     
-    return enhanced_path
\ No newline at end of file
+    return enhanced_path
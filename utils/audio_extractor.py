@@ -1,9 +1,112 @@
 import ffmpeg
 import os
+import numpy as np
 
-def extract_audio(input_video_path: str, output_audio_path: str = "outputs/audio.wav"):
-    if not os.path.exists("outputs"):
-        os.makedirs("outputs")
+from utils.audio_buffer import AudioBuffer, MMAP_THRESHOLD_SECONDS, SAMPLE_RATE, allocate_samples
+
+BYTES_PER_SAMPLE = 4  # f32le
+DEFAULT_BLOCK_SECONDS = 10.0
+
+def extract_audio(input_video_path: str, output_audio_path: str = "outputs/audio.wav", as_buffer: bool = False):
+    output_dir = os.path.dirname(output_audio_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
     ffmpeg.input(input_video_path).output(output_audio_path, ac=1, ar=16000).run(overwrite_output=True)
+    if as_buffer:
+        return AudioBuffer.from_file(output_audio_path)
     return output_audio_path
+
+def _open_pcm_pipe(input_path, start=None, duration=None, sample_rate=SAMPLE_RATE):
+    input_kwargs = {}
+    if start:
+        input_kwargs["ss"] = start
+    if duration:
+        input_kwargs["t"] = duration
+    return (
+        ffmpeg.input(input_path, **input_kwargs)
+        .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=sample_rate)
+        # Keep stderr tiny so it can't fill its pipe while we drain stdout.
+        .global_args("-nostdin", "-nostats", "-loglevel", "error")
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+
+def _finish(process, check=True):
+    stderr = process.stderr.read()
+    process.stdout.close()
+    process.stderr.close()
+    if process.wait() != 0 and check:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()[-500:]}")
+
+def probe_duration(input_path):
+    try:
+        return float(ffmpeg.probe(input_path)["format"]["duration"])
+    except Exception:
+        return None
+
+def extract_audio_buffer(input_path: str, start: float = None, duration: float = None,
+                         sample_rate: int = SAMPLE_RATE) -> AudioBuffer:
+    # Streams decoded PCM from ffmpeg's stdout into memory; nothing touches disk
+    # unless the recording is long enough to warrant a memory-mapped buffer.
+    expected = duration
+    if expected is None:
+        total = probe_duration(input_path)
+        if total is not None:
+            expected = max(0.0, total - (start or 0.0))
+
+    process = _open_pcm_pipe(input_path, start, duration, sample_rate)
+    try:
+        if expected is not None:
+            # One extra second of headroom: container durations are approximate.
+            capacity = int((expected + 1.0) * sample_rate)
+            samples = allocate_samples(capacity, mmap=expected > MMAP_THRESHOLD_SECONDS)
+            view = memoryview(samples.view(np.uint8))
+            filled = 0
+            while filled < len(view):
+                n = process.stdout.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+            tail = process.stdout.read()
+            samples = samples[:filled // BYTES_PER_SAMPLE]
+            if tail:
+                extra = np.frombuffer(tail[:len(tail) - len(tail) % BYTES_PER_SAMPLE], dtype=np.float32)
+                samples = np.concatenate([samples, extra])
+        else:
+            chunks = []
+            for block in _read_blocks(process, int(DEFAULT_BLOCK_SECONDS * sample_rate)):
+                chunks.append(block)
+            samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+    finally:
+        _finish(process)
+
+    return AudioBuffer(samples, sample_rate, path=None)
+
+def _read_blocks(process, block_samples):
+    block_bytes = block_samples * BYTES_PER_SAMPLE
+    pending = b""
+    while True:
+        data = process.stdout.read(block_bytes - len(pending))
+        if not data:
+            break
+        pending += data
+        if len(pending) == block_bytes:
+            yield np.frombuffer(pending, dtype=np.float32).copy()
+            pending = b""
+    usable = len(pending) - len(pending) % BYTES_PER_SAMPLE
+    if usable:
+        yield np.frombuffer(pending[:usable], dtype=np.float32).copy()
+
+def iter_audio_blocks(input_path: str, block_seconds: float = DEFAULT_BLOCK_SECONDS,
+                      start: float = None, duration: float = None, sample_rate: int = SAMPLE_RATE):
+    # Yields fixed-size float32 blocks (the last one may be shorter).
+    process = _open_pcm_pipe(input_path, start, duration, sample_rate)
+    completed = False
+    try:
+        yield from _read_blocks(process, int(block_seconds * sample_rate))
+        completed = True
+    finally:
+        if not completed and process.poll() is None:
+            # Consumer stopped early; don't report the kill as an ffmpeg failure.
+            process.kill()
+        _finish(process, check=completed)
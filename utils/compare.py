@@ -0,0 +1,52 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+RESOLUTION = 0.01
+
+def frame_activity(annotation, duration, resolution=RESOLUTION):
+    labels = sorted(annotation.labels())
+    n_frames = int(np.ceil(duration / resolution))
+    activity = np.zeros((n_frames, len(labels)), dtype=bool)
+    index = {label: i for i, label in enumerate(labels)}
+    for turn, _, speaker in annotation.itertracks(yield_label=True):
+        start = int(turn.start / resolution)
+        end = int(np.ceil(turn.end / resolution))
+        activity[start:end, index[speaker]] = True
+    return activity, labels
+
+def compare_annotations(reference, hypothesis, duration=None, resolution=RESOLUTION):
+    # Frame-level agreement between two diarizations of the same audio: how
+    # well their speech regions line up, and how often the (optimally mapped)
+    # speaker labels agree where both detect speech.
+    if duration is None:
+        ends = [turn.end for turn, _ in reference.itertracks()] + \
+               [turn.end for turn, _ in hypothesis.itertracks()]
+        duration = max(ends) if ends else 0.0
+
+    ref, ref_labels = frame_activity(reference, duration, resolution)
+    hyp, hyp_labels = frame_activity(hypothesis, duration, resolution)
+
+    ref_speech = ref.any(axis=1)
+    hyp_speech = hyp.any(axis=1)
+    union = np.sum(ref_speech | hyp_speech)
+    speech_jaccard = np.sum(ref_speech & hyp_speech) / union if union else 1.0
+
+    mapping = {}
+    agreement = 1.0
+    if ref_labels and hyp_labels:
+        overlap = ref.T.astype(np.int64) @ hyp.astype(np.int64)
+        rows, cols = linear_sum_assignment(-overlap)
+        mapping = {hyp_labels[c]: ref_labels[r] for r, c in zip(rows, cols)}
+        both = ref_speech & hyp_speech
+        matched = overlap[rows, cols].sum()
+        agreement = matched / max(np.sum(ref[both]), 1)
+
+    return {
+        "speech_jaccard": float(speech_jaccard),
+        "speaker_agreement": float(min(agreement, 1.0)),
+        "reference_speakers": len(ref_labels),
+        "hypothesis_speakers": len(hyp_labels),
+        "reference_segments": len(list(reference.itertracks())),
+        "hypothesis_segments": len(list(hypothesis.itertracks())),
+        "label_mapping": mapping,
+    }
@@ -0,0 +1,199 @@
+import json
+import os
+import socket
+import tempfile
+import time
+
+from utils.audio_buffer import AudioBuffer, load_audio
+
+DEFAULT_PROFILE_PATH = os.path.join("outputs", "cpu_profiles.json")
+BATCH_CANDIDATES = (8, 16, 32, 64)
+# Rough peak activation memory per item of an embedding batch (10 s chunks).
+BATCH_ITEM_BYTES = 32 * 1024 * 1024
+CALIBRATION_SECONDS = 60
+
+# Threads are process-wide in torch and inter-op threads can only be set once,
+# so the first profile applied in a process (usually by a worker initializer)
+# wins and later calls leave it alone.
+_threads = None
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def available_memory():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def host_key(workers=1):
+    return f"{socket.gethostname()}/{available_cores()}cpu/{workers}w"
+
+def batch_candidates(workers=1, candidates=BATCH_CANDIDATES):
+    # Batch sizes whose activations fit in half of this worker's share of free memory.
+    memory = available_memory()
+    if memory is None:
+        return list(candidates)
+    budget = memory / workers / 2
+    fitting = [b for b in candidates if b * BATCH_ITEM_BYTES <= budget]
+    return fitting or [min(candidates)]
+
+def default_profile(workers=1):
+    intra = max(1, available_cores() // workers)
+    return {
+        "host": host_key(workers),
+        "workers": workers,
+        "intra_op_threads": intra,
+        # Several workers already run in parallel; one inter-op thread each
+        # avoids oversubscribing the cores they share.
+        "inter_op_threads": 1 if workers > 1 else min(2, intra),
+        # None keeps the batch sizes from local_config.yaml.
+        "embedding_batch_size": None,
+        "segmentation_batch_size": None,
+        "source": "default",
+    }
+
+def profile_path(path=None):
+    return path or os.environ.get("DIARIZATION_CPU_PROFILES", DEFAULT_PROFILE_PATH)
+
+def load_profiles(path=None):
+    try:
+        with open(profile_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_profile(profile, path=None):
+    path = profile_path(path)
+    profiles = load_profiles(path)
+    profiles[profile["host"]] = profile
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+def cpu_profile(workers=1, path=None):
+    """Calibrated profile for this host and worker count, else the defaults."""
+    return load_profiles(path).get(host_key(workers)) or default_profile(workers)
+
+def configure_threads(intra_op, inter_op=1):
+    global _threads
+    import torch
+
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        # Inter-op parallelism already started in this process; keep what it has.
+        inter_op = torch.get_num_interop_threads()
+    _threads = (intra_op, inter_op)
+    return _threads
+
+def threads_configured():
+    return _threads is not None
+
+def get_batch_sizes(pipeline):
+    segmentation = getattr(pipeline, "segmentation_batch_size", None)
+    if segmentation is None:
+        segmentation = getattr(getattr(pipeline, "_segmentation", None), "batch_size", None)
+    return getattr(pipeline, "embedding_batch_size", None), segmentation
+
+def set_batch_sizes(pipeline, embedding=None, segmentation=None):
+    # pyannote 3.x exposes both as settable attributes; 2.x keeps the
+    # segmentation batch size on its Inference object.
+    if embedding and hasattr(pipeline, "embedding_batch_size"):
+        pipeline.embedding_batch_size = embedding
+    if segmentation:
+        if hasattr(pipeline, "segmentation_batch_size"):
+            pipeline.segmentation_batch_size = segmentation
+        elif hasattr(getattr(pipeline, "_segmentation", None), "batch_size"):
+            pipeline._segmentation.batch_size = segmentation
+
+def apply_cpu_profile(pipeline, profile):
+    if not threads_configured():
+        configure_threads(profile["intra_op_threads"], profile["inter_op_threads"])
+    # Calibrated batch sizes are CPU measurements; GPU pipelines keep their config.
+    if pipeline is not None and str(getattr(pipeline, "device", "cpu")) == "cpu":
+        set_batch_sizes(pipeline, profile.get("embedding_batch_size"), profile.get("segmentation_batch_size"))
+    return profile
+
+def _time_run(pipeline, clip):
+    start = time.perf_counter()
+    pipeline(clip.to_pyannote())
+    return time.perf_counter() - start
+
+def calibrate(pipeline, audio, workers=1, seconds=CALIBRATION_SECONDS, candidates=BATCH_CANDIDATES,
+              path=None, save=True):
+    """Time a short clip under torch's default settings and under each candidate
+    batch size with per-worker threads, then persist the fastest for this host.
+
+    Only one worker runs during calibration, so with workers > 1 the numbers
+    are a best case for each of them; the relative ranking is what matters.
+    """
+    import torch
+
+    audio = load_audio(audio)
+    clip = AudioBuffer(audio.samples[:int(seconds * audio.sample_rate)], audio.sample_rate)
+    embedding, segmentation = get_batch_sizes(pipeline)
+
+    if not threads_configured():
+        # Baseline: whatever torch picked for this process, with the configured batch sizes.
+        _time_run(pipeline, clip)
+        baseline = {"threads": torch.get_num_threads(), "embedding_batch_size": embedding,
+                    "segmentation_batch_size": segmentation, "seconds": _time_run(pipeline, clip)}
+    else:
+        baseline = None
+
+    profile = default_profile(workers)
+    apply_cpu_profile(None, profile)
+    runs = []
+    for batch in batch_candidates(workers, candidates):
+        set_batch_sizes(pipeline, batch, batch)
+        _time_run(pipeline, clip)
+        runs.append({"embedding_batch_size": batch, "segmentation_batch_size": batch,
+                     "seconds": _time_run(pipeline, clip)})
+
+    best = min(runs, key=lambda run: run["seconds"])
+    set_batch_sizes(pipeline, best["embedding_batch_size"], best["segmentation_batch_size"])
+    profile.update(
+        embedding_batch_size=best["embedding_batch_size"],
+        segmentation_batch_size=best["segmentation_batch_size"],
+        source="calibrated",
+        calibrated_at=time.time(),
+        calibration={"clip_seconds": clip.duration, "memory_bytes": available_memory(),
+                     "baseline": baseline, "runs": runs},
+    )
+    if save:
+        save_profile(profile, path)
+    return profile
+
+def print_calibration_report(profile):
+    calibration = profile["calibration"]
+    clip = calibration["clip_seconds"]
+    baseline = calibration["baseline"]
+    print(f"\nCPU calibration for {profile['host']} ({clip:.0f}s clip)")
+    print(f"{'Setting':<34}{'Seconds':>9}{'x realtime':>12}{'Speedup':>9}")
+
+    def row(name, seconds):
+        speedup = f"{baseline['seconds'] / seconds:>8.2f}x" if baseline else f"{'-':>9}"
+        print(f"{name:<34}{seconds:>9.2f}{clip / seconds:>12.1f}{speedup}")
+
+    if baseline:
+        row(f"default: {baseline['threads']} threads, batch {baseline['embedding_batch_size']}",
+            baseline["seconds"])
+    for run in calibration["runs"]:
+        marker = " *" if run["embedding_batch_size"] == profile["embedding_batch_size"] else ""
+        row(f"{profile['intra_op_threads']}+{profile['inter_op_threads']} threads, "
+            f"batch {run['embedding_batch_size']}{marker}", run["seconds"])
@@ -1,46 +1,121 @@
-from pyannote.audio import Pipeline
-import matplotlib.pyplot as plt
 import os
-import torch
+import time
 import numpy as np
-import librosa
-
-def run_diarization(audio_path: str, hf_token: str, min_speakers=None, max_speakers=None):
-    if torch.backends.mps.is_available():
-        device = torch.device("mps")
-        print("Using MPS (Metal Performance Shaders) for GPU acceleration")
-    elif torch.cuda.is_available():
-        device = torch.device("cuda")
-        print("Using CUDA for GPU acceleration")
-    else:
-        device = torch.device("cpu")
-        print("Using CPU (no GPU acceleration available)")
-    
-    config_path = "local_config.yaml"
-    if os.path.exists(config_path):
-        print(f"Loading optimized pipeline from: {config_path}")
-        pipeline = Pipeline.from_pretrained(
-            config_path,
-            use_auth_token=hf_token
-        )
-    else:
-        print("Using default pipeline (local config not found)")
-        pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization", 
-            use_auth_token=hf_token
-        )
+
+from utils.audio_buffer import load_audio
+from utils.cpu_tuning import apply_cpu_profile, cpu_profile, get_batch_sizes, threads_configured
+from utils.profiler import profile_stage
+from utils.pipeline_registry import backend_device, get_registry
+from utils.result_cache import cache_key, get_cache
+from utils.segment_table import SegmentTable
+
+PLOT_SIZE = (24, 10)
+THUMBNAIL_SIZE = (8, 2.5)
+PLOT_DPI = 150
+SVG_WIDTH = 1200
+THUMBNAIL_SVG_WIDTH = 480
+# Above this many drawn bars, white bar edges would hide the bars themselves.
+EDGE_SEGMENT_LIMIT = 500
+
+# matplotlib, librosa, torch/pyannote and the sharding/VAD helpers are imported
+# inside the functions that need them, so that importing this module (e.g. to
+# print or assess a cached result) stays cheap.
+
+class ShardingOptionError(ValueError):
+    # An option that sharded diarization cannot honour; raised before any work starts.
+    pass
+
+def run_diarization(audio, hf_token: str, min_speakers=None, max_speakers=None,
+                    pipeline=None, config_path="local_config.yaml",
+                    use_cache=True, refresh_cache=False, vad=False,
+                    shard_seconds=None, shard_workers=None, backend="torch", speaker_count="embedding",
+                    shard_overlap=None, return_report=False):
+    # Decode once; pyannote gets the in-memory waveform instead of re-reading the file.
+    # With return_report=True, returns (annotation, report); the report of a
+    # sharded run holds its speedup and boundary consistency, and is None otherwise.
+    audio = load_audio(audio)
+    sharded = bool(shard_seconds) and audio.duration > shard_seconds
+    if sharded:
+        from utils.sharding import OVERLAP_SECONDS
+
+        shard_overlap = OVERLAP_SECONDS if shard_overlap is None else shard_overlap
+        if pipeline is not None:
+            raise ShardingOptionError("Sharded diarization loads a pipeline in each worker; "
+                                      "a preloaded pipeline needs shard_seconds=None")
+        if min_speakers is not None and min_speakers > 1:
+            raise ShardingOptionError("min_speakers > 1 cannot be applied per shard, since a shard may hold "
+                                      "fewer speakers; leave it unset or use shard_seconds=None")
+        if not 0 <= shard_overlap < shard_seconds:
+            raise ShardingOptionError(f"shard_overlap must be at least 0 and shorter than shard_seconds "
+                                      f"({shard_seconds:g}s), got {shard_overlap:g}s")
+    report = None
+    
+    cache_entry = None
+    if use_cache:
+        cache = get_cache()
+        params = {
+            "pipeline": pipeline.parameters(instantiated=True) if pipeline is not None else None,
+            "vad": vad,
+            "shard_seconds": shard_seconds,
+        }
+        if sharded:
+            params["shard_overlap"] = shard_overlap
+        if backend != "torch":
+            # Quantized/ONNX results differ slightly from fp32; keep them apart.
+            params["backend"] = backend
+        if min_speakers is None or max_speakers is None:
+            params["speaker_count"] = speaker_count
+        cache_entry = cache_key(audio, config_path, min_speakers, max_speakers, params=params)
+        if not refresh_cache:
+            start = time.perf_counter()
+            cached = cache.get(cache_entry)
+            if cached is not None:
+                print(f"Loaded cached diarization in {(time.perf_counter() - start) * 1000:.1f}ms")
+                return (cached, report) if return_report else cached
     
-    pipeline.to(device)
+    if sharded:
+        from utils.sharding import run_sharded_diarization
+        
+        # Long recording: overlapping shards diarized in a process pool, each
+        # worker holding its own warm pipeline.
+        with profile_stage("inference (sharded)", audio.duration):
+            diarization, report = run_sharded_diarization(
+                audio, hf_token, shard_seconds=shard_seconds, overlap_seconds=shard_overlap,
+                workers=shard_workers, max_speakers=max_speakers, config_path=config_path,
+                backend=backend, vad=vad, speaker_count=speaker_count
+            )
+        if cache_entry is not None:
+            cache.put(cache_entry, diarization)
+        return (diarization, report) if return_report else diarization
     
-    print(f"Processing audio with device: {device}")
+    if pipeline is None:
+        device = backend_device(backend, verbose=True)
+        registry = get_registry()
+        pipeline = registry.get(hf_token, config_path=config_path, device=device, backend=backend)
+        if device.type == "cpu" and not threads_configured():
+            # Worker processes configure themselves; a plain run uses this host's profile.
+            cpu = apply_cpu_profile(pipeline, cpu_profile())
+            print(f"CPU profile ({cpu['source']}): {cpu['intra_op_threads']}+{cpu['inter_op_threads']} threads, "
+                  f"batch sizes {get_batch_sizes(pipeline)}")
+        stats = registry.stats()
+        print(f"Pipeline cache: {stats['hits']} hits, {stats['misses']} misses")
+        print(f"Processing audio with device: {device}")
+    else:
+        print("Using preloaded pipeline")
     
-    audio_duration, audio_characteristics = analyze_audio_characteristics(audio_path)
+    with profile_stage("analyze_audio_characteristics", audio.duration):
+        audio_duration, audio_characteristics = analyze_audio_characteristics(audio)
     print(f"Audio duration: {audio_duration:.1f}s")
     print(f"Audio characteristics: {audio_characteristics}")
     
     if min_speakers is None or max_speakers is None:
-        min_speakers, max_speakers = estimate_speaker_count(audio_duration, audio_characteristics)
-        print(f"Estimated speakers: {min_speakers}-{max_speakers}")
+        with profile_stage("estimate_speaker_count", audio.duration):
+            low, high = estimate_speakers(audio, pipeline, speaker_count, audio_duration, audio_characteristics)
+        # Only fill in the bounds the caller left open.
+        min_speakers = low if min_speakers is None else min_speakers
+        max_speakers = max(high, min_speakers) if max_speakers is None else max_speakers
+        min_speakers = min(min_speakers, max_speakers)
+        print(f"Speaker range: {min_speakers}-{max_speakers}")
     
     kwargs = {}
     if min_speakers is not None:
@@ -50,9 +125,18 @@ def run_diarization(audio_path: str, hf_token: str, min_speakers=None, max_speak
     
     print(f"Diarization parameters: {kwargs}")
     
+    if vad:
+        # Skip silence: only padded speech regions go through inference.
+        from utils.vad import detect_speech, diarize_speech_only
+        
+        speech_regions = detect_speech(audio)
+        run = lambda **kw: diarize_speech_only(pipeline, audio, regions=speech_regions, **kw)[0]
+    else:
+        run = lambda **kw: pipeline(audio.to_pyannote(), **kw)
+    
     try:
-        diarization = pipeline(audio_path, **kwargs)
-        return diarization
+        with profile_stage("inference", audio.duration):
+            diarization = run(**kwargs)
     except Exception as e:
         print(f"Error during diarization: {e}")
         print("Trying with fallback parameters...")
@@ -62,11 +146,19 @@ def run_diarization(audio_path: str, hf_token: str, min_speakers=None, max_speak
             "max_speakers": min(5, max_speakers + 1) if max_speakers else 5
         }
         print(f"Fallback parameters: {fallback_kwargs}")
-        return pipeline(audio_path, **fallback_kwargs)
+        with profile_stage("inference (fallback)", audio.duration):
+            diarization = run(**fallback_kwargs)
+    
+    if cache_entry is not None:
+        cache.put(cache_entry, diarization)
+    return (diarization, report) if return_report else diarization
 
-def analyze_audio_characteristics(audio_path):
+def analyze_audio_characteristics(audio):
     try:
-        y, sr = librosa.load(audio_path, sr=None)
+        import librosa
+        
+        audio = load_audio(audio)
+        y, sr = np.asarray(audio.samples), audio.sample_rate
         duration = len(y) / sr
         
         rms = np.sqrt(np.mean(y**2))
@@ -90,6 +182,28 @@ def analyze_audio_characteristics(audio_path):
         print(f"Warning: Could not analyze audio characteristics: {e}")
         return 0, {"has_voice": True}
 
+def estimate_speakers(audio, pipeline, method, duration, characteristics):
+    # "embedding": count speakers from a strided sample of speech windows.
+    # "duration": the original length-based ranges, also the fallback.
+    if method == "embedding":
+        from utils.speaker_count import estimate_speaker_range
+
+        try:
+            speaker_range, info = estimate_speaker_range(audio, pipeline)
+            if speaker_range is None:
+                print(f"Only {info['windows']} speech windows to embed; using duration heuristic")
+            else:
+                low, high = speaker_range
+                print(f"Estimated speakers: {low}-{high} from {info['windows']} speech windows "
+                      f"(eigengap {info.get('eigengap', '-')}, silhouette {info.get('silhouette', '-')}) "
+                      f"in {info['seconds']:.2f}s")
+                return low, high
+        except Exception as e:
+            print(f"Warning: Embedding speaker count failed ({e}); using duration heuristic")
+    low, high = estimate_speaker_count(duration, characteristics)
+    print(f"Estimated speakers: {low}-{high} (duration heuristic)")
+    return low, high
+
 def estimate_speaker_count(duration, characteristics):
     if duration < 30:
         return 1, 2
@@ -101,37 +215,83 @@ def estimate_speaker_count(duration, characteristics):
         return 2, 6
 
 def print_segments(diarization):
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        print(f"{turn.start:.2f}s --> {turn.end:.2f}s : {speaker}")
+    segments = SegmentTable.from_annotation(diarization)
+    if len(segments):
+        print("\n".join(f"{start:.2f}s --> {end:.2f}s : {speaker}" for start, end, speaker in segments))
 
-def plot_diarization(diarization, output_path="outputs/diarization_plot.png"):
-    fig, ax = plt.subplots(figsize=(24, 10))
-    
-    segments = []
-    speakers = set()
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        segments.append((turn.start, turn.end, speaker))
-        speakers.add(speaker)
+def plot_diarization(diarization, output_path="outputs/diarization_plot.png", dpi=PLOT_DPI,
+                     thumbnail=False, show=False):
+    """Render the speaker timeline to output_path; the extension picks the format.
+
+    .json and .svg write a lightweight timeline without matplotlib. Anything
+    else is rendered on an off-screen Agg canvas with one broken_barh per
+    speaker. Segments closer than one pixel are merged first, so the drawing
+    cost depends on the image size, not on the number of segments.
+    thumbnail=True draws a small, undecorated preview. Nothing is shown on
+    screen unless show=True.
+    """
+    segments = SegmentTable.from_annotation(diarization)
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension in (".json", ".svg"):
+        from utils.timeline import write_timeline_json, write_timeline_svg
+
+        if extension == ".json":
+            write_timeline_json(segments, output_path)
+        else:
+            write_timeline_svg(segments, output_path, width=THUMBNAIL_SVG_WIDTH if thumbnail else SVG_WIDTH)
+        print(f"Saved diarization timeline to {output_path}")
+        return
+
+    from matplotlib.patches import Rectangle
+    from utils.timeline import format_clock, speaker_color, time_ticks
+
+    figsize = THUMBNAIL_SIZE if thumbnail else PLOT_SIZE
+    if show:
+        import matplotlib.pyplot as plt
+        fig = plt.figure(figsize=figsize)
+    else:
+        # A bare Agg canvas: no pyplot state, no GUI backend, works headless.
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
     
-    speakers = sorted(list(speakers))
+    speakers = segments.labels
+    speaker_colors = {speaker: speaker_color(i) for i, speaker in enumerate(speakers)}
+    total_duration = segments.max_end
     
-    colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', 
-              '#DDA0DD', '#98D8C8', '#F7DC6F', '#BB8FCE', '#85C1E9']
-    speaker_colors = {speaker: colors[i % len(colors)] for i, speaker in enumerate(speakers)}
+    # One pixel of the plot area, in seconds.
+    resolution = total_duration / (figsize[0] * dpi) if total_duration > 0 else 0.0
+    drawn = segments.merged(resolution)
+    height = 0.8
+    edge_width = 0 if thumbnail or len(drawn) > EDGE_SEGMENT_LIMIT else 2
+    for i, speaker in enumerate(speakers):
+        mask = drawn.codes == i
+        ax.broken_barh(np.column_stack((drawn.start[mask], drawn.durations[mask])), (i - height/2, height),
+                       facecolors=speaker_colors[speaker], alpha=0.9, edgecolor='white',
+                       linewidth=edge_width, zorder=3)
     
-    y_positions = {speaker: i for i, speaker in enumerate(speakers)}
+    if len(speakers) > 0:
+        ax.set_ylim(-0.5, len(speakers) - 0.5)
+        ax.set_yticks(range(len(speakers)))
+    else:
+        ax.set_ylim(-0.5, 0.5)
+        ax.set_yticks([])
+    ax.set_xlim(0, max(total_duration, 1.0))
     
-    for start, end, speaker in segments:
-        y_pos = y_positions[speaker]
-        color = speaker_colors[speaker]
-        
-        duration = end - start
-        height = 0.8
-        
-        rect = plt.Rectangle((start, y_pos - height/2), duration, height, 
-                           facecolor=color, alpha=0.9, edgecolor='white', 
-                           linewidth=2, zorder=3)
-        ax.add_patch(rect)
+    if thumbnail:
+        ax.set_yticklabels([f'S{i+1}' for i in range(len(speakers))], fontsize=8)
+        ticks = time_ticks(total_duration, max_ticks=6)
+        ax.set_xticks(ticks)
+        ax.set_xticklabels([format_clock(t) for t in ticks], fontsize=8)
+        fig.tight_layout(pad=0.3)
+        fig.savefig(output_path, dpi=dpi)
+        print(f"Saved diarization thumbnail to {output_path}")
+        if show:
+            plt.show()
+        return
     
     ax.set_xlabel('Time (seconds)', fontsize=16, fontweight='bold', color='#2c3e50')
     ax.set_ylabel('Speakers', fontsize=16, fontweight='bold', color='#2c3e50')
@@ -141,30 +301,18 @@ def plot_diarization(diarization, output_path="outputs/diarization_plot.png"):
     ax.grid(True, alpha=0.2, linestyle='-', linewidth=0.5, color='#34495e')
     
     if len(speakers) > 0:
-        ax.set_ylim(-0.5, len(speakers) - 0.5)
-        ax.set_yticks(range(len(speakers)))
         ax.set_yticklabels([f'Speaker {i+1}' for i in range(len(speakers))], 
                           fontsize=12, fontweight='bold')
-    else:
-        ax.set_ylim(-0.5, 0.5)
-        ax.set_yticks([])
     
-    if segments:
-        max_time = max([end for _, end, _ in segments])
-        time_marks = list(range(0, int(max_time) + 60, 60))
-        ax.set_xticks(time_marks)
-        ax.set_xticklabels([f'{t//60}:{t%60:02d}' for t in time_marks], 
-                          fontsize=11, fontweight='bold')
-    else:
-        ax.set_xticks([0])
-        ax.set_xticklabels(['0:00'], fontsize=11, fontweight='bold')
+    time_marks = time_ticks(total_duration)
+    ax.set_xticks(time_marks)
+    ax.set_xticklabels([format_clock(t) for t in time_marks], 
+                      fontsize=11, fontweight='bold')
     
     if speakers:
-        legend_elements = []
-        for speaker in speakers:
-            legend_elements.append(plt.Rectangle((0,0), 1, 1, 
-                                               facecolor=speaker_colors[speaker], 
-                                               alpha=0.9, edgecolor='white', linewidth=2))
+        legend_elements = [Rectangle((0, 0), 1, 1, facecolor=speaker_colors[speaker],
+                                     alpha=0.9, edgecolor='white', linewidth=2)
+                           for speaker in speakers]
         
         legend = ax.legend(legend_elements, [f'Speaker {i+1}' for i in range(len(speakers))], 
                           loc='upper right', title='Speaker Legend', 
@@ -173,8 +321,7 @@ def plot_diarization(diarization, output_path="outputs/diarization_plot.png"):
                           framealpha=0.95, edgecolor='#34495e')
         legend.get_frame().set_facecolor('#ecf0f1')
     
-    if segments:
-        total_duration = max([end for _, end, _ in segments])
+    if len(segments):
         num_segments = len(segments)
         avg_segment_duration = total_duration / num_segments if num_segments > 0 else 0
         
@@ -189,14 +336,15 @@ def plot_diarization(diarization, output_path="outputs/diarization_plot.png"):
             bbox=dict(boxstyle='round,pad=0.5', facecolor='#ecf0f1', 
                      alpha=0.9, edgecolor='#34495e', linewidth=2))
     
-    if segments and speakers:
+    if len(segments) and speakers:
+        speaker_times = segments.speaker_durations()
         for i, speaker in enumerate(speakers):
-            speaker_segments = [seg for seg in segments if seg[2] == speaker]
-            total_speaker_time = sum(end - start for start, end, _ in speaker_segments)
+            total_speaker_time = speaker_times[i]
             percentage = (total_speaker_time / total_duration) * 100 if total_duration > 0 else 0
             
-            ax.text(0.98, i, f'{percentage:.1f}%', transform=ax.transAxes, 
-                   fontsize=10, fontweight='bold', ha='right', va='center',
+            # x in axes fraction, y in data units: right edge of speaker i's row.
+            ax.text(0.98, i, f'{percentage:.1f}%', transform=ax.get_yaxis_transform(), 
+                   fontsize=10, fontweight='bold', ha='right', va='center', zorder=4,
                    bbox=dict(boxstyle='round,pad=0.3', facecolor=speaker_colors[speaker], 
                             alpha=0.8, edgecolor='white', linewidth=1))
     
@@ -210,10 +358,9 @@ def plot_diarization(diarization, output_path="outputs/diarization_plot.png"):
     fig.patch.set_facecolor('#f8f9fa')
     ax.set_facecolor('#ffffff')
     
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300, bbox_inches='tight', 
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=dpi, bbox_inches='tight', 
                 facecolor='#f8f9fa', edgecolor='none')
     print(f"Saved enhanced audio visualization to {output_path}")
-    plt.show()
+    if show:
+        plt.show()
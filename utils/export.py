@@ -0,0 +1,205 @@
+import glob
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from utils.interval_index import IntervalIndex
+from utils.segment_table import SegmentTable
+
+FORMATS = (".rttm", ".jsonl", ".npz")
+# Columns that are memory-mapped on read; everything else in an archive is small.
+MAPPED_COLUMNS = ("start", "end", "speaker")
+# Size of a zip local file header before its variable-length name and extra fields.
+ZIP_LOCAL_HEADER = 30
+
+def to_json(value):
+    # numpy scalars and arrays found in quality metrics.
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+def flatten_metrics(metrics, prefix=""):
+    """Numeric leaves of a quality-metrics dict as {"coverage.overlap_duration": value, ...}.
+
+    Lists (e.g. silence periods) are left out; the full dict is kept as JSON
+    next to the flattened columns.
+    """
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, name + "."))
+        elif isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+def write_rttm(segments, f, uri="audio"):
+    # One write for the whole table instead of one per turn.
+    uri = uri.replace(" ", "_")
+    f.write("".join(f"SPEAKER {uri} 1 {start:.6f} {end - start:.6f} <NA> <NA> {speaker} <NA> <NA>\n"
+                    for start, end, speaker in segments))
+
+def write_jsonl(segments, f, uri="audio"):
+    f.write("".join(json.dumps({"uri": uri, "start": round(start, 6), "end": round(end, 6),
+                                "duration": round(end - start, 6), "speaker": speaker}) + "\n"
+                    for start, end, speaker in segments))
+
+def save_npz(segments, path, uri="audio", duration=None, metrics=None):
+    """Write one result as an uncompressed columnar NPZ archive.
+
+    Segments are start/end float64 columns plus an int32 code into the
+    `speakers` dictionary. Quality metrics are stored twice: numeric leaves as
+    parallel `metric_names`/`metric_values` columns for queries, and the whole
+    dict as JSON. The archive is left uncompressed so DiarizationArchive can
+    memory-map the columns in place.
+    """
+    segments = SegmentTable.from_annotation(segments)
+    flat = flatten_metrics(metrics) if metrics else {}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp.npz")
+    os.close(fd)
+    np.savez(
+        tmp_path,
+        start=segments.start,
+        end=segments.end,
+        speaker=segments.codes.astype(np.int32),
+        speakers=np.array(segments.labels, dtype=str).reshape(-1),
+        uri=np.array(uri),
+        duration=np.array(segments.max_end if duration is None else duration, dtype=np.float64),
+        metric_names=np.array(list(flat), dtype=str).reshape(-1),
+        metric_values=np.array(list(flat.values()), dtype=np.float64),
+        metrics_json=np.frombuffer(json.dumps(metrics or {}, default=to_json).encode(), dtype=np.uint8),
+    )
+    os.replace(tmp_path, path)
+    return path
+
+def export_segments(segments, path, uri=None, duration=None, metrics=None):
+    """Write a result to `path` as RTTM, JSONL or NPZ, picked by extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown export format {extension!r}; expected one of {', '.join(FORMATS)}")
+    segments = SegmentTable.from_annotation(segments)
+    uri = uri or os.path.splitext(os.path.basename(path))[0]
+    if extension == ".npz":
+        return save_npz(segments, path, uri=uri, duration=duration, metrics=metrics)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        (write_rttm if extension == ".rttm" else write_jsonl)(segments, f, uri=uri)
+    return path
+
+def map_npz(path, names=MAPPED_COLUMNS):
+    """Arrays of an uncompressed NPZ archive; those in `names` are memory-mapped.
+
+    np.load cannot memory-map inside a zip, but members written by np.savez
+    are stored uncompressed, so each .npy payload is a contiguous byte range
+    of the file: after the member's local header and the .npy header.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {name} is compressed; write archives with save_npz")
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + ZIP_LOCAL_HEADER + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            if name not in names:
+                f.seek(-8, os.SEEK_CUR)  # Rewind the magic string so read_array sees a full .npy.
+                arrays[name] = np.lib.format.read_array(f)
+                continue
+            header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                      else np.lib.format.read_array_header_2_0)
+            shape, fortran_order, dtype = header(f)
+            if not np.prod(shape):
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran_order else "C")
+    return arrays
+
+class DiarizationArchive:
+    """Read-only view of an archive written by save_npz.
+
+    The start, end and speaker columns are memory-mapped, so opening an
+    archive reads only its small metadata and a query touches just the pages
+    it needs.
+    """
+
+    def __init__(self, path):
+        arrays = map_npz(path)
+        self.path = path
+        self.start = arrays["start"]
+        self.end = arrays["end"]
+        self.speaker = arrays["speaker"]
+        self.speakers = arrays["speakers"].tolist()
+        self.uri = str(arrays["uri"])
+        self.duration = float(arrays["duration"])
+        self.metric_names = arrays["metric_names"].tolist()
+        self.metric_values = arrays["metric_values"]
+        self._metrics_json = arrays["metrics_json"]
+
+    def __len__(self):
+        return len(self.start)
+
+    def metric(self, name, default=np.nan):
+        if name in self.metric_names:
+            return float(self.metric_values[self.metric_names.index(name)])
+        return default
+
+    def metrics(self):
+        """The full quality-metrics dict as saved."""
+        return json.loads(self._metrics_json.tobytes())
+
+    def segments(self):
+        return SegmentTable(self.start, self.end, self.speaker, self.speakers)
+
+    def talk_time(self):
+        # Total talk time per speaker code, straight from the mapped columns.
+        return np.bincount(self.speaker, weights=self.end - self.start, minlength=len(self.speakers))
+
+    def overlap_duration(self):
+        return IntervalIndex(self.segments()).overlap_duration(self.duration)
+
+def collect_archives(sources):
+    """.npz paths from files, directories (searched recursively) and glob patterns."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(glob.glob(os.path.join(source, "**", "*.npz"), recursive=True)))
+        elif os.path.isfile(source):
+            paths.append(source)
+        else:
+            paths.extend(sorted(glob.glob(source, recursive=True)))
+    return paths
+
+def iter_archives(sources):
+    for path in collect_archives(sources):
+        yield DiarizationArchive(path)
+
+def talk_time_per_speaker(sources):
+    """Rows of (uri, speaker, seconds) over every archive in `sources`.
+
+    Speaker labels are local to a recording, so talk time is reported per
+    recording and speaker rather than summed across files.
+    """
+    rows = []
+    for archive in iter_archives(sources):
+        rows.extend(zip([archive.uri] * len(archive.speakers), archive.speakers, archive.talk_time().tolist()))
+    return rows
+
+def overlap_per_hour(sources):
+    """Rows of (uri, hours, overlap seconds, overlap seconds per hour), plus a fleet total row."""
+    rows = []
+    for archive in iter_archives(sources):
+        hours = archive.duration / 3600
+        overlap = archive.overlap_duration()
+        rows.append((archive.uri, hours, overlap, overlap / hours if hours else 0.0))
+    total_hours = sum(row[1] for row in rows)
+    total_overlap = sum(row[2] for row in rows)
+    rows.append(("TOTAL", total_hours, total_overlap, total_overlap / total_hours if total_hours else 0.0))
+    return rows
@@ -0,0 +1,163 @@
+import json
+import os
+import time
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+DEFAULT_MODEL_DIR = os.path.join("outputs", "models")
+ONNX_OPSET = 17
+# Layers dynamic int8 quantization applies to in the PyTorch path.
+QUANTIZED_LAYERS = ("Linear", "LSTM", "GRU")
+
+def model_dir(config_path="local_config.yaml", root=None):
+    # One export per model config, so a changed local_config.yaml never picks
+    # up ONNX files exported from different checkpoints.
+    import hashlib
+    from utils.pipeline_registry import resolve_config
+
+    _, params = resolve_config(config_path)
+    models = json.dumps(params.get("pipeline", {}), sort_keys=True, default=str)
+    root = root or os.environ.get("DIARIZATION_MODEL_DIR", DEFAULT_MODEL_DIR)
+    return os.path.join(root, hashlib.sha256(models.encode()).hexdigest()[:12])
+
+def export_targets(pipeline):
+    """The torch modules behind a SpeakerDiarization pipeline, with example
+    inputs for tracing.
+
+    Segmentation is a pyannote Model fed raw waveform chunks. For speechbrain
+    embeddings (the ECAPA model in local_config.yaml) only the ECAPA-TDNN
+    network is exported: filterbank features stay in torch because STFT ops
+    don't export cleanly, and they are a small share of the cost.
+    """
+    import torch
+
+    segmentation = pipeline._segmentation.model
+    targets = {
+        "segmentation": {
+            "module": segmentation,
+            "inputs": (segmentation.example_input_array,),
+            "input_names": ["waveforms"],
+            "dynamic_axes": {"waveforms": {0: "batch"}, "output": {0: "batch"}},
+        }
+    }
+
+    embedding = pipeline._embedding
+    if hasattr(embedding, "classifier_"):
+        targets["embedding"] = {
+            "module": embedding.classifier_.mods.embedding_model,
+            "inputs": (torch.randn(2, 200, embedding.classifier_.hparams.n_mels), torch.ones(2)),
+            "input_names": ["feats", "lengths"],
+            "dynamic_axes": {"feats": {0: "batch", 1: "frames"}, "lengths": {0: "batch"},
+                             "output": {0: "batch"}},
+        }
+    elif hasattr(embedding, "model_"):
+        model = embedding.model_
+        targets["embedding"] = {
+            "module": model,
+            "inputs": (model.example_input_array,),
+            "input_names": ["waveforms"],
+            "dynamic_axes": {"waveforms": {0: "batch", 2: "samples"}, "output": {0: "batch"}},
+        }
+    else:
+        raise ValueError(f"Unsupported embedding model: {type(embedding).__name__}")
+    return targets
+
+def export_models(pipeline, output_dir, quantize=True, opset=ONNX_OPSET):
+    """Export segmentation and embedding models to ONNX, plus dynamically
+    int8-quantized copies, and write a manifest describing them."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"opset": opset, "exported_at": time.time(), "models": {}}
+    for name, target in export_targets(pipeline).items():
+        module = target["module"].eval()
+        path = os.path.join(output_dir, f"{name}.onnx")
+        with torch.inference_mode():
+            torch.onnx.export(module, target["inputs"], path, input_names=target["input_names"],
+                              output_names=["output"], dynamic_axes=target["dynamic_axes"],
+                              opset_version=opset)
+        entry = {"fp32": os.path.basename(path), "fp32_bytes": os.path.getsize(path),
+                 "inputs": target["input_names"]}
+        if quantize:
+            int8_path = os.path.join(output_dir, f"{name}.int8.onnx")
+            quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+            entry.update(int8=os.path.basename(int8_path), int8_bytes=os.path.getsize(int8_path))
+        manifest["models"][name] = entry
+        print(f"Exported {name}: {entry['fp32_bytes'] / 1e6:.1f} MB"
+              + (f" (int8 {entry['int8_bytes'] / 1e6:.1f} MB)" if quantize else ""))
+
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+class OnnxForward:
+    """Drop-in replacement for a module's forward() backed by ONNX Runtime.
+
+    Installed as an instance attribute, so the original module keeps its
+    specifications, receptive field and other metadata the pipeline reads;
+    only the numeric work moves to ONNX Runtime.
+    """
+
+    def __init__(self, path, input_names, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = input_names
+        self.path = path
+
+    def __call__(self, *args, **kwargs):
+        import torch
+
+        values = list(args) + [kwargs[name] for name in self.input_names[len(args):] if name in kwargs]
+        device = values[0].device
+        feeds = {name: value.detach().cpu().numpy() for name, value in zip(self.input_names, values)
+                 if value is not None}
+        output = self.session.run(None, feeds)[0]
+        return torch.from_numpy(output).to(device)
+
+def quantize_torch(module):
+    import torch
+
+    layers = {getattr(torch.nn, name) for name in QUANTIZED_LAYERS}
+    return torch.ao.quantization.quantize_dynamic(module, layers, dtype=torch.qint8, inplace=True)
+
+def apply_backend(pipeline, backend, config_path="local_config.yaml", root=None):
+    """Switch a loaded pipeline's segmentation and embedding models to `backend` in place.
+
+    "torch" leaves the pipeline as loaded. "torch-int8" quantizes Linear and
+    recurrent layers dynamically. "onnx" and "onnx-int8" load the models
+    exported by export_models for this config and run them on ONNX Runtime.
+    These backends are CPU-only.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "torch":
+        return pipeline
+
+    targets = export_targets(pipeline)
+    if backend == "torch-int8":
+        for target in targets.values():
+            quantize_torch(target["module"])
+        return pipeline
+
+    import torch
+
+    directory = model_dir(config_path, root)
+    manifest_path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No exported models in {directory}; run `python cli.py export-models` first")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    variant = "int8" if backend == "onnx-int8" else "fp32"
+    for name, target in targets.items():
+        entry = manifest["models"][name]
+        if variant not in entry:
+            raise FileNotFoundError(f"{name} was exported without an int8 model; re-export with quantization")
+        target["module"].forward = OnnxForward(os.path.join(directory, entry[variant]), entry["inputs"],
+                                               threads=torch.get_num_threads())
+    return pipeline
@@ -0,0 +1,278 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.audio_buffer import load_audio
+from utils.pipeline_registry import resolve_config
+from utils.result_cache import hash_audio
+
+DEFAULT_INTERMEDIATES_DIR = os.path.join("outputs", "cache", "intermediates")
+
+# Params that only touch clustering and post-processing; changing them reuses
+# the cached segmentation scores and embeddings as-is.
+CHEAP_PARAMS = {
+    "clustering.method",
+    "clustering.min_cluster_size",
+    "clustering.threshold",
+    "segmentation.min_duration_off",
+}
+
+# recluster calls private pipeline methods (speaker_count with a receptive
+# field, set_num_speakers, reconstruct, to_annotation) whose signatures are
+# those of pyannote.audio 3.1 through 3.x.
+SUPPORTED_PYANNOTE = ((3, 1), (4, 0))
+# Re-embedding runs the pipeline's embedding model, which is not safe to call
+# from several sweep threads at once.
+_embedding_lock = threading.Lock()
+
+def check_pyannote_version():
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        installed = version("pyannote.audio")
+    except PackageNotFoundError:
+        raise RuntimeError("Re-clustering needs pyannote.audio, which is not installed")
+    release = tuple(int(part) for part in re.findall(r"\d+", installed)[:2])
+    low, high = SUPPORTED_PYANNOTE
+    if not low <= release < high:
+        raise RuntimeError(
+            f"Re-clustering relies on pyannote.audio internals and supports versions "
+            f">={low[0]}.{low[1]},<{high[0]}.{high[1]}; found {installed}. "
+            f"Run the full pipeline instead, or install a supported version"
+        )
+    return installed
+
+class Intermediates:
+    """Segmentation scores and per-chunk speaker embeddings for one file."""
+
+    def __init__(self, segmentations, embeddings, segmentation_threshold, duration):
+        self.segmentations = segmentations
+        self.embeddings = embeddings
+        self.segmentation_threshold = segmentation_threshold
+        self.duration = duration
+
+    def save(self, path):
+        window = self.segmentations.sliding_window
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp.npz")
+        os.close(fd)
+        np.savez(
+            tmp_path,
+            segmentations=self.segmentations.data,
+            window=np.array([window.start, window.duration, window.step]),
+            embeddings=self.embeddings,
+            segmentation_threshold=np.array(self.segmentation_threshold),
+            duration=np.array(self.duration),
+        )
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+        with np.load(path) as data:
+            start, duration, step = data["window"]
+            segmentations = SlidingWindowFeature(
+                data["segmentations"], SlidingWindow(start=start, duration=duration, step=step)
+            )
+            return cls(segmentations, data["embeddings"],
+                       float(data["segmentation_threshold"]), float(data["duration"]))
+
+def intermediates_path(audio, config_path="local_config.yaml", root=DEFAULT_INTERMEDIATES_DIR):
+    _, params = resolve_config(config_path)
+    # Only the model side of the config matters; tuned params are applied later.
+    models = json.dumps(params.get("pipeline", {}), sort_keys=True, default=str)
+    config_hash = hashlib.sha256(models.encode()).hexdigest()[:12]
+    return os.path.join(root, f"{hash_audio(audio)[:32]}-{config_hash}.npz")
+
+def capture_intermediates(pipeline, audio, **kwargs):
+    # Runs the full pipeline once and keeps what its hook sees along the way.
+    audio = load_audio(audio)
+    captured = {}
+
+    def hook(step_name, step_artifact, file=None, **_):
+        if step_name in ("segmentation", "embeddings"):
+            captured[step_name] = step_artifact
+
+    diarization = pipeline(audio.to_pyannote(), hook=hook, **kwargs)
+    if "segmentation" not in captured or "embeddings" not in captured:
+        raise RuntimeError("Pipeline did not expose segmentation/embeddings through its hook")
+
+    intermediates = Intermediates(
+        captured["segmentation"],
+        np.asarray(captured["embeddings"]),
+        float(pipeline.segmentation.threshold),
+        audio.duration,
+    )
+    return diarization, intermediates
+
+def load_or_capture(pipeline, audio, config_path="local_config.yaml", refresh=False, **kwargs):
+    audio = load_audio(audio)
+    path = intermediates_path(audio, config_path)
+    if not refresh and os.path.exists(path):
+        print(f"Loaded cached segmentation and embeddings from {path}")
+        return Intermediates.load(path)
+
+    print("Computing segmentation and embeddings (cached for later re-clustering)...")
+    _, intermediates = capture_intermediates(pipeline, audio, **kwargs)
+    intermediates.save(path)
+    return intermediates
+
+def flatten_params(params, prefix=""):
+    flat = {}
+    for key, value in params.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_params(value, name + "."))
+        else:
+            flat[name] = value
+    return flat
+
+def nest_params(flat):
+    nested = {}
+    for name, value in flat.items():
+        node = nested
+        *parents, leaf = name.split(".")
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = value
+    return nested
+
+def recluster(pipeline, intermediates, params=None, audio=None, min_speakers=None, max_speakers=None):
+    # Re-runs only the stages after embedding extraction (clustering,
+    # reconstruction, post-processing) with `params` overriding the current
+    # pipeline params, without mutating the shared pipeline.
+    check_pyannote_version()
+    from pyannote.audio.utils.signal import binarize
+    from pyannote.core import Annotation
+
+    current = flatten_params(pipeline.parameters(instantiated=True))
+    overrides = flatten_params(params or {})
+    merged = dict(current, **overrides)
+
+    segmentations = intermediates.segmentations
+    embeddings = intermediates.embeddings
+    threshold = float(merged.get("segmentation.threshold", intermediates.segmentation_threshold))
+    powerset = getattr(pipeline._segmentation.model.specifications, "powerset", False)
+
+    if powerset:
+        binarized = segmentations
+    else:
+        binarized = binarize(segmentations, onset=threshold, initial_state=False)
+
+    if not powerset and threshold != intermediates.segmentation_threshold:
+        # Embedding masks depend on the binarized segmentation: recompute
+        # embeddings, but still skip the segmentation model.
+        if audio is None:
+            raise ValueError("Changing segmentation.threshold needs the audio to re-embed")
+        with _embedding_lock:
+            embeddings = pipeline.get_embeddings(
+                load_audio(audio).to_pyannote(), binarized,
+                exclude_overlap=pipeline.embedding_exclude_overlap,
+            )
+
+    count = pipeline.speaker_count(binarized, pipeline._segmentation.model._receptive_field,
+                                   warm_up=(0.0, 0.0))
+
+    if np.nanmax(count.data) == 0.0:
+        return Annotation()
+
+    clustering = copy.deepcopy(pipeline.clustering)
+    clustering_params = {k.split(".", 1)[1]: v for k, v in merged.items() if k.startswith("clustering.")}
+    clustering.instantiate(clustering_params)
+
+    num_speakers, min_speakers, max_speakers = pipeline.set_num_speakers(
+        min_speakers=min_speakers, max_speakers=max_speakers
+    )
+    hard_clusters, _, _ = clustering(
+        embeddings=embeddings,
+        segmentations=binarized,
+        num_clusters=num_speakers,
+        min_clusters=min_speakers,
+        max_clusters=max_speakers,
+    )
+
+    count.data = np.minimum(count.data, max_speakers).astype(np.int8)
+    inactive_speakers = np.sum(binarized.data, axis=1) == 0
+    hard_clusters[inactive_speakers] = -2
+    discrete = pipeline.reconstruct(segmentations, hard_clusters, count)
+
+    diarization = pipeline.to_annotation(
+        discrete,
+        min_duration_on=0.0,
+        min_duration_off=merged.get("segmentation.min_duration_off", 0.0),
+    )
+    mapping = {label: f"SPEAKER_{i:02d}" for i, label in enumerate(diarization.labels())}
+    return diarization.rename_labels(mapping=mapping)
+
+def expand_grid(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def sweep_params(pipeline, intermediates, grid, audio=None, min_speakers=None, max_speakers=None,
+                 workers=None):
+    # Evaluates every combination in `grid` ({"clustering.threshold": [...], ...})
+    # against the cached intermediates and ranks them by quality score.
+    from utils.quality_assessor import assess_diarization_quality
+
+    check_pyannote_version()
+    combos = expand_grid(grid)
+    expensive = sorted(set(grid) - CHEAP_PARAMS)
+    if expensive:
+        print(f"Note: {', '.join(expensive)} require re-embedding; those points are slower")
+
+    def evaluate(combo):
+        try:
+            diarization = recluster(pipeline, intermediates, nest_params(combo), audio=audio,
+                                    min_speakers=min_speakers, max_speakers=max_speakers)
+            metrics = assess_diarization_quality(diarization, intermediates.duration, verbose=False)
+            return {"params": combo, "quality_score": float(metrics["quality_score"]),
+                    "num_speakers": len(diarization.labels()), "metrics": metrics}
+        except Exception as e:
+            return {"params": combo, "quality_score": float("-inf"), "error": str(e)}
+
+    # Clustering and reconstruction are NumPy/SciPy-bound, so threads overlap
+    # well and the (large) intermediates are shared rather than pickled.
+    # Points that re-embed take turns on the shared embedding model.
+    with ThreadPoolExecutor(max_workers=workers or min(len(combos), os.cpu_count() or 1)) as pool:
+        results = list(pool.map(evaluate, combos))
+
+    results.sort(key=lambda r: r["quality_score"], reverse=True)
+    return results
+
+def print_sweep(results, top=10):
+    print("\n" + "="*60)
+    print("PARAMETER SWEEP RESULTS")
+    print("="*60)
+    for rank, result in enumerate(results[:top], 1):
+        params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+        if "error" in result:
+            print(f"{rank:2d}. {'error':>6} | {params} ({result['error']})")
+        else:
+            print(f"{rank:2d}. {result['quality_score']:6.1f} | {params} "
+                  f"({result['num_speakers']} speakers)")
+    print("="*60)
+
+def tune_parameters(audio, hf_token, grid, config_path="local_config.yaml",
+                    min_speakers=None, max_speakers=None, workers=None, refresh=False):
+    # Entry point for "try another threshold": the expensive stages run at
+    # most once per file, every grid point after that is re-clustering only.
+    from utils.pipeline_registry import get_registry
+
+    audio = load_audio(audio)
+    pipeline = get_registry().get(hf_token, config_path=config_path)
+    kwargs = {k: v for k, v in (("min_speakers", min_speakers), ("max_speakers", max_speakers)) if v is not None}
+    intermediates = load_or_capture(pipeline, audio, config_path=config_path, refresh=refresh, **kwargs)
+    results = sweep_params(pipeline, intermediates, grid, audio=audio,
+                           min_speakers=min_speakers, max_speakers=max_speakers, workers=workers)
+    print_sweep(results)
+    return results
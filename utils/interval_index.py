@@ -0,0 +1,126 @@
+import numpy as np
+
+from utils.segment_table import SegmentTable
+
+class IntervalIndex:
+    """Sweep-line index over a diarization result.
+
+    All segment endpoints are merged into one sorted array of boundaries.
+    Between two consecutive boundaries the set of active speakers is
+    constant. One cumulative sum over the start/end events gives the active
+    speakers for every such elementary interval, in O(n log n). Prefix sums of
+    per-speaker active time then answer coverage, overlap and time-range
+    queries with a binary search and no rescan of the segments.
+    """
+
+    def __init__(self, segments):
+        segments = SegmentTable.from_annotation(segments)
+        keep = segments.end > segments.start
+        start, end, codes = segments.start[keep], segments.end[keep], segments.codes[keep]
+        self.labels = segments.labels
+        num_speakers = len(self.labels)
+
+        self.times, inverse = np.unique(np.concatenate((start, end)), return_inverse=True)
+        self.lengths = np.diff(self.times)
+
+        events = np.zeros((len(self.times), num_speakers), dtype=np.int32)
+        np.add.at(events, (inverse[:len(start)], codes), 1)
+        np.add.at(events, (inverse[len(start):], codes), -1)
+        # Active speakers on each elementary interval [times[i], times[i+1]).
+        self.active = np.cumsum(events, axis=0)[:-1] > 0
+        self.num_active = self.active.sum(axis=1)
+
+        speaker_rates = self.active.astype(np.float64)
+        self._speaker_rates = speaker_rates
+        self._speaker_cumulative = self._prefix(speaker_rates)
+        self._covered_rates = (self.num_active > 0).astype(np.float64)
+        self._covered_cumulative = self._prefix(self._covered_rates)
+
+    def _prefix(self, rates):
+        # Value of the integral at each boundary: len(times) rows.
+        weighted = rates * (self.lengths if rates.ndim == 1 else self.lengths[:, None])
+        zero = np.zeros((1,) + rates.shape[1:])
+        return np.concatenate((zero, np.cumsum(weighted, axis=0)))
+
+    def _integrate(self, rates, cumulative, t):
+        # Integral of a piecewise-constant rate from -inf to t (vectorized over t).
+        t = np.asarray(t, dtype=np.float64)
+        if len(self.times) == 0:
+            return np.zeros(t.shape + rates.shape[1:])
+        j = np.searchsorted(self.times, t, side="right") - 1
+        last = len(self.lengths)
+        inside = (j >= 0) & (j < last)
+        jj = np.clip(j, 0, max(last - 1, 0))
+        base = cumulative[np.clip(j, 0, last)]
+        if last == 0:
+            return base
+        offset = np.where(inside, t - self.times[jj], 0.0)
+        if rates.ndim > 1:
+            offset = offset[..., None]
+        return base + offset * rates[jj]
+
+    def coverage(self):
+        """Time during which at least one speaker is active (overlap counted once)."""
+        return float(self.lengths[self.num_active > 0].sum())
+
+    def clipped_lengths(self, duration=None):
+        # Elementary interval lengths inside [0, duration]; turns that start
+        # before 0 or run past the recording do not count outside it.
+        hi = np.inf if duration is None else duration
+        return np.clip(self.times[1:], 0.0, hi) - np.clip(self.times[:-1], 0.0, hi)
+
+    def overlap_duration(self, duration=None):
+        """Time within [0, duration] during which two or more speakers are active."""
+        return float(self.clipped_lengths(duration)[self.num_active > 1].sum())
+
+    def speaker_overlap(self, duration=None):
+        """Per speaker: time within [0, duration] spent talking over somebody else."""
+        overlapped = self.active & (self.num_active > 1)[:, None]
+        lengths = self.clipped_lengths(duration)
+        return dict(zip(self.labels, (overlapped * lengths[:, None]).sum(axis=0).tolist()))
+
+    def silence_gaps(self, duration=None):
+        """Maximal runs with nobody speaking within [0, duration], as an Nx2 array."""
+        if duration is None:
+            duration = self.times[-1] if len(self.times) else 0.0
+        if len(self.times) == 0:
+            return np.array([[0.0, duration]]) if duration > 0 else np.zeros((0, 2))
+
+        # Silence is everything between the merged speech runs.
+        covered = self.num_active > 0
+        edges = np.diff(np.concatenate(([0], covered.astype(np.int8), [0])))
+        run_starts = self.times[np.flatnonzero(edges == 1)]
+        run_ends = self.times[np.flatnonzero(edges == -1)]
+        gap_starts = np.concatenate(([0.0], run_ends))
+        gap_ends = np.concatenate((run_starts, [duration]))
+        gap_starts = np.clip(gap_starts, 0.0, duration)
+        gap_ends = np.clip(gap_ends, 0.0, duration)
+        gaps = np.stack((gap_starts, gap_ends), axis=1)
+        return gaps[gaps[:, 1] > gaps[:, 0]]
+
+    def covered_time(self, t1, t2):
+        """Union speech time inside [t1, t2]."""
+        return float(self._integrate(self._covered_rates, self._covered_cumulative, t2)
+                     - self._integrate(self._covered_rates, self._covered_cumulative, t1))
+
+    def speaker_time(self, t1, t2):
+        """Per-speaker talk time inside [t1, t2] (two binary searches)."""
+        totals = (self._integrate(self._speaker_rates, self._speaker_cumulative, t2)
+                  - self._integrate(self._speaker_rates, self._speaker_cumulative, t1))
+        return dict(zip(self.labels, np.atleast_1d(totals).tolist()))
+
+    def speakers_between(self, t1, t2):
+        """Speakers active at any point inside [t1, t2]."""
+        return [label for label, seconds in self.speaker_time(t1, t2).items() if seconds > 0]
+
+    def windowed_speaker_time(self, window=60.0, duration=None):
+        """Talk time per speaker per fixed window.
+
+        Returns (window_starts, matrix) where matrix[w, s] is the talk time of
+        speaker labels[s] in window w.
+        """
+        if duration is None:
+            duration = self.times[-1] if len(self.times) else 0.0
+        edges = np.append(np.arange(0.0, duration, window), duration)
+        cumulative = self._integrate(self._speaker_rates, self._speaker_cumulative, edges)
+        return edges[:-1], np.diff(cumulative, axis=0)
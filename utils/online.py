@@ -0,0 +1,380 @@
+import socket
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from utils.audio_buffer import SAMPLE_RATE
+from utils.stub_pipeline import FEATURE_BINS, FRAME
+from utils.vad import ABSOLUTE_FLOOR_DB, HOP_MS, MARGIN_DB, frame_energy_db
+
+LATENCY = 1.0
+STEP = 0.5
+WINDOW = 1.5
+MIN_WINDOW = 0.5
+ASSIGN_THRESHOLD = 0.3
+MERGE_THRESHOLD = 0.8
+RELABEL_EVERY = 10.0
+# Centroids become exponential averages after this many frames, so they can
+# follow slow drift in a speaker's voice.
+CENTROID_MEMORY = 200
+# Speakers with fewer frames than this are folded away once they go quiet.
+MIN_SPEAKER_FRAMES = 10
+NOISE_HISTORY_SECONDS = 30.0
+NOISE_PERCENTILE = 5
+NOISE_WARMUP_FRACTION = 0.2
+# Fraction of a frame's 10 ms hops that must clear the threshold.
+MIN_SPEECH_FRACTION = 0.1
+BLOCK_SECONDS = 0.1
+PCM_FORMATS = {"s16le": np.int16, "f32le": np.float32}
+
+class EnergySegmenter:
+    """Speech/non-speech decision per frame with an adaptive noise floor.
+
+    Uses the same pre-emphasised energy and margin as utils.vad.detect_speech.
+    The floor is a low percentile of the last NOISE_HISTORY_SECONDS of
+    energies rather than of the whole file.
+    """
+
+    def __init__(self, margin_db=MARGIN_DB, history_seconds=NOISE_HISTORY_SECONDS):
+        self.margin_db = margin_db
+        self.history = deque(maxlen=int(history_seconds * 1000 / HOP_MS))
+
+    def __call__(self, samples, sample_rate):
+        energy = frame_energy_db(samples, sample_rate)
+        if len(energy) == 0:
+            return False
+        self.history.extend(energy)
+        threshold = max(np.percentile(self.history, NOISE_PERCENTILE) + self.margin_db, ABSOLUTE_FLOOR_DB)
+        if len(self.history) < self.history.maxlen * NOISE_WARMUP_FRACTION:
+            # A stream that opens mid-speech has no silence to learn the floor
+            # from yet; fall back to the absolute floor until it has.
+            threshold = min(threshold, ABSOLUTE_FLOOR_DB + self.margin_db)
+        return bool(np.mean(energy > threshold) > MIN_SPEECH_FRACTION)
+
+class SpectralEmbedder:
+    """Offline embedder using the StubPipeline features with a running mean removed.
+
+    The batch stub subtracts the mean over the whole file. A stream cannot see
+    the whole file, so the running mean of the windows seen so far is
+    subtracted instead.
+    """
+
+    def __init__(self, decay=0.995):
+        self.decay = decay
+        self.mean = None
+        self.count = 0
+
+    def __call__(self, samples, sample_rate):
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) < FRAME:
+            samples = np.pad(samples, (0, FRAME - len(samples)))
+        starts = np.linspace(0, len(samples) - FRAME, 4).astype(int)
+        frames = samples[starts[:, None] + np.arange(FRAME)] * np.hanning(FRAME)
+        spectrum = np.abs(np.fft.rfft(frames, axis=-1))[:, :FEATURE_BINS]
+        raw = np.log(spectrum + 1e-6).mean(axis=0)
+
+        # Plain running mean at first, exponential once `count` passes 1 / (1 - decay).
+        self.count += 1
+        rate = max(1.0 / self.count, 1 - self.decay)
+        self.mean = raw if self.mean is None else self.mean + rate * (raw - self.mean)
+        centred = raw - self.mean
+        norm = np.linalg.norm(centred)
+        return centred / norm if norm > 0 else centred
+
+class PyannoteEmbedder:
+    """Speaker embedding model from pyannote.audio, applied to each window."""
+
+    def __init__(self, hf_token, model="pyannote/wespeaker-voxceleb-resnet34-LM", device=None):
+        from pyannote.audio import Inference, Model
+
+        from utils.pipeline_registry import select_device
+
+        embedding_model = Model.from_pretrained(model, use_auth_token=hf_token)
+        self.inference = Inference(embedding_model, window="whole")
+        self.inference.to(device or select_device(verbose=False))
+
+    def __call__(self, samples, sample_rate):
+        import torch
+
+        waveform = torch.from_numpy(np.ascontiguousarray(samples, dtype=np.float32)).unsqueeze(0)
+        embedding = np.asarray(self.inference({"waveform": waveform, "sample_rate": sample_rate})).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+class OnlineDiarizer:
+    """Streaming diarization with bounded label latency.
+
+    Audio is pushed with feed(). Every `step` seconds of audio form a frame.
+    Each frame gets a speech decision from the segmenter and, if it is speech,
+    an embedding of a `window` centred on it. The frame is assigned to the
+    nearest running centroid, or starts a new speaker below
+    `assign_threshold`. A frame is emitted with its raw assignment unless that
+    is a switch away from the previous frame's speaker which the frames in
+    the next `latency` seconds do not confirm (fewer of them go to the new
+    speaker than to the previous one); then it keeps the previous speaker. The label arrives about `latency` seconds
+    (plus compute time) after the frame was heard. Latency first buys a
+    longer embedding window (up to `window`), which is where most of the
+    accuracy comes from. Lookahead beyond that only suppresses one-frame
+    speaker flickers; on the synthetic benchmark, accuracy levels off around
+    0.5-1 s rather than improving further. Every `relabel_every`
+    seconds, centroids that have converged above `merge_threshold` are
+    merged, and a relabel event tells consumers to rewrite earlier labels.
+
+    feed() and flush() return event dicts:
+      {"type": "segment", "start", "end", "speaker", "latency"}
+      {"type": "relabel", "from", "to", "time"}
+    """
+
+    def __init__(self, segmenter=None, embedder=None, latency=LATENCY, step=STEP, window=WINDOW,
+                 assign_threshold=ASSIGN_THRESHOLD, merge_threshold=MERGE_THRESHOLD,
+                 max_speakers=None, relabel_every=RELABEL_EVERY, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.step = step
+        self.latency = latency
+        # The embedding window's own lookahead counts against the latency
+        # budget; whatever remains becomes frames of smoothing lookahead.
+        self.window = min(window, max(MIN_WINDOW, step + 2 * latency))
+        self.smoothing = max(0, int(round((latency - (self.window - step) / 2) / step)))
+        self.segmenter = segmenter or EnergySegmenter()
+        self.embedder = embedder or SpectralEmbedder()
+        self.assign_threshold = assign_threshold
+        self.merge_threshold = merge_threshold
+        self.max_speakers = max_speakers
+        self.relabel_every = relabel_every
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # absolute sample index of _buffer[0]
+        self._received = 0
+        self._next_frame = 0
+        self._last_relabel = 0.0
+        # (start, end, raw speaker id or None) for frames not yet emitted.
+        self._frames = deque()
+        self._previous = None  # speaker id of the last emitted speech frame
+        self.centroids = []
+        self.counts = []
+        self.last_seen = []
+        self.alias = []  # speaker id -> id it was merged into (itself if live)
+        self.segments = []  # [start, end, speaker id], same-speaker frames merged
+
+    @property
+    def received_seconds(self):
+        return self._received / self.sample_rate
+
+    def feed(self, samples):
+        started = time.perf_counter()
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        self._buffer = np.concatenate((self._buffer, samples))
+        self._received += len(samples)
+
+        events = []
+        sr = self.sample_rate
+        step = int(self.step * sr)
+        reach = int((self.window + self.step) / 2 * sr)  # frame start -> end of its window
+        while self._next_frame + reach <= self._received:
+            self._observe(self._next_frame)
+            self._next_frame += step
+            while len(self._frames) > self.smoothing:
+                events.extend(self._emit(started))
+
+        self._trim()
+        return events
+
+    def flush(self):
+        # End of stream: observe the remaining frames with whatever context
+        # exists, then emit everything still pending.
+        started = time.perf_counter()
+        events = []
+        step = int(self.step * self.sample_rate)
+        while self._next_frame < self._received:
+            self._observe(self._next_frame)
+            self._next_frame += step
+        while self._frames:
+            events.extend(self._emit(started))
+        events.extend(self._relabel(self.received_seconds))
+        return events
+
+    def _trim(self):
+        keep_from = self._next_frame - int((self.window - self.step) / 2 * self.sample_rate)
+        drop = max(0, keep_from - self._buffer_start)
+        if drop:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+
+    def _slice(self, start, end):
+        start = max(start, self._buffer_start)
+        end = min(end, self._received)
+        return self._buffer[start - self._buffer_start:end - self._buffer_start]
+
+    def _observe(self, frame_start):
+        sr = self.sample_rate
+        frame_end = min(frame_start + int(self.step * sr), self._received)
+        frame = self._slice(frame_start, frame_end)
+        speaker = None
+        if len(frame) and self.segmenter(frame, sr):
+            center = (frame_start + frame_end) // 2
+            half = int(self.window * sr / 2)
+            speaker = self._assign(self.embedder(self._slice(center - half, center + half), sr))
+            self.last_seen[speaker] = frame_end / sr
+        self._frames.append((frame_start / sr, frame_end / sr, speaker))
+
+    def _emit(self, started):
+        start, end, raw = self._frames.popleft()
+        if raw is None:
+            return []
+
+        speaker = self.alias[raw]
+        previous = self.alias[self._previous] if self._previous is not None else None
+        if previous is not None and speaker != previous:
+            # A symmetric majority vote erodes real turn boundaries and eats
+            # short turns; only check that the lookahead confirms the switch.
+            ahead = [self.alias[s] for _, _, s in self._frames if s is not None]
+            if ahead.count(speaker) < ahead.count(previous):
+                speaker = previous
+        self._previous = speaker
+        if self.segments and self.segments[-1][2] == speaker and abs(self.segments[-1][1] - start) < 1e-9:
+            self.segments[-1][1] = end
+        else:
+            self.segments.append([start, end, speaker])
+
+        lag = self.received_seconds - end + (time.perf_counter() - started)
+        events = [{"type": "segment", "start": start, "end": end,
+                   "speaker": self.label(speaker), "latency": lag}]
+        if end - self._last_relabel >= self.relabel_every:
+            events.extend(self._relabel(end))
+        return events
+
+    def _assign(self, embedding):
+        live = [i for i, target in enumerate(self.alias) if target == i]
+        if live:
+            similarity = np.array([self.centroids[i] @ embedding for i in live])
+            best = int(np.argmax(similarity))
+            at_limit = self.max_speakers is not None and len(live) >= self.max_speakers
+            if similarity[best] >= self.assign_threshold or at_limit:
+                speaker = live[best]
+                self._update(speaker, embedding)
+                return speaker
+
+        self.centroids.append(np.asarray(embedding, dtype=np.float64))
+        self.counts.append(1)
+        self.last_seen.append(0.0)
+        self.alias.append(len(self.alias))
+        return len(self.alias) - 1
+
+    def _update(self, speaker, embedding):
+        self.counts[speaker] += 1
+        rate = 1.0 / min(self.counts[speaker], CENTROID_MEMORY)
+        centroid = self.centroids[speaker] + rate * (embedding - self.centroids[speaker])
+        self.centroids[speaker] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+    def _relabel(self, now):
+        # Two corrections: speakers whose centroids have converged are merged
+        # (the later into the earlier), and speakers that stayed tiny and have
+        # gone quiet, usually spawned by a transition or a cold start, fold
+        # into their nearest neighbour.
+        self._last_relabel = now
+        events = []
+        while True:
+            live = [i for i, target in enumerate(self.alias) if target == i]
+            pair = next(((a, b) for a in live for b in live
+                         if a < b and self.centroids[a] @ self.centroids[b] >= self.merge_threshold), None)
+            if pair is None:
+                stale = [b for b in live if self.counts[b] < MIN_SPEAKER_FRAMES
+                         and now - self.last_seen[b] >= self.relabel_every]
+                if not stale or len(live) < 2:
+                    return events
+                b = stale[0]
+                a = max((a for a in live if a != b), key=lambda a: self.centroids[a] @ self.centroids[b])
+                pair = (a, b)
+            events.append(self._merge(*pair, now))
+
+    def _merge(self, a, b, now):
+        total = self.counts[a] + self.counts[b]
+        centroid = (self.centroids[a] * self.counts[a] + self.centroids[b] * self.counts[b]) / total
+        self.centroids[a] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self.counts[a] = total
+        self.last_seen[a] = max(self.last_seen[a], self.last_seen[b])
+        self.alias = [a if target == b else target for target in self.alias]
+        return {"type": "relabel", "from": self.label(b, resolve=False), "to": self.label(a), "time": now}
+
+    def label(self, speaker, resolve=True):
+        return f"SPEAKER_{self.alias[speaker] if resolve else speaker:02d}"
+
+    def annotation(self, uri="live"):
+        """Everything emitted so far, with relabels applied."""
+        from pyannote.core import Annotation, Segment
+
+        annotation = Annotation(uri=uri)
+        for i, (start, end, speaker) in enumerate(self.segments):
+            annotation[Segment(start, end), i] = self.label(speaker)
+        return annotation.support()
+
+def open_pcm_stream(source):
+    # "-" is stdin, "unix:/path" a local socket, "tcp:host:port" a TCP socket;
+    # anything else is a path (a FIFO works too).
+    if source == "-":
+        return sys.stdin.buffer
+    if source.startswith("unix:"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(source[len("unix:"):])
+        return sock.makefile("rb")
+    if source.startswith("tcp:"):
+        host, port = source[len("tcp:"):].rsplit(":", 1)
+        return socket.create_connection((host, int(port))).makefile("rb")
+    return open(source, "rb")
+
+def iter_pcm_blocks(stream, block_seconds=BLOCK_SECONDS, sample_rate=SAMPLE_RATE, pcm_format="s16le"):
+    # Yields float32 mono blocks as soon as a full block (or the stream's
+    # final partial block) has arrived.
+    dtype = np.dtype(PCM_FORMATS[pcm_format])
+    block_bytes = int(block_seconds * sample_rate) * dtype.itemsize
+    pending = b""
+    while True:
+        data = stream.read1(block_bytes - len(pending)) if hasattr(stream, "read1") \
+            else stream.read(block_bytes - len(pending))
+        if not data:
+            break
+        pending += data
+        if len(pending) >= block_bytes:
+            yield _to_float(pending, dtype)
+            pending = b""
+    usable = len(pending) - len(pending) % dtype.itemsize
+    if usable:
+        yield _to_float(pending[:usable], dtype)
+
+def _to_float(data, dtype):
+    samples = np.frombuffer(data, dtype=dtype)
+    if dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32)
+
+def diarize_stream(blocks, diarizer=None, on_event=None):
+    """Runs an OnlineDiarizer over an iterable of float32 blocks.
+
+    Returns (annotation, events). `on_event` is called for every event as it
+    is emitted.
+    """
+    diarizer = diarizer or OnlineDiarizer()
+    events = []
+    for block in blocks:
+        for event in diarizer.feed(block):
+            events.append(event)
+            if on_event:
+                on_event(event)
+    for event in diarizer.flush():
+        events.append(event)
+        if on_event:
+            on_event(event)
+    return diarizer.annotation(), events
+
+def latency_summary(events):
+    latencies = np.array([e["latency"] for e in events if e["type"] == "segment"])
+    if len(latencies) == 0:
+        return {"labels": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "labels": len(latencies),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "max": float(latencies.max()),
+    }
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+import yaml
+
+DEFAULT_CONFIG_PATH = "local_config.yaml"
+DEFAULT_PRETRAINED = "pyannote/speaker-diarization"
+DEFAULT_MEMORY_BUDGET_MB = 4096
+
+def resolve_config(config_path=DEFAULT_CONFIG_PATH):
+    # Returns the source Pipeline.from_pretrained should load plus the parsed
+    # params, so that two different configs never share a cache slot.
+    if config_path and os.path.exists(config_path):
+        with open(config_path) as f:
+            params = yaml.safe_load(f) or {}
+        return os.path.abspath(config_path), params
+    return DEFAULT_PRETRAINED, {}
+
+def make_key(source, params, device, backend="torch"):
+    return (source, json.dumps(params, sort_keys=True, default=str), str(device), backend)
+
+def estimate_pipeline_bytes(pipeline):
+    import torch
+
+    seen = set()
+    total = 0
+    candidates = list(vars(pipeline).values())
+    for obj in candidates:
+        for attr in ("model", "model_", "classifier_"):
+            inner = getattr(obj, attr, None)
+            if inner is not None:
+                candidates.append(inner)
+        if isinstance(obj, torch.nn.Module) and id(obj) not in seen:
+            seen.add(id(obj))
+            for tensor in list(obj.parameters()) + list(obj.buffers()):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+class PipelineRegistry:
+    """Process-wide cache of instantiated pyannote pipelines.
+
+    Pipelines are keyed by (config source, parsed params, device, inference
+    backend) and evicted
+    least-recently-used first once the estimated footprint exceeds the budget.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self._pipelines = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_times = {}
+
+    def get(self, hf_token, config_path=DEFAULT_CONFIG_PATH, device=None, backend="torch"):
+        source, params = resolve_config(config_path)
+        device = device if device is not None else select_device(verbose=False)
+        if backend != "torch" and str(device) != "cpu":
+            raise ValueError(f"The {backend} backend runs on CPU only, not {device}")
+        key = make_key(source, params, device, backend)
+
+        with self._lock:
+            if key in self._pipelines:
+                self.hits += 1
+                self._pipelines.move_to_end(key)
+                return self._pipelines[key]
+            self.misses += 1
+            pipeline = self._load(source, hf_token, device)
+            if backend != "torch":
+                from utils.inference_backend import apply_backend
+                apply_backend(pipeline, backend, config_path=config_path)
+                print(f"Switched pipeline models to the {backend} backend")
+            self._insert(key, pipeline)
+            return pipeline
+
+    def put(self, pipeline, config_path=DEFAULT_CONFIG_PATH, device=None, backend="torch"):
+        # Lets callers register a pipeline they built (or tuned) themselves.
+        source, params = resolve_config(config_path)
+        device = device if device is not None else select_device(verbose=False)
+        key = make_key(source, params, device, backend)
+        with self._lock:
+            self._insert(key, pipeline)
+        return key
+
+    def warm_up(self, hf_token, config_path=DEFAULT_CONFIG_PATH, device=None, backend="torch"):
+        start = time.perf_counter()
+        self.get(hf_token, config_path=config_path, device=device, backend=backend)
+        return time.perf_counter() - start
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+            self._sizes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": len(self._pipelines),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_bytes": sum(self._sizes.values()),
+                "memory_budget_bytes": self.memory_budget,
+                "load_times": dict(self.load_times),
+            }
+
+    def _load(self, source, hf_token, device):
+        from pyannote.audio import Pipeline
+
+        if source == DEFAULT_PRETRAINED:
+            print("Using default pipeline (local config not found)")
+        else:
+            print(f"Loading optimized pipeline from: {source}")
+
+        start = time.perf_counter()
+        pipeline = Pipeline.from_pretrained(source, use_auth_token=hf_token)
+        pipeline.to(device)
+        elapsed = time.perf_counter() - start
+
+        self.load_times[f"{source}@{device}"] = elapsed
+        print(f"Pipeline loaded on {device} in {elapsed:.2f}s")
+        return pipeline
+
+    def _insert(self, key, pipeline):
+        try:
+            size = estimate_pipeline_bytes(pipeline)
+        except Exception:
+            size = 0
+        self._pipelines[key] = pipeline
+        self._pipelines.move_to_end(key)
+        self._sizes[key] = size
+
+        while len(self._pipelines) > 1 and sum(self._sizes.values()) > self.memory_budget:
+            old_key, _ = self._pipelines.popitem(last=False)
+            self._sizes.pop(old_key, None)
+            self.evictions += 1
+            print(f"Evicted cached pipeline {old_key[0]} ({old_key[2]})")
+
+def select_device(verbose=True):
+    import torch
+
+    if torch.backends.mps.is_available():
+        device = torch.device("mps")
+        message = "Using MPS (Metal Performance Shaders) for GPU acceleration"
+    elif torch.cuda.is_available():
+        device = torch.device("cuda")
+        message = "Using CUDA for GPU acceleration"
+    else:
+        device = torch.device("cpu")
+        message = "Using CPU (no GPU acceleration available)"
+    if verbose:
+        print(message)
+    return device
+
+def backend_device(backend="torch", verbose=False):
+    # Quantized and ONNX backends run on CPU whatever accelerator is present.
+    if backend == "torch":
+        return select_device(verbose=verbose)
+    import torch
+
+    if verbose:
+        print(f"Using CPU ({backend} backend)")
+    return torch.device("cpu")
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            budget = int(os.environ.get("DIARIZATION_PIPELINE_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB))
+            _registry = PipelineRegistry(memory_budget_mb=budget)
+        return _registry
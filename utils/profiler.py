@@ -0,0 +1,151 @@
+import csv
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+def peak_rss_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+class StageProfiler:
+    """Records wall time, CPU time, peak-RSS growth and real-time factor per stage.
+
+    Each stage costs a few clock and getrusage calls, so it can stay enabled
+    in production. An optional cProfile or pyinstrument dump can be added for
+    deeper digging.
+    """
+
+    def __init__(self, audio_duration=None, profiler=None, profile_dir="outputs"):
+        self.audio_duration = audio_duration
+        self.records = []
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+
+    def set_audio_duration(self, duration):
+        # Stages that ran before the duration was known (e.g. extraction) get
+        # their real-time factor filled in now.
+        self.audio_duration = duration
+        with self._lock:
+            for record in self.records:
+                if record["audio_seconds"] is None and duration:
+                    record["audio_seconds"] = duration
+                    record["rtf"] = record["wall_seconds"] / duration
+
+    @contextmanager
+    def stage(self, name, audio_duration=None):
+        deep = self._start_deep_profile()
+        rss_before = peak_rss_bytes()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_delta = peak_rss_bytes() - rss_before
+            duration = audio_duration or self.audio_duration
+            record = {
+                "stage": name,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "peak_rss_delta_mb": rss_delta / (1024 * 1024),
+                "audio_seconds": duration,
+                "rtf": wall / duration if duration else None,
+            }
+            record["profile"] = self._stop_deep_profile(deep, name)
+            with self._lock:
+                self.records.append(record)
+
+    def _start_deep_profile(self):
+        if self.profiler == "cprofile":
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+            return profile
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+            profile = Profiler()
+            profile.start()
+            return profile
+        return None
+
+    def _stop_deep_profile(self, profile, name):
+        if profile is None:
+            return None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = name.replace(" ", "_")
+        if self.profiler == "cprofile":
+            profile.disable()
+            path = os.path.join(self.profile_dir, f"profile_{slug}.prof")
+            profile.dump_stats(path)
+        else:
+            profile.stop()
+            path = os.path.join(self.profile_dir, f"profile_{slug}.html")
+            with open(path, "w") as f:
+                f.write(profile.output_html())
+        return path
+
+    def totals(self):
+        wall = sum(r["wall_seconds"] for r in self.records)
+        cpu = sum(r["cpu_seconds"] for r in self.records)
+        return {
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "rtf": wall / self.audio_duration if self.audio_duration else None,
+        }
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"audio_seconds": self.audio_duration, "stages": self.records,
+                       "totals": self.totals()}, f, indent=2)
+        return path
+
+    def write_csv(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fields = ["stage", "wall_seconds", "cpu_seconds", "peak_rss_delta_mb", "audio_seconds", "rtf", "profile"]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.records)
+        return path
+
+    def print_report(self):
+        print("\n" + "="*60)
+        print("STAGE TIMINGS")
+        print("="*60)
+        print(f"{'Stage':<32}{'Wall(s)':>9}{'CPU(s)':>9}{'RSS+MB':>8}{'RTF':>8}")
+        for r in self.records:
+            rtf = f"{r['rtf']:.3f}" if r["rtf"] is not None else "-"
+            print(f"{r['stage']:<32}{r['wall_seconds']:>9.2f}{r['cpu_seconds']:>9.2f}"
+                  f"{r['peak_rss_delta_mb']:>8.0f}{rtf:>8}")
+        totals = self.totals()
+        rtf = f"{totals['rtf']:.3f}" if totals["rtf"] is not None else "-"
+        print(f"{'Total':<32}{totals['wall_seconds']:>9.2f}{totals['cpu_seconds']:>9.2f}{'':>8}{rtf:>8}")
+        print("="*60)
+
+_active = None
+
+def set_profiler(profiler):
+    global _active
+    _active = profiler
+    return profiler
+
+def get_profiler():
+    return _active
+
+@contextmanager
+def profile_stage(name, audio_duration=None):
+    # No-op unless a StageProfiler has been activated with set_profiler().
+    if _active is None:
+        yield
+        return
+    with _active.stage(name, audio_duration=audio_duration):
+        yield
@@ -1,55 +1,65 @@
+import heapq
+import math
+
 import numpy as np
-import librosa
 from typing import Dict, List, Tuple
 
-def assess_diarization_quality(diarization, audio_path: str) -> Dict:
-    print("Assessing diarization quality...")
+from utils.audio_buffer import audio_duration
+from utils.interval_index import IntervalIndex
+from utils.segment_table import SegmentTable
+
+def assess_diarization_quality(diarization, audio, verbose: bool = True) -> Dict:
+    if verbose:
+        print("Assessing diarization quality...")
     
-    y, sr = librosa.load(audio_path, sr=None)
-    duration = len(y) / sr
+    duration = audio_duration(audio)
     
-    segments = []
-    speakers = set()
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        segments.append((turn.start, turn.end, speaker))
-        speakers.add(speaker)
+    # Accepts an Annotation or a prebuilt SegmentTable.
+    segments = SegmentTable.from_annotation(diarization)
+    index = IntervalIndex(segments)
     
     metrics = {}
     
-    coverage = calculate_coverage(segments, duration)
+    coverage = calculate_coverage(index, duration)
     metrics['coverage'] = coverage
     
     segment_stats = analyze_segment_lengths(segments)
     metrics['segment_stats'] = segment_stats
     
-    speaker_distribution = analyze_speaker_distribution(segments, speakers)
+    speaker_distribution = analyze_speaker_distribution(segments)
     metrics['speaker_distribution'] = speaker_distribution
     
-    silence_analysis = analyze_silence(segments, duration)
+    silence_analysis = analyze_silence(index, duration)
     metrics['silence_analysis'] = silence_analysis
     
     quality_score = calculate_quality_score(metrics)
     metrics['quality_score'] = quality_score
     
-    print_quality_report(metrics, len(speakers))
+    if verbose:
+        print_quality_report(metrics, segments.num_speakers)
     
     return metrics
 
-def calculate_coverage(segments: List[Tuple], duration: float) -> Dict:
-    total_covered = sum(end - start for start, end, _ in segments)
+def calculate_coverage(index: IntervalIndex, duration: float) -> Dict:
+    # Union of speech: overlapped speech counts once, so coverage stays <= 100%.
+    total_covered = index.covered_time(0.0, duration)
     coverage_percentage = (total_covered / duration) * 100
+    overlap = index.overlap_duration(duration)
     
     return {
         'total_covered': total_covered,
         'total_duration': duration,
         'coverage_percentage': coverage_percentage,
-        'uncovered_duration': duration - total_covered
+        'uncovered_duration': duration - total_covered,
+        'overlap_duration': overlap,
+        'overlap_percentage': (overlap / duration) * 100,
+        'speaker_overlap': index.speaker_overlap(duration)
     }
 
-def analyze_segment_lengths(segments: List[Tuple]) -> Dict:
-    lengths = [end - start for start, end, _ in segments]
+def analyze_segment_lengths(segments: SegmentTable) -> Dict:
+    lengths = segments.durations
     
-    if not lengths:
+    if not len(lengths):
         return {
             'count': 0,
             'mean_length': 0.0,
@@ -68,21 +78,17 @@ def analyze_segment_lengths(segments: List[Tuple]) -> Dict:
         'min_length': np.min(lengths),
         'max_length': np.max(lengths),
         'std_length': np.std(lengths),
-        'short_segments': len([l for l in lengths if l < 1.0]),
-        'long_segments': len([l for l in lengths if l > 30.0])
+        'short_segments': int(np.count_nonzero(lengths < 1.0)),
+        'long_segments': int(np.count_nonzero(lengths > 30.0))
     }
 
-def analyze_speaker_distribution(segments: List[Tuple], speakers: set) -> Dict:
-    speaker_times = {}
-    for speaker in speakers:
-        speaker_segments = [seg for seg in segments if seg[2] == speaker]
-        total_time = sum(end - start for start, end, _ in speaker_segments)
-        speaker_times[speaker] = total_time
+def analyze_speaker_distribution(segments: SegmentTable) -> Dict:
+    speaker_times = segments.speaker_times()
     
     total_time = sum(speaker_times.values())
     
     if total_time == 0:
-        speaker_percentages = {speaker: 0.0 for speaker in speakers}
+        speaker_percentages = {speaker: 0.0 for speaker in speaker_times}
     else:
         speaker_percentages = {speaker: (time/total_time)*100 for speaker, time in speaker_times.items()}
     
@@ -93,29 +99,18 @@ def analyze_speaker_distribution(segments: List[Tuple], speakers: set) -> Dict:
         'balance_score': calculate_balance_score(speaker_percentages)
     }
 
-def analyze_silence(segments: List[Tuple], duration: float) -> Dict:
-    sorted_segments = sorted(segments, key=lambda x: x[0])
-    
-    silence_periods = []
-    current_time = 0
-    
-    for start, end, _ in sorted_segments:
-        if start > current_time:
-            silence_periods.append((current_time, start))
-        current_time = max(current_time, end)
-    
-    if current_time < duration:
-        silence_periods.append((current_time, duration))
-    
-    silence_durations = [end - start for start, end in silence_periods]
+def analyze_silence(index: IntervalIndex, duration: float) -> Dict:
+    gaps = index.silence_gaps(duration)
+    silence_durations = gaps[:, 1] - gaps[:, 0]
+    total_silence = float(silence_durations.sum())
     
     return {
-        'silence_periods': silence_periods,
-        'total_silence': sum(silence_durations),
-        'silence_percentage': (sum(silence_durations) / duration) * 100,
-        'num_silence_periods': len(silence_periods),
-        'avg_silence_duration': np.mean(silence_durations) if silence_durations else 0,
-        'long_silences': len([s for s in silence_durations if s > 5.0])
+        'silence_periods': [tuple(gap) for gap in gaps.tolist()],
+        'total_silence': total_silence,
+        'silence_percentage': (total_silence / duration) * 100,
+        'num_silence_periods': len(gaps),
+        'avg_silence_duration': float(silence_durations.mean()) if len(gaps) else 0,
+        'long_silences': int(np.count_nonzero(silence_durations > 5.0))
     }
 
 def calculate_balance_score(speaker_percentages: Dict) -> float:
@@ -189,6 +184,7 @@ def print_quality_report(metrics: Dict, num_speakers: int):
     print(f"\n📈 Coverage Analysis:")
     print(f"   • Audio covered: {coverage['coverage_percentage']:.1f}%")
     print(f"   • Uncovered time: {coverage['uncovered_duration']:.1f}s")
+    print(f"   • Overlapped speech: {coverage['overlap_percentage']:.1f}%")
     
     segment_stats = metrics['segment_stats']
     print(f"\n⏱️  Segment Analysis:")
@@ -240,4 +236,195 @@ def suggest_improvements(metrics: Dict) -> List[str]:
     if silence['silence_percentage'] > 50:
         suggestions.append("Improve audio preprocessing to reduce background noise")
     
-    return suggestions 
\ No newline at end of file
+    return suggestions
+
+class QualityAccumulator:
+    """Incremental version of assess_diarization_quality.
+
+    Segments are fed with add() in start-time order, as itertracks and
+    streaming pipelines emit them. Each add costs O(log k), where k is the
+    number of segments still active at that point, which is small in
+    practice. Lengths use running moments and a two-heap exact median,
+    speakers use running totals, and coverage, overlap and silence use a
+    sweep line that finalizes everything before the latest start. metrics()
+    can be called at any time. Once every segment has been added it returns
+    the batch metrics, up to floating-point summation order.
+    """
+
+    def __init__(self, duration: float = None):
+        self.duration = duration
+        self.count = 0
+        self.short_segments = 0
+        self.long_segments = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+        self._lower = []  # max-heap (negated) holding the smaller half of lengths
+        self._upper = []  # min-heap holding the larger half
+        self.speaker_times = {}
+
+        self._last_start = -math.inf
+        self._cursor = 0.0
+        self._ends = []  # (end, speaker) of segments still active at the cursor
+        self._active = {}  # speaker -> number of active segments
+        self._sweep = {'covered': 0.0, 'overlap': 0.0, 'silence': 0.0, 'long_silences': 0, 'speaker_overlap': {}}
+        self._max_end = 0.0
+        self.silence_periods = []
+
+    def add(self, start: float, end: float, speaker):
+        if start < self._last_start:
+            raise ValueError(f"Segments must arrive in start order ({start:.3f}s after {self._last_start:.3f}s)")
+        self._last_start = start
+        length = end - start
+
+        self.count += 1
+        delta = length - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (length - self._mean)
+        self._min = min(self._min, length)
+        self._max = max(self._max, length)
+        self.short_segments += length < 1.0
+        self.long_segments += length > 30.0
+        if self._lower and length > -self._lower[0]:
+            heapq.heappush(self._upper, length)
+        else:
+            heapq.heappush(self._lower, -length)
+        if len(self._lower) > len(self._upper) + 1:
+            heapq.heappush(self._upper, -heapq.heappop(self._lower))
+        elif len(self._upper) > len(self._lower):
+            heapq.heappush(self._lower, -heapq.heappop(self._upper))
+
+        self._max_end = max(self._max_end, end)
+        self.speaker_times[speaker] = self.speaker_times.get(speaker, 0.0) + length
+        self._sweep['speaker_overlap'].setdefault(speaker, 0.0)
+
+        if length > 0:
+            self._advance(start)
+            heapq.heappush(self._ends, (end, speaker))
+            self._active[speaker] = self._active.get(speaker, 0) + 1
+
+    def add_annotation(self, diarization):
+        for start, end, speaker in SegmentTable.from_annotation(diarization).sorted():
+            self.add(start, end, speaker)
+
+    def _advance(self, t):
+        # Everything before t is final: no later segment can start earlier.
+        while self._ends and self._ends[0][0] <= t:
+            end = self._ends[0][0]
+            self._account(self._cursor, end, self._active, self._sweep, self.silence_periods)
+            self._cursor = end
+            while self._ends and self._ends[0][0] == end:
+                _, speaker = heapq.heappop(self._ends)
+                self._active[speaker] -= 1
+                if not self._active[speaker]:
+                    del self._active[speaker]
+        self._account(self._cursor, t, self._active, self._sweep, self.silence_periods)
+        self._cursor = max(self._cursor, t)
+
+    def _account(self, a, b, active, sweep, gaps):
+        if b <= a:
+            return
+        # Coverage, overlap and silence are measured inside [0, duration], as in
+        # the batch version.
+        lo = max(a, 0.0)
+        hi = b if self.duration is None else min(b, self.duration)
+        if hi <= lo:
+            return
+        if not active:
+            gaps.append((lo, hi))
+            sweep['silence'] += hi - lo
+            sweep['long_silences'] += hi - lo > 5.0
+            return
+        sweep['covered'] += hi - lo
+        length = hi - lo
+        if len(active) > 1:
+            sweep['overlap'] += length
+            for speaker in active:
+                sweep['speaker_overlap'][speaker] += length
+
+    def _drain(self, duration):
+        # Finish the sweep on copies, so that metrics() leaves the state untouched.
+        sweep = dict(self._sweep, speaker_overlap=dict(self._sweep['speaker_overlap']))
+        active = dict(self._active)
+        gaps = []
+        cursor = self._cursor
+        pending = sorted(self._ends)
+        i = 0
+        while i < len(pending):
+            end = pending[i][0]
+            self._account(cursor, end, active, sweep, gaps)
+            cursor = end
+            while i < len(pending) and pending[i][0] == end:
+                speaker = pending[i][1]
+                active[speaker] -= 1
+                if not active[speaker]:
+                    del active[speaker]
+                i += 1
+        if duration > cursor:
+            gaps.append((max(cursor, 0.0), duration))
+            sweep['silence'] += duration - max(cursor, 0.0)
+            sweep['long_silences'] += duration - max(cursor, 0.0) > 5.0
+        return sweep, gaps
+
+    def _median(self):
+        if len(self._lower) > len(self._upper):
+            return -self._lower[0]
+        return (-self._lower[0] + self._upper[0]) / 2
+
+    def metrics(self, duration: float = None) -> Dict:
+        duration = duration or self.duration or self._max_end
+        sweep, tail_gaps = self._drain(duration)
+        metrics = {}
+
+        covered = sweep['covered']
+        metrics['coverage'] = {
+            'total_covered': covered,
+            'total_duration': duration,
+            'coverage_percentage': (covered / duration) * 100 if duration else 0.0,
+            'uncovered_duration': duration - covered,
+            'overlap_duration': sweep['overlap'],
+            'overlap_percentage': (sweep['overlap'] / duration) * 100 if duration else 0.0,
+            'speaker_overlap': dict(sorted(sweep['speaker_overlap'].items()))
+        }
+
+        if self.count:
+            metrics['segment_stats'] = {
+                'count': self.count,
+                'mean_length': self._mean,
+                'median_length': self._median(),
+                'min_length': self._min,
+                'max_length': self._max,
+                'std_length': math.sqrt(self._m2 / self.count),
+                'short_segments': self.short_segments,
+                'long_segments': self.long_segments
+            }
+        else:
+            metrics['segment_stats'] = analyze_segment_lengths(SegmentTable.empty())
+
+        speaker_times = dict(sorted(self.speaker_times.items()))
+        total_time = sum(speaker_times.values())
+        if total_time == 0:
+            speaker_percentages = {speaker: 0.0 for speaker in speaker_times}
+        else:
+            speaker_percentages = {speaker: (time/total_time)*100 for speaker, time in speaker_times.items()}
+        metrics['speaker_distribution'] = {
+            'speaker_times': speaker_times,
+            'speaker_percentages': speaker_percentages,
+            'total_time': total_time,
+            'balance_score': calculate_balance_score(speaker_percentages)
+        }
+
+        num_gaps = len(self.silence_periods) + len(tail_gaps)
+        total_silence = sweep['silence']
+        metrics['silence_analysis'] = {
+            'silence_periods': self.silence_periods + tail_gaps,
+            'total_silence': total_silence,
+            'silence_percentage': (total_silence / duration) * 100 if duration else 0.0,
+            'num_silence_periods': num_gaps,
+            'avg_silence_duration': total_silence / num_gaps if num_gaps else 0,
+            'long_silences': sweep['long_silences']
+        }
+
+        metrics['quality_score'] = calculate_quality_score(metrics)
+        return metrics
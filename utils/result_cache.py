@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from utils.pipeline_registry import resolve_config
+
+DEFAULT_CACHE_DIR = os.path.join("outputs", "cache", "diarization")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+HASH_BLOCK = 1 << 22
+
+def hash_audio(audio):
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(str(audio.sample_rate).encode())
+    samples = np.asarray(audio.samples)
+    # Hash in blocks so memory-mapped buffers are never copied whole.
+    for start in range(0, len(samples), HASH_BLOCK):
+        digest.update(np.ascontiguousarray(samples[start:start + HASH_BLOCK]).tobytes())
+    return digest.hexdigest()
+
+def model_revisions(params):
+    try:
+        from importlib.metadata import version
+        pyannote_version = version("pyannote.audio")
+    except Exception:
+        pyannote_version = "unknown"
+    pipeline_params = params.get("pipeline", {}).get("params", {}) if params else {}
+    return {
+        "pyannote.audio": pyannote_version,
+        "segmentation": str(pipeline_params.get("segmentation")),
+        "embedding": str(pipeline_params.get("embedding")),
+    }
+
+def cache_key(audio, config_path="local_config.yaml", min_speakers=None, max_speakers=None, params=None):
+    source, config_params = resolve_config(config_path)
+    payload = {
+        "audio": hash_audio(audio),
+        "source": os.path.basename(source),
+        "config": config_params,
+        "params": params,
+        "min_speakers": min_speakers,
+        "max_speakers": max_speakers,
+        "revisions": model_revisions(config_params),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+def write_rttm(annotation, f, uri="audio"):
+    uri = (getattr(annotation, "uri", None) or uri).replace(" ", "_")
+    for turn, _, speaker in annotation.itertracks(yield_label=True):
+        f.write(f"SPEAKER {uri} 1 {turn.start:.6f} {turn.duration:.6f} <NA> <NA> {speaker} <NA> <NA>\n")
+
+def read_rttm(f):
+    from pyannote.core import Annotation, Segment
+
+    annotation = None
+    for i, line in enumerate(f):
+        fields = line.split()
+        if not fields or fields[0] != "SPEAKER":
+            continue
+        if annotation is None:
+            annotation = Annotation(uri=fields[1])
+        start, duration = float(fields[3]), float(fields[4])
+        annotation[Segment(start, start + duration), i] = fields[7]
+    return annotation if annotation is not None else Annotation()
+
+class DiarizationCache:
+    """Content-addressed RTTM store with size-bounded LRU eviction.
+
+    Entries live at <root>/<key[:2]>/<key>.rttm. Writes go through a temp file
+    and os.replace, so concurrent processes never see a partial entry. A hit
+    bumps the entry's mtime, and eviction removes the oldest mtimes first.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + ".rttm")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                annotation = read_rttm(f)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return annotation
+
+    def put(self, key, annotation):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                write_rttm(annotation, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+        return path
+
+    def entries(self):
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.endswith(".rttm"):
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        return found
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                # Another process got there first.
+                pass
+            total -= size
+        return removed
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+_cache = None
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        root = os.environ.get("DIARIZATION_CACHE_DIR", DEFAULT_CACHE_DIR)
+        max_mb = int(os.environ.get("DIARIZATION_CACHE_MAX_MB", DEFAULT_MAX_BYTES // (1024 * 1024)))
+        _cache = DiarizationCache(root, max_mb * 1024 * 1024)
+    return _cache
@@ -0,0 +1,113 @@
+import numpy as np
+
+class SegmentTable:
+    """Columnar view of a diarization result.
+
+    Start and end times are float64 arrays, and speakers are int codes into
+    `labels`. Built once per result with a single itertracks pass, so that
+    printing, plotting and quality metrics can use vectorized operations
+    instead of each rebuilding and rescanning lists of tuples.
+    """
+
+    def __init__(self, start, end, codes, labels):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.labels = list(labels)
+
+    @classmethod
+    def from_annotation(cls, annotation):
+        if isinstance(annotation, cls):
+            return annotation
+        starts, ends, names = [], [], []
+        for turn, _, speaker in annotation.itertracks(yield_label=True):
+            starts.append(turn.start)
+            ends.append(turn.end)
+            names.append(speaker)
+        return cls.from_segments(zip(starts, ends, names))
+
+    @classmethod
+    def from_segments(cls, segments):
+        segments = list(segments)
+        if not segments:
+            return cls.empty()
+        starts, ends, names = zip(*segments)
+        labels, codes = np.unique(np.array(names, dtype=object).astype(str), return_inverse=True)
+        return cls(starts, ends, codes, labels.tolist())
+
+    @classmethod
+    def from_rttm(cls, f):
+        # Reads RTTM straight into columns, without going through pyannote.
+        segments = []
+        for line in f:
+            fields = line.split()
+            if fields and fields[0] == "SPEAKER":
+                start = float(fields[3])
+                segments.append((start, start + float(fields[4]), fields[7]))
+        return cls.from_segments(segments)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64), [])
+
+    def __len__(self):
+        return len(self.start)
+
+    def __iter__(self):
+        labels = self.labels
+        for start, end, code in zip(self.start.tolist(), self.end.tolist(), self.codes.tolist()):
+            yield start, end, labels[code]
+
+    @property
+    def num_speakers(self):
+        return len(self.labels)
+
+    @property
+    def durations(self):
+        return self.end - self.start
+
+    @property
+    def max_end(self):
+        return float(self.end.max()) if len(self) else 0.0
+
+    def speaker_durations(self):
+        # Total speaking time per speaker code, in one bincount.
+        return np.bincount(self.codes, weights=self.durations, minlength=self.num_speakers)
+
+    def speaker_times(self):
+        return dict(zip(self.labels, self.speaker_durations().tolist()))
+
+    def sorted(self):
+        order = np.lexsort((self.end, self.start))
+        return SegmentTable(self.start[order], self.end[order], self.codes[order], self.labels)
+
+    def select(self, mask):
+        return SegmentTable(self.start[mask], self.end[mask], self.codes[mask], self.labels)
+
+    def for_speaker(self, label):
+        return self.select(self.codes == self.labels.index(label))
+
+    def merged(self, max_gap=0.0):
+        # Joins each speaker's segments that are at most max_gap apart. Codes
+        # are spread apart on the time axis so that a single running maximum
+        # over the (speaker, start)-sorted columns never crosses speakers.
+        if not len(self):
+            return self
+        order = np.lexsort((self.start, self.codes))
+        codes = self.codes[order]
+        shift = codes * (self.max_end - float(self.start.min()) + max_gap + 1.0)
+        start, end = self.start[order] + shift, self.end[order] + shift
+        reach = np.maximum.accumulate(end)
+        first = np.ones(len(start), dtype=bool)
+        first[1:] = start[1:] > reach[:-1] + max_gap
+        idx = np.flatnonzero(first)
+        ends = np.maximum.reduceat(end, idx) - shift[idx]
+        return SegmentTable(start[idx] - shift[idx], ends, codes[idx], self.labels).sorted()
+
+    def to_annotation(self, uri=None):
+        from pyannote.core import Annotation, Segment
+
+        annotation = Annotation(uri=uri)
+        for i, (start, end, speaker) in enumerate(self):
+            annotation[Segment(start, end), i] = speaker
+        return annotation
@@ -0,0 +1,211 @@
+import os
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from utils.audio_buffer import AudioBuffer, load_audio
+from utils.cpu_tuning import apply_cpu_profile, cpu_profile
+
+SHARD_SECONDS = 600.0
+OVERLAP_SECONDS = 30.0
+LINK_THRESHOLD = 0.5
+BOUNDARY_RESOLUTION = 0.05
+
+# Per-worker state, populated by init_shard_worker in each child process.
+_worker = {}
+
+def plan_shards(duration, shard_seconds=SHARD_SECONDS, overlap_seconds=OVERLAP_SECONDS):
+    if not 0 <= overlap_seconds < shard_seconds:
+        raise ValueError(f"overlap_seconds must be at least 0 and shorter than shard_seconds "
+                         f"({shard_seconds:g}s), got {overlap_seconds:g}s")
+    if duration <= shard_seconds:
+        return [(0.0, duration)]
+    step = shard_seconds - overlap_seconds
+    starts = np.arange(0.0, duration - overlap_seconds, step)
+    return [(float(s), float(min(s + shard_seconds, duration))) for s in starts]
+
+def init_shard_worker(hf_token, config_path, cpu, backend="torch"):
+    from utils.pipeline_registry import backend_device, get_registry
+
+    apply_cpu_profile(None, cpu)
+    _worker["pipeline"] = get_registry().get(hf_token, config_path=config_path,
+                                             device=backend_device(backend), backend=backend)
+    apply_cpu_profile(_worker["pipeline"], cpu)
+
+def diarize_shard(samples, sample_rate, offset, max_speakers, vad=False, speaker_count=None):
+    start = time.perf_counter()
+    audio = AudioBuffer(samples, sample_rate)
+    pipeline = _worker["pipeline"]
+    # A shard may hold only some of the recording's speakers, so the floor
+    # stays at 1; only the upper bound carries over.
+    kwargs = {"min_speakers": 1}
+    if max_speakers:
+        kwargs["max_speakers"] = max_speakers
+    elif speaker_count:
+        from utils.diarizer import estimate_speakers
+
+        kwargs["max_speakers"] = estimate_speakers(audio, pipeline, speaker_count, audio.duration, {})[1]
+
+    if vad:
+        from utils.vad import diarize_speech_only
+
+        (diarization, centroids), _ = diarize_speech_only(pipeline, audio, return_embeddings=True, **kwargs)
+    else:
+        diarization, centroids = pipeline(audio.to_pyannote(), return_embeddings=True, **kwargs)
+
+    labels = diarization.labels()
+    segments = [(turn.start + offset, turn.end + offset, labels.index(speaker))
+                for turn, _, speaker in diarization.itertracks(yield_label=True)]
+    if centroids is None:
+        raise RuntimeError("Pipeline did not return speaker centroids (needs pyannote.audio >= 3.0)")
+    return {"segments": segments, "centroids": np.asarray(centroids), "seconds": time.perf_counter() - start}
+
+def speaker_durations(segments, num_speakers):
+    durations = np.zeros(num_speakers)
+    for start, end, speaker in segments:
+        durations[speaker] += end - start
+    return durations
+
+def link_speakers(shard_results, threshold=LINK_THRESHOLD):
+    # Greedily grows a set of global speakers: each shard's centroids are
+    # matched one-to-one (Hungarian on cosine similarity) to the global
+    # centroids, and unmatched or dissimilar speakers become new globals.
+    global_centroids = []
+    global_weights = []
+    mappings = []
+
+    for result in shard_results:
+        centroids = result["centroids"]
+        weights = speaker_durations(result["segments"], len(centroids))
+        mapping = {}
+
+        if global_centroids and len(centroids):
+            g = np.array(global_centroids)
+            similarity = normalize(centroids) @ normalize(g).T
+            rows, cols = linear_sum_assignment(-similarity)
+            for r, c in zip(rows, cols):
+                if similarity[r, c] >= threshold and np.all(np.isfinite(centroids[r])):
+                    mapping[int(r)] = int(c)
+
+        for local in range(len(centroids)):
+            if local not in mapping:
+                mapping[local] = len(global_centroids)
+                global_centroids.append(np.array(centroids[local], dtype=np.float64))
+                global_weights.append(0.0)
+            target = mapping[local]
+            w = weights[local]
+            total = global_weights[target] + w
+            if total > 0 and np.all(np.isfinite(centroids[local])):
+                global_centroids[target] = (global_centroids[target] * global_weights[target]
+                                            + centroids[local] * w) / total
+            global_weights[target] = total
+        mappings.append(mapping)
+
+    return mappings, np.array(global_centroids)
+
+def normalize(x):
+    x = np.nan_to_num(np.asarray(x, dtype=np.float64))
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+def boundary_consistency(shards, shard_results, mappings, resolution=BOUNDARY_RESOLUTION):
+    # For each overlap between consecutive shards, the fraction of frames
+    # where both shards assign the same set of global speakers.
+    scores = []
+    for k in range(1, len(shards)):
+        lo, hi = shards[k][0], shards[k - 1][1]
+        if hi <= lo:
+            continue
+        n = int(np.ceil((hi - lo) / resolution))
+        activity = []
+        for idx in (k - 1, k):
+            frames = [set() for _ in range(n)]
+            for start, end, local in shard_results[idx]["segments"]:
+                a = max(int((start - lo) / resolution), 0)
+                b = min(int(np.ceil((end - lo) / resolution)), n)
+                for f in range(a, b):
+                    frames[f].add(mappings[idx][local])
+            activity.append(frames)
+        active = [i for i in range(n) if activity[0][i] or activity[1][i]]
+        agree = sum(1 for i in active if activity[0][i] == activity[1][i])
+        scores.append(agree / len(active) if active else 1.0)
+    return scores
+
+def stitch(shards, shard_results, mappings):
+    # Every shard owns the span up to the midpoint of its overlaps; turns are
+    # clipped to that span and same-speaker turns meeting at a cut are merged.
+    from pyannote.core import Annotation, Segment
+
+    annotation = Annotation()
+    for k, ((start, end), result) in enumerate(zip(shards, shard_results)):
+        own_start = start if k == 0 else (start + shards[k - 1][1]) / 2
+        own_end = end if k == len(shards) - 1 else (shards[k + 1][0] + end) / 2
+        for i, (s, e, local) in enumerate(result["segments"]):
+            s, e = max(s, own_start), min(e, own_end)
+            if e > s:
+                annotation[Segment(s, e), f"{k}-{i}"] = f"SPEAKER_{mappings[k][local]:02d}"
+    return annotation.support()
+
+def run_sharded_diarization(audio, hf_token, shard_seconds=SHARD_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                            workers=None, max_speakers=None, config_path="local_config.yaml",
+                            link_threshold=LINK_THRESHOLD, backend="torch", vad=False, speaker_count=None):
+    """Diarize overlapping shards in a process pool and link speakers across them.
+
+    Each shard is diarized with min_speakers=1 and `max_speakers`. When
+    `max_speakers` is None and `speaker_count` is set, each shard estimates its
+    own upper bound with that method. With `vad`, each shard skips its own
+    silence. Returns (annotation, report).
+    """
+    audio = load_audio(audio)
+    shards = plan_shards(audio.duration, shard_seconds, overlap_seconds)
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    cpu = cpu_profile(workers)
+    sr = audio.sample_rate
+
+    print(f"Sharded diarization: {len(shards)} shards of {shard_seconds:.0f}s "
+          f"(overlap {overlap_seconds:.0f}s) on {workers} workers x {cpu['intra_op_threads']} threads")
+
+    start = time.perf_counter()
+    shard_results = [None] * len(shards)
+    in_flight = {}
+
+    def collect(return_when):
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            shard_results[in_flight.pop(future)] = future.result()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_shard_worker,
+                             initargs=(hf_token, config_path, cpu, backend)) as pool:
+        # Submit as workers free up: only shards in flight are copied out of
+        # the (possibly memory-mapped) recording.
+        for index, (s, e) in enumerate(shards):
+            if len(in_flight) >= workers:
+                collect(FIRST_COMPLETED)
+            future = pool.submit(diarize_shard, np.array(audio.samples[int(s * sr):int(e * sr)]), sr, s,
+                                 max_speakers, vad, speaker_count)
+            in_flight[future] = index
+        collect(ALL_COMPLETED)
+    wall = time.perf_counter() - start
+
+    mappings, centroids = link_speakers(shard_results, threshold=link_threshold)
+    diarization = stitch(shards, shard_results, mappings)
+    consistency = boundary_consistency(shards, shard_results, mappings)
+
+    shard_seconds_total = sum(r["seconds"] for r in shard_results)
+    report = {
+        "shards": len(shards),
+        "workers": workers,
+        "wall_seconds": wall,
+        "shard_seconds": [r["seconds"] for r in shard_results],
+        # Sum of per-shard inference time approximates a single-process run.
+        "estimated_speedup": shard_seconds_total / wall if wall else 1.0,
+        "global_speakers": len(centroids),
+        "boundary_consistency": consistency,
+        "mean_boundary_consistency": float(np.mean(consistency)) if consistency else 1.0,
+    }
+    print(f"Sharded run: {wall:.1f}s wall, ~{report['estimated_speedup']:.2f}x speedup, "
+          f"{report['global_speakers']} speakers, boundary consistency "
+          f"{report['mean_boundary_consistency'] * 100:.1f}%")
+    return diarization, report
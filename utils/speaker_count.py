@@ -0,0 +1,128 @@
+import time
+
+import numpy as np
+
+from utils.audio_buffer import load_audio
+from utils.vad import detect_speech
+
+WINDOW = 1.5
+MAX_WINDOWS = 300
+MAX_SPEAKERS = 10
+# Each window keeps only its most similar neighbours in the affinity matrix.
+PRUNE_FRACTION = 0.2
+# Below this best silhouette, the windows are treated as a single speaker.
+MIN_SILHOUETTE = 0.6
+
+def speech_windows(regions, window=WINDOW, max_windows=MAX_WINDOWS):
+    # Centres of windows lying fully inside speech, strided evenly over the
+    # whole recording so every part of it is sampled.
+    centers = [np.arange(start + window / 2, end - window / 2 + 1e-9, window)
+               for start, end in regions if end - start >= window]
+    centers = np.concatenate(centers) if centers else np.zeros(0)
+    if len(centers) > max_windows:
+        centers = centers[np.linspace(0, len(centers) - 1, max_windows).round().astype(int)]
+    return centers
+
+def pipeline_embedder(pipeline, window=WINDOW):
+    """Batch embedding function for `pipeline`: (samples, sample_rate, centers) -> (n, dim).
+
+    Uses the pyannote pipeline's own embedding model, or the stub pipeline's
+    spectral features when running offline.
+    """
+    if hasattr(pipeline, "_embedding"):
+        def embed(samples, sample_rate, centers):
+            import torch
+
+            half = int(window * sample_rate / 2)
+            starts = np.clip((centers * sample_rate).astype(int) - half, 0, max(len(samples) - 2 * half, 0))
+            chunks = np.stack([np.asarray(samples[s:s + 2 * half]) for s in starts])
+            batch = pipeline._embedding.batch_size if hasattr(pipeline._embedding, "batch_size") else 32
+            outputs = [pipeline._embedding(torch.from_numpy(chunks[i:i + batch]).unsqueeze(1))
+                       for i in range(0, len(chunks), batch)]
+            return np.concatenate(outputs)
+        return embed
+    if hasattr(pipeline, "embed"):
+        return pipeline.embed
+    raise ValueError(f"Cannot embed with {type(pipeline).__name__}")
+
+def cosine_similarity(embeddings):
+    embeddings = embeddings[np.all(np.isfinite(embeddings), axis=1)]
+    embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-9)
+    return embeddings @ embeddings.T
+
+def eigengap_count(similarity, max_speakers=MAX_SPEAKERS, prune_fraction=PRUNE_FRACTION):
+    # Pruned, symmetrised affinity -> normalised Laplacian; the number of
+    # speakers is where the gap between consecutive eigenvalues is largest.
+    n = len(similarity)
+    affinity = np.clip(similarity, 0, None)
+    keep = max(2, int(np.ceil(prune_fraction * n)))
+    threshold = -np.partition(-affinity, keep - 1, axis=1)[:, keep - 1:keep]
+    affinity = np.where(affinity >= threshold, affinity, 0.0)
+    affinity = (affinity + affinity.T) / 2
+    degree = affinity.sum(axis=1)
+    scale = 1 / np.sqrt(np.maximum(degree, 1e-12))
+    laplacian = np.eye(n) - scale[:, None] * affinity * scale[None, :]
+    eigenvalues = np.linalg.eigvalsh(laplacian)[:max_speakers + 1]
+    gaps = np.diff(eigenvalues)
+    return int(np.argmax(gaps[:max_speakers])) + 1
+
+def silhouette(distance, labels):
+    # Mean silhouette for precomputed distances, via a one-hot cluster matrix.
+    clusters, labels = np.unique(labels, return_inverse=True)
+    if len(clusters) < 2:
+        return -1.0
+    onehot = np.eye(len(clusters))[labels]
+    sizes = onehot.sum(axis=0)
+    totals = distance @ onehot
+    own = totals[np.arange(len(labels)), labels]
+    a = own / np.maximum(sizes[labels] - 1, 1)
+    means = totals / sizes
+    means[np.arange(len(labels)), labels] = np.inf
+    b = means.min(axis=1)
+    scores = np.where(sizes[labels] > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0.0)
+    return float(scores.mean())
+
+def silhouette_count(similarity, max_speakers=MAX_SPEAKERS, min_silhouette=MIN_SILHOUETTE):
+    from scipy.cluster.hierarchy import fcluster, linkage
+    from scipy.spatial.distance import squareform
+
+    distance = np.clip(1 - similarity, 0, None)
+    np.fill_diagonal(distance, 0)
+    tree = linkage(squareform(distance, checks=False), method="average")
+    scores = {k: silhouette(distance, fcluster(tree, k, criterion="maxclust"))
+              for k in range(2, min(max_speakers, len(similarity) - 1) + 1)}
+    if not scores:
+        return 1, scores
+    best = max(scores, key=scores.get)
+    return (best if scores[best] >= min_silhouette else 1), scores
+
+def estimate_speaker_range(audio, pipeline=None, embed=None, regions=None, window=WINDOW,
+                           max_windows=MAX_WINDOWS, max_speakers=MAX_SPEAKERS):
+    """Quick pre-pass estimate of (min_speakers, max_speakers) from the audio itself.
+
+    Embeds at most `max_windows` speech windows, evenly strided over the file,
+    then counts speakers two ways on their cosine-similarity matrix: the
+    eigengap of the normalised Laplacian and the best silhouette of average-
+    linkage clusterings. The returned range spans both estimates, so it is a
+    single value when they agree. With fewer than 3 speech windows there is
+    nothing to count, and the range is None rather than a guess.
+    """
+    start = time.perf_counter()
+    audio = load_audio(audio)
+    embed = embed or pipeline_embedder(pipeline, window)
+    regions = detect_speech(audio) if regions is None else regions
+    centers = speech_windows(regions, window, max_windows)
+
+    info = {"windows": len(centers)}
+    if len(centers) < 3:
+        info["seconds"] = time.perf_counter() - start
+        # Too little speech to tell; the caller picks its own fallback.
+        return None, info
+
+    similarity = cosine_similarity(np.asarray(embed(audio.samples, audio.sample_rate, centers)))
+    max_speakers = min(max_speakers, len(similarity) - 1)
+    info["eigengap"] = eigengap_count(similarity, max_speakers)
+    info["silhouette"], scores = silhouette_count(similarity, max_speakers)
+    info["silhouette_scores"] = {k: round(v, 3) for k, v in scores.items()}
+    info["seconds"] = time.perf_counter() - start
+    return (min(info["eigengap"], info["silhouette"]), max(info["eigengap"], info["silhouette"])), info
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+DEFAULT_STAGE_DIR = os.path.join("outputs", "stages")
+HASH_BLOCK = 1 << 22
+RECORD_NAME = "stage.json"
+
+def fingerprint(value):
+    encoded = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+def write_json_atomic(path, value):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp.json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(value, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+def publish(source, destination):
+    """Copy a stage artifact to a user-facing path, skipping it when already identical."""
+    if destination is None:
+        return None
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    if os.path.exists(destination) and os.path.getsize(destination) == os.path.getsize(source) \
+            and os.path.getmtime(destination) >= os.path.getmtime(source):
+        return destination
+    shutil.copy2(source, destination)
+    return destination
+
+class Stage:
+    def __init__(self, name, func, deps=(), params=None, version=1):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.version = version
+
+class StageRunner:
+    """Runs a small DAG of stages, skipping those whose inputs have not changed.
+
+    A stage's key fingerprints its name, version, params and the keys of the
+    stages it depends on, so a change anywhere upstream invalidates everything
+    downstream of it and nothing else. Each stage runs as
+    func(workdir, *dependency_results) in <root>/<name>/<key[:16]>/ and
+    returns a JSON-serializable result. The result is recorded in stage.json
+    only once the stage has finished, so an interrupted run resumes at the
+    first stage without a record. A recorded stage whose "outputs" files have
+    gone missing runs again.
+    """
+
+    def __init__(self, root=DEFAULT_STAGE_DIR, force=()):
+        self.root = root
+        self.force = set(force)
+        self.stages = {}
+        self.keys = {}
+        self.results = {}
+        self.ran = []
+
+    def file_hash(self, path):
+        # Hashing a long video takes seconds; remember digests by size and mtime.
+        memo_path = os.path.join(self.root, "file_hashes.json")
+        memo = {}
+        if os.path.exists(memo_path):
+            with open(memo_path) as f:
+                memo = json.load(f)
+        stat = os.stat(path)
+        entry = memo.get(os.path.abspath(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["hash"]
+
+        digest = hashlib.blake2b(digest_size=32)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+        memo[os.path.abspath(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                       "hash": digest.hexdigest()}
+        os.makedirs(self.root, exist_ok=True)
+        write_json_atomic(memo_path, memo)
+        return digest.hexdigest()
+
+    def add(self, name, func, deps=(), params=None, version=1):
+        # Stages are added in dependency order, which keeps the graph acyclic.
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name!r} depends on unknown stage(s): {', '.join(missing)}")
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage {name!r}")
+        stage = Stage(name, func, deps, params, version)
+        self.stages[name] = stage
+        self.keys[name] = fingerprint({
+            "stage": name,
+            "version": version,
+            "params": stage.params,
+            "deps": {dep: self.keys[dep] for dep in stage.deps},
+        })
+        return stage
+
+    def workdir(self, name):
+        return os.path.join(self.root, name, self.keys[name][:16])
+
+    def load_record(self, name):
+        path = os.path.join(self.workdir(name), RECORD_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            record = json.load(f)
+        if record.get("key") != self.keys[name]:
+            return None
+        outputs = record["result"].get("outputs", []) if isinstance(record["result"], dict) else []
+        if not all(os.path.exists(output) for output in outputs):
+            return None
+        return record
+
+    def run(self, targets=None):
+        """Run `targets` (default: every stage) and what they depend on; returns results by stage."""
+        needed = []
+        pending = list(targets or self.stages)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.append(name)
+                pending.extend(self.stages[name].deps)
+
+        for name in (name for name in self.stages if name in needed and name not in self.results):
+            stage = self.stages[name]
+            record = None if name in self.force else self.load_record(name)
+            if record is not None:
+                print(f"   ↺ {name}: unchanged, reusing {self.workdir(name)}")
+                self.results[name] = record["result"]
+                continue
+
+            workdir = self.workdir(name)
+            os.makedirs(workdir, exist_ok=True)
+            start = time.perf_counter()
+            result = stage.func(workdir, *(self.results[dep] for dep in stage.deps))
+            write_json_atomic(os.path.join(workdir, RECORD_NAME), {
+                "stage": name,
+                "key": self.keys[name],
+                "params": stage.params,
+                "deps": {dep: self.keys[dep] for dep in stage.deps},
+                "result": result,
+                "seconds": time.perf_counter() - start,
+                "completed_at": time.time(),
+            })
+            self.results[name] = result
+            self.ran.append(name)
+        return {name: self.results[name] for name in needed}
@@ -0,0 +1,126 @@
+import numpy as np
+from scipy.cluster.hierarchy import fcluster, linkage
+
+from utils.audio_buffer import AudioBuffer, load_audio
+from utils.vad import detect_speech
+
+FRAME = 2048
+FEATURE_BINS = 256
+MIN_CLUSTER_FRACTION = 0.02
+MAX_LINKAGE_POINTS = 2000
+
+class StubPipeline:
+    """Local stand-in for a pyannote SpeakerDiarization pipeline.
+
+    Energy VAD plus clustering of windowed log-spectra. It is nowhere near
+    pyannote's accuracy, but it has the same call signature and output type,
+    needs no model download, and scales like the real thing, so benchmarks,
+    the job service and other offline tooling can exercise every stage around
+    inference.
+    """
+
+    def __init__(self, window=1.5, step=0.5, threshold=0.8, seed=0):
+        self.window = window
+        self.step = step
+        self.threshold = threshold
+        self.seed = seed
+
+    def to(self, device):
+        return self
+
+    def parameters(self, instantiated=False):
+        return {"stub": {"window": self.window, "step": self.step, "threshold": self.threshold}}
+
+    def __call__(self, file, num_speakers=None, min_speakers=None, max_speakers=None,
+                 return_embeddings=False, hook=None, **kwargs):
+        from pyannote.core import Annotation, Segment
+
+        audio = self._load(file)
+        sr = audio.sample_rate
+        regions = detect_speech(audio)
+        annotation = Annotation(uri=file.get("uri", "stub") if isinstance(file, dict) else "stub")
+
+        centers = np.arange(self.step / 2, audio.duration, self.step)
+        speech = np.zeros(len(centers), dtype=bool)
+        if len(regions):
+            idx = np.searchsorted(regions[:, 0], centers, side="right") - 1
+            valid = idx >= 0
+            speech[valid] = centers[valid] < regions[idx[valid], 1]
+        centers = centers[speech]
+        if len(centers) == 0:
+            return (annotation, np.zeros((0, FEATURE_BINS))) if return_embeddings else annotation
+
+        features = self.embed(audio.samples, sr, centers)
+        labels, centroids = self.cluster(features, num_speakers, min_speakers, max_speakers)
+
+        # Runs of consecutive same-label frames become turns, clipped to the
+        # speech region they started in.
+        breaks = np.flatnonzero((np.diff(labels) != 0) | (np.diff(centers) > self.step * 1.5)) + 1
+        for run in np.split(np.arange(len(centers)), breaks):
+            start = centers[run[0]] - self.step / 2
+            end = centers[run[-1]] + self.step / 2
+            r = np.searchsorted(regions[:, 0], centers[run[0]], side="right") - 1
+            start, end = max(start, regions[r, 0]), min(end, regions[r, 1])
+            if end > start:
+                annotation[Segment(start, end), len(annotation)] = f"SPEAKER_{labels[run[0]]:02d}"
+
+        annotation = annotation.support()
+        if return_embeddings:
+            used = sorted({int(label.split("_")[1]) for label in annotation.labels()})
+            return annotation, centroids[used]
+        return annotation
+
+    def _load(self, file):
+        if isinstance(file, dict) and "waveform" in file:
+            waveform = np.asarray(file["waveform"])
+            return AudioBuffer.from_array(waveform.reshape(-1), file.get("sample_rate", 16000))
+        if isinstance(file, dict):
+            return load_audio(file["audio"])
+        return load_audio(file)
+
+    def embed(self, samples, sample_rate, centers):
+        # Mean log-magnitude spectrum (first FEATURE_BINS bins) over a few
+        # frames around each center, mean-normalised and unit length.
+        half = int(self.window * sample_rate / 2)
+        offsets = np.linspace(-half, half - FRAME, 4).astype(int)
+        window = np.hanning(FRAME)
+        features = np.empty((len(centers), FEATURE_BINS))
+        for batch in range(0, len(centers), 512):
+            c = (centers[batch:batch + 512] * sample_rate).astype(int)
+            starts = np.clip(c[:, None] + offsets[None, :], 0, max(len(samples) - FRAME, 0))
+            frames = np.asarray(samples)[starts[..., None] + np.arange(FRAME)] * window
+            spectrum = np.abs(np.fft.rfft(frames, axis=-1))[..., :FEATURE_BINS]
+            features[batch:batch + 512] = np.log(spectrum + 1e-6).mean(axis=1)
+        features -= features.mean(axis=0)
+        features /= np.linalg.norm(features, axis=1, keepdims=True) + 1e-9
+        return features
+
+    def cluster(self, features, num_speakers=None, min_speakers=None, max_speakers=None):
+        rng = np.random.default_rng(self.seed)
+        sample = features
+        if len(features) > MAX_LINKAGE_POINTS:
+            sample = features[rng.choice(len(features), MAX_LINKAGE_POINTS, replace=False)]
+
+        if len(sample) == 1:
+            return np.zeros(len(features), dtype=int), features[:1]
+
+        tree = linkage(sample, method="average", metric="cosine")
+        if num_speakers:
+            sample_labels = fcluster(tree, num_speakers, criterion="maxclust")
+        else:
+            sample_labels = fcluster(tree, self.threshold, criterion="distance")
+            k = len(np.unique(sample_labels))
+            lo, hi = min_speakers or 1, max_speakers or k
+            if not lo <= k <= hi:
+                sample_labels = fcluster(tree, int(np.clip(k, lo, hi)), criterion="maxclust")
+
+        clusters, sizes = np.unique(sample_labels, return_counts=True)
+        # Tiny clusters are usually transitions; fold them into their nearest
+        # neighbour unless that would drop below min_speakers.
+        keep = sizes >= max(2, MIN_CLUSTER_FRACTION * len(sample))
+        if keep.sum() < (min_speakers or num_speakers or 1) or not keep.any():
+            keep[:] = True
+        centroids = np.stack([sample[sample_labels == k].mean(axis=0) for k in clusters[keep]])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-9
+        labels = np.argmax(features @ centroids.T, axis=1)
+        return labels, centroids
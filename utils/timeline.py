@@ -0,0 +1,86 @@
+import json
+import os
+from xml.sax.saxutils import escape
+
+SPEAKER_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7',
+                  '#DDA0DD', '#98D8C8', '#F7DC6F', '#BB8FCE', '#85C1E9']
+TICK_STEPS = (10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200)
+MAX_TICKS = 30
+
+def speaker_color(i):
+    return SPEAKER_COLORS[i % len(SPEAKER_COLORS)]
+
+def format_clock(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+def time_ticks(duration, max_ticks=MAX_TICKS):
+    # Smallest round step that keeps the axis readable on long recordings.
+    step = next((s for s in TICK_STEPS if duration / s <= max_ticks), TICK_STEPS[-1])
+    return list(range(0, int(duration) + step, step))
+
+def timeline_dict(segments, max_gap=0.0):
+    """Plain-data timeline: speakers with their colour, share of the total and [start, end] pairs."""
+    total = segments.max_end
+    speaker_times = segments.speaker_durations()
+    drawn = segments.merged(max_gap) if max_gap > 0 else segments
+    speakers = []
+    for i, label in enumerate(segments.labels):
+        mask = drawn.codes == i
+        speakers.append({
+            "label": label,
+            "name": f"Speaker {i + 1}",
+            "color": speaker_color(i),
+            "seconds": float(speaker_times[i]),
+            "percentage": float(speaker_times[i] / total * 100) if total > 0 else 0.0,
+            "segments": [[round(s, 3), round(e, 3)] for s, e in
+                         zip(drawn.start[mask].tolist(), drawn.end[mask].tolist())],
+        })
+    return {"duration": total, "num_segments": len(segments), "speakers": speakers}
+
+def write_timeline_json(segments, output_path, max_gap=0.0):
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(timeline_dict(segments, max_gap), f, separators=(",", ":"))
+
+def write_timeline_svg(segments, output_path, width=1200, row_height=28):
+    """Hand-written SVG timeline: one <rect> per drawn segment, no matplotlib needed.
+
+    Segments closer together than one pixel are merged first, so the file size
+    is bounded by the width rather than by the number of segments.
+    """
+    label_width, margin, axis_height = 110, 10, 24
+    plot_width = width - label_width - 2 * margin
+    duration = segments.max_end or 1.0
+    scale = plot_width / duration
+    timeline = timeline_dict(segments, max_gap=1.0 / scale)
+    height = 2 * margin + axis_height + row_height * max(len(timeline["speakers"]), 1)
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'font-family="sans-serif" font-size="12">',
+             f'<rect width="{width}" height="{height}" fill="#f8f9fa"/>']
+    for row, speaker in enumerate(timeline["speakers"]):
+        y = margin + row * row_height
+        parts.append(f'<text x="{margin}" y="{y + row_height * 0.65:.1f}" font-weight="bold">'
+                     f'{escape(speaker["name"])} ({speaker["percentage"]:.1f}%)</text>')
+        parts.append(f'<g fill="{speaker["color"]}"><title>{escape(speaker["label"])}</title>')
+        parts.extend(f'<rect x="{label_width + margin + s * scale:.1f}" y="{y + 3}" '
+                     f'width="{max((e - s) * scale, 0.5):.1f}" height="{row_height - 6}"/>'
+                     for s, e in speaker["segments"])
+        parts.append('</g>')
+
+    axis_y = height - margin - axis_height
+    parts.append(f'<line x1="{label_width + margin}" y1="{axis_y}" x2="{width - margin}" '
+                 f'y2="{axis_y}" stroke="#34495e"/>')
+    for t in time_ticks(duration, max_ticks=max(2, plot_width // 80)):
+        if t > duration:
+            break
+        x = label_width + margin + t * scale
+        parts.append(f'<text x="{x:.1f}" y="{axis_y + 16}" text-anchor="middle">{format_clock(t)}</text>')
+    parts.append('</svg>')
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        f.write("\n".join(parts))
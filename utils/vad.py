@@ -0,0 +1,154 @@
+import numpy as np
+
+from utils.audio_buffer import AudioBuffer, load_audio
+
+FRAME_MS = 30
+HOP_MS = 10
+PREEMPHASIS = 0.97
+MARGIN_DB = 12.0
+ABSOLUTE_FLOOR_DB = -60.0
+# Without a quiet mode at least `margin_db` below the loud frames, the 10th
+# percentile is speech rather than noise; the threshold then sits this far
+# below the loud frames.
+SPEECH_RANGE_DB = 30.0
+# diarize_speech_only runs on the full file when VAD keeps less than this.
+MIN_KEPT_FRACTION = 0.05
+MIN_SPEECH = 0.1
+MIN_SILENCE = 0.3
+PAD = 0.3
+# Silence inserted between kept regions so the segmentation model never sees
+# two unrelated regions as one continuous turn.
+GAP = 0.2
+
+def frame_energy_db(samples, sample_rate, frame_ms=FRAME_MS, hop_ms=HOP_MS, preemphasis=PREEMPHASIS):
+    # Per-frame pre-emphasised energy (same signal as `vad_energy` in
+    # analyze_audio_characteristics), computed with cumulative sums.
+    y = np.asarray(samples, dtype=np.float64)
+    if len(y) == 0:
+        return np.zeros(0)
+    emphasized = np.empty_like(y)
+    emphasized[0] = y[0]
+    emphasized[1:] = y[1:] - preemphasis * y[:-1]
+
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    hop = max(1, int(sample_rate * hop_ms / 1000))
+    csum = np.concatenate([[0.0], np.cumsum(emphasized ** 2)])
+    starts = np.arange(0, max(len(y) - frame, 0) + 1, hop)
+    ends = np.minimum(starts + frame, len(y))
+    energy = (csum[ends] - csum[starts]) / (ends - starts)
+    return 10 * np.log10(energy + 1e-12)
+
+def mask_to_regions(mask, hop):
+    padded = np.concatenate([[False], mask, [False]]).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1) * hop
+    ends = np.flatnonzero(edges == -1) * hop
+    return np.stack([starts, ends], axis=1) if len(starts) else np.zeros((0, 2))
+
+def merge_regions(regions, max_gap=0.0):
+    if len(regions) == 0:
+        return regions
+    regions = regions[np.argsort(regions[:, 0])]
+    # A region starts a new group when it begins after every earlier region
+    # (plus the allowed gap) has ended.
+    previous_end = np.maximum.accumulate(regions[:, 1])
+    new_group = np.concatenate([[True], regions[1:, 0] > previous_end[:-1] + max_gap])
+    starts = regions[new_group, 0]
+    ends = np.maximum.reduceat(regions[:, 1], np.flatnonzero(new_group))
+    return np.stack([starts, ends], axis=1)
+
+def detect_speech(audio, margin_db=MARGIN_DB, min_speech=MIN_SPEECH, min_silence=MIN_SILENCE, pad=PAD):
+    audio = load_audio(audio)
+    energy = frame_energy_db(audio.samples, audio.sample_rate)
+    if len(energy) == 0:
+        return np.zeros((0, 2))
+
+    noise_floor, speech_level = np.percentile(energy, [10, 90])
+    if speech_level - noise_floor >= margin_db:
+        # Capped so quieter speech is never cut just because the floor is high.
+        threshold = min(noise_floor + margin_db, speech_level - margin_db)
+    else:
+        # Little or no silence: a floor+margin threshold would be above most
+        # of the speech, so only drop what is far below the loud frames.
+        threshold = speech_level - SPEECH_RANGE_DB
+    threshold = max(threshold, ABSOLUTE_FLOOR_DB)
+    hop = HOP_MS / 1000
+    regions = mask_to_regions(energy > threshold, hop)
+    if len(regions):
+        # Frames cover FRAME_MS, not just the hop.
+        regions[:, 1] += (FRAME_MS - HOP_MS) / 1000
+
+    regions = merge_regions(regions, max_gap=min_silence)
+    regions = regions[regions[:, 1] - regions[:, 0] >= min_speech]
+    regions = regions + np.array([-pad, pad])
+    regions = np.clip(regions, 0.0, audio.duration)
+    return merge_regions(regions)
+
+class SpeechMap:
+    """Maps times in the condensed (speech-only) signal back to the original."""
+
+    def __init__(self, original_starts, condensed_starts, durations):
+        self.original_starts = original_starts
+        self.condensed_starts = condensed_starts
+        self.durations = durations
+
+    def to_original(self, start, end):
+        # Splits [start, end) wherever it crosses a region boundary.
+        pieces = []
+        first = max(np.searchsorted(self.condensed_starts, start, side="right") - 1, 0)
+        for i in range(first, len(self.condensed_starts)):
+            c_start = self.condensed_starts[i]
+            c_end = c_start + self.durations[i]
+            if c_start >= end:
+                break
+            lo, hi = max(start, c_start), min(end, c_end)
+            if hi > lo:
+                offset = self.original_starts[i] - c_start
+                pieces.append((lo + offset, hi + offset))
+        return pieces
+
+def condense(audio, regions, gap=GAP):
+    audio = load_audio(audio)
+    sr = audio.sample_rate
+    bounds = np.round(regions * sr).astype(np.int64)
+    lengths = bounds[:, 1] - bounds[:, 0]
+    gap_samples = int(gap * sr)
+
+    condensed = np.zeros(int(lengths.sum()) + gap_samples * max(len(bounds) - 1, 0), dtype=np.float32)
+    condensed_starts = np.zeros(len(bounds))
+    cursor = 0
+    for i, (start, end) in enumerate(bounds):
+        condensed_starts[i] = cursor / sr
+        condensed[cursor:cursor + end - start] = audio.samples[start:end]
+        cursor += end - start + gap_samples
+
+    speech_map = SpeechMap(bounds[:, 0] / sr, condensed_starts, lengths / sr)
+    return AudioBuffer(condensed, sr, path=audio.path), speech_map
+
+def remap_annotation(annotation, speech_map):
+    from pyannote.core import Annotation, Segment
+
+    remapped = Annotation(uri=annotation.uri)
+    for turn, track, speaker in annotation.itertracks(yield_label=True):
+        for i, (start, end) in enumerate(speech_map.to_original(turn.start, turn.end)):
+            remapped[Segment(start, end), f"{track}-{i}"] = speaker
+    return remapped
+
+def diarize_speech_only(pipeline, audio, regions=None, min_kept=MIN_KEPT_FRACTION, **kwargs):
+    audio = load_audio(audio)
+    if regions is None:
+        regions = detect_speech(audio)
+
+    kept = float(np.sum(regions[:, 1] - regions[:, 0])) / audio.duration if len(regions) and audio.duration else 0.0
+    if kept < min_kept:
+        # Too little left to be plausible: more likely a VAD miss than a silent file.
+        print(f"VAD kept {kept * 100:.1f}% of audio; running on the full file instead")
+        return pipeline(audio.to_pyannote(), **kwargs), regions
+
+    condensed, speech_map = condense(audio, regions)
+    print(f"VAD kept {len(regions)} speech regions ({kept * 100:.1f}% of audio)")
+    result = pipeline(condensed.to_pyannote(), **kwargs)
+    if isinstance(result, tuple):
+        # return_embeddings=True: (annotation, centroids); only times need remapping.
+        return (remap_annotation(result[0], speech_map),) + result[1:], regions
+    return remap_annotation(result, speech_map), regions